@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import UserProfile
+from .rbac import invalidate
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
@@ -8,4 +9,6 @@ class UserProfileAdmin(admin.ModelAdmin):
     actions = ['approve_users']
 
     def approve_users(self, request, queryset):
-        queryset.update(is_approved=True)
\ No newline at end of file
+        queryset.update(is_approved=True)
+        # update() skips the signals that clear cached department decisions
+        invalidate(*queryset.values_list('user_id', flat=True))
\ No newline at end of file
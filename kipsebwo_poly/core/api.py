@@ -0,0 +1,177 @@
+import hashlib
+import json
+from typing import NamedTuple
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, quote_etag
+
+from .models import Consumable, Examination, FeeBalance, Payment, PermanentEquipment, Student
+from .pagination import PAGE_SIZE, keyset_paginate
+
+# Read-only JSON API (api/v1/) for integrations that used to scrape the pages.
+#
+# Each resource lists the fields a client may ask for with ?fields=a,b and
+# the ORM path or expression behind each. Rows are fetched with values()
+# for exactly those fields, so no model instance is built and the joins a
+# request makes are planned from the fields it asked for: a list of payments
+# touches core_student only when a student_* field is requested.
+#
+# Lists are keyset paginated (core/pagination.py), newest first, with
+# ?after=/?before= cursors in the `next`/`previous` URLs and ?limit= up to
+# API_MAX_PAGE_SIZE. Responses carry an ETag of their body; a request whose
+# If-None-Match still matches gets an empty 304. Access follows
+# department_required: superusers, or approved staff of one of the
+# resource's departments.
+
+
+class Resource(NamedTuple):
+    model: type
+    departments: tuple
+    # API name -> ORM path or expression
+    fields: dict
+    default_fields: tuple
+    # Descending keyset order; the last one must be unique
+    ordering: tuple = ('id',)
+
+    def select(self, names):
+        """A values() queryset of `names` plus the ordering fields."""
+        names = list(dict.fromkeys([*self.ordering, *names]))
+        plain = [name for name in names if self.fields[name] == name]
+        expressions = {name: F(path) if isinstance(path, str) else path
+                       for name, path in self.fields.items() if name in names and path != name}
+        return self.model.objects.values(*plain, **expressions)
+
+
+# For the rows that belong to a student
+STUDENT_FIELDS = {
+    'student_id': 'student_id',
+    'admission_number': 'student__admission_number',
+    'student_name': 'student__name',
+    'course': 'student__course',
+}
+
+
+RESOURCES = {
+    'students': Resource(
+        Student, ('admissions', 'finance', 'examinations'),
+        {name: name for name in (
+            'id', 'admission_number', 'name', 'course', 'year_enrolled', 'sex', 'residence', 'status',
+            'phone_number', 'email', 'parent_contacts', 'id_number', 'birth_certificate_number',
+            'last_school', 'religion',
+        )},
+        ('id', 'admission_number', 'name', 'course', 'year_enrolled', 'status'),
+    ),
+    'fee-balances': Resource(
+        FeeBalance, ('finance',),
+        {'id': 'id', **STUDENT_FIELDS, 'sem1_bal': 'sem1_bal', 'sem2_bal': 'sem2_bal',
+         'sem3_bal': 'sem3_bal', 'total_due': F('sem1_bal') + F('sem2_bal') + F('sem3_bal')},
+        ('id', 'student_id', 'admission_number', 'sem1_bal', 'sem2_bal', 'sem3_bal', 'total_due'),
+    ),
+    'payments': Resource(
+        Payment, ('finance',),
+        {'id': 'id', **STUDENT_FIELDS, 'amount': 'amount', 'semester': 'semester',
+         'transaction_id': 'transaction_id', 'date': 'date'},
+        ('id', 'student_id', 'admission_number', 'amount', 'semester', 'transaction_id', 'date'),
+        # payment_date_id_idx
+        ordering=('date', 'id'),
+    ),
+    'examinations': Resource(
+        Examination, ('examinations',),
+        {'id': 'id', **STUDENT_FIELDS, 'subject_name': 'subject_name', 'marks': 'marks',
+         'year_of_study': 'year_of_study', 'semester': 'semester', 'date_recorded': 'date_recorded'},
+        ('id', 'student_id', 'admission_number', 'subject_name', 'marks', 'year_of_study', 'semester'),
+    ),
+    'consumables': Resource(
+        Consumable, ('stores',),
+        {name: name for name in (
+            'id', 'item_name', 'date_supplied', 'balance_stock', 'reorder_level', 'last_date_issued',
+        )},
+        ('id', 'item_name', 'balance_stock', 'reorder_level'),
+    ),
+    'equipment': Resource(
+        PermanentEquipment, ('stores',),
+        {name: name for name in ('id', 'item_name', 'date_delivered', 'condition')},
+        ('id', 'item_name', 'date_delivered', 'condition'),
+    ),
+}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def resource_for(name, access):
+    """The resource called `name`, if the Access `access` may read it."""
+    resource = RESOURCES.get(name)
+    if resource is None:
+        raise ApiError(404, f"Unknown resource {name!r}; available: {', '.join(RESOURCES)}.")
+    if not any(access.allows(department) for department in resource.departments):
+        raise ApiError(403, f"{name} is available to {', '.join(resource.departments)} staff.")
+    return resource
+
+
+def requested_fields(resource, params):
+    value = params.get('fields', '')
+    if not value:
+        return list(resource.default_fields)
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in resource.fields]
+    if unknown:
+        raise ApiError(400, f"Unknown field(s) {', '.join(unknown)}; available: {', '.join(resource.fields)}.")
+    return names
+
+
+def _page_size(params):
+    try:
+        size = int(params.get('limit', PAGE_SIZE))
+    except ValueError:
+        raise ApiError(400, "limit must be a whole number.")
+    return max(1, min(size, getattr(settings, 'API_MAX_PAGE_SIZE', 200)))
+
+
+def _trim(rows, names):
+    # In the order asked for, without the ordering fields selected only for the cursors
+    return [{name: row[name] for name in names} for row in rows]
+
+
+def list_rows(resource, params, path):
+    """The `{'results', 'next', 'previous'}` body for a page of `resource`."""
+    names = requested_fields(resource, params)
+    page = keyset_paginate(resource.select(names), resource.ordering, after=params.get('after'),
+                           before=params.get('before'), page_size=_page_size(params))
+    kept = {key: value for key, value in params.items() if key not in ('after', 'before')}
+
+    def link(**cursor):
+        return f"{path}?{urlencode({**kept, **cursor})}"
+
+    return {
+        'results': _trim(page.object_list, names),
+        'next': link(after=page.next_cursor) if page.has_next else None,
+        'previous': link(before=page.prev_cursor) if page.has_previous else None,
+    }
+
+
+def detail_row(resource, params, pk):
+    names = requested_fields(resource, params)
+    row = resource.select(names).filter(pk=pk).first()
+    if row is None:
+        raise ApiError(404, "Not found.")
+    return _trim([row], names)[0]
+
+
+def respond(request, body, status=200):
+    """`body` as JSON with an ETag, or an empty 304 when the client already has it."""
+    content = json.dumps(body, cls=DjangoJSONEncoder).encode()
+    response = HttpResponse(content, content_type='application/json', status=status)
+    if status == 200:
+        etag = quote_etag(hashlib.md5(content, usedforsecurity=False).hexdigest())
+        response.headers['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return get_conditional_response(request, etag=etag, response=response)
+    return response
@@ -3,3 +3,12 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from django.core.signals import request_finished
+        from django.db.models.signals import post_migrate
+        from . import audit, caching, finance_stats, rbac, search  # noqa: F401 (finance_stats and rbac register signal receivers)
+        from .models import FeeStructure, Payment, Student
+        caching.register(FeeStructure, Payment, Student)
+        request_finished.connect(audit.flush_if_due, dispatch_uid='core.audit.flush_if_due')
+        post_migrate.connect(search.restore_fts_triggers, sender=self, dispatch_uid='core.search.restore_fts_triggers')
@@ -0,0 +1,248 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import AuditTrail
+
+# Buffered AuditTrail writer.
+#
+# record() puts an entry in an in-process buffer instead of doing an INSERT in
+# the request. The buffer is written with one bulk_create when it reaches
+# AUDIT_BUFFER_SIZE entries, when its oldest entry is AUDIT_FLUSH_INTERVAL
+# seconds old (checked by a timer and at request end, after the response has
+# gone out), and at process exit.
+#
+# Every entry is also appended to a journal segment on local disk before
+# record() returns. A segment is deleted only once its entries are in the
+# database. A process retries its own failed segments on every flush, and
+# the first flush of each process replays the segments of processes that
+# crashed. Delivery is at-least-once: a crash between the INSERT and the
+# delete can replay a segment twice.
+#
+# record(..., strict=True) (financial actions) and AUDIT_SYNC = True skip the
+# buffer and insert synchronously, inside the caller's transaction.
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class AuditBuffer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = []
+        self.oldest = None
+        self.segment = None
+        self.sequence = 0
+        self.timer = None
+        self.replayed = False
+        self.token = uuid.uuid4().hex[:8]
+        # Closed segments whose entries are not in the database yet
+        self.failed = []
+
+    # --- journal ---
+
+    @property
+    def prefix(self):
+        # Names this process's segments; the pid is read each time for forked workers
+        return f"{os.getpid()}-{self.token}-"
+
+    @property
+    def journal_dir(self):
+        default = Path(settings.BASE_DIR) / 'var' / 'audit_journal'
+        return Path(_setting('AUDIT_JOURNAL_DIR', default))
+
+    def _open_segment(self):
+        self.sequence += 1
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        path = self.journal_dir / f"{self.prefix}{self.sequence}.jsonl"
+        self.segment = (path, open(path, 'a', encoding='utf-8'))
+
+    def _close_segment(self):
+        if self.segment is None:
+            return None
+        path, fh = self.segment
+        fh.close()
+        self.segment = None
+        return path
+
+    # --- buffering ---
+
+    def add(self, entry):
+        entry = dict(entry, timestamp=entry['timestamp'].isoformat())
+        with self.lock:
+            if self.segment is None:
+                self._open_segment()
+            fh = self.segment[1]
+            fh.write(json.dumps(entry) + '\n')
+            fh.flush()
+            self.entries.append(entry)
+            if self.oldest is None:
+                self.oldest = time.monotonic()
+                self._start_timer()
+            full = len(self.entries) >= _setting('AUDIT_BUFFER_SIZE', 50)
+        if full:
+            self.flush()
+
+    def _start_timer(self):
+        self.timer = threading.Timer(_setting('AUDIT_FLUSH_INTERVAL', 5.0), self._flush_from_timer)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            connection.close()  # the timer thread got its own connection
+
+    def is_due(self):
+        with self.lock:
+            return self.oldest is not None and (
+                time.monotonic() - self.oldest >= _setting('AUDIT_FLUSH_INTERVAL', 5.0)
+            )
+
+    def flush(self):
+        """Writes everything buffered so far with one bulk_create. Returns the count."""
+        with self.lock:
+            entries, self.entries, self.oldest = self.entries, [], None
+            segment = self._close_segment()
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            # Taken by this flush alone: a concurrent flush cannot retry them too
+            retries, self.failed = self.failed, []
+        written = self._retry(retries)
+        if entries:
+            try:
+                written += _write(entries)
+            except Exception:
+                logger.exception("Audit flush failed; %s entries kept in %s", len(entries), segment)
+                with self.lock:
+                    self.failed.append(segment)
+            else:
+                segment.unlink(missing_ok=True)
+        if not self.replayed:
+            self.replayed = True
+            written += self.replay()
+        return written
+
+    def _retry(self, paths):
+        """Writes this process's earlier failed segments; those failing again are kept for the next flush."""
+        written, still_failed = 0, []
+        for path in paths:
+            try:
+                written += _write_segment(path)
+            except Exception:
+                logger.exception("Audit flush retry failed; entries kept in %s", path)
+                still_failed.append(path)
+        with self.lock:
+            self.failed[:0] = still_failed
+        return written
+
+    def replay(self):
+        """Inserts entries from journal segments left behind by dead processes."""
+        written = 0
+        for path in sorted(self.journal_dir.glob('*.jsonl')) if self.journal_dir.exists() else []:
+            if path.name.startswith(self.prefix):
+                continue  # Still being written, in flight or in self.failed
+            pid = int(path.name.split('-', 1)[0]) if path.name.split('-', 1)[0].isdigit() else None
+            # The same pid with another prefix is a dead process whose pid was reused
+            if pid != os.getpid() and _process_alive(pid):
+                continue
+            try:
+                written += _write_segment(path)
+            except Exception:
+                logger.exception("Could not replay audit journal %s", path)
+        return written
+
+
+def _process_alive(pid):
+    if pid is None:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _write_segment(path):
+    """Writes the entries of the journal segment at `path`, then deletes it."""
+    entries = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines() if line.strip()]
+    written = _write(entries)
+    path.unlink(missing_ok=True)
+    return written
+
+
+def _write(entries):
+    # A user deleted while their entries sat in the buffer would break the FK
+    # (checked at commit, so the whole batch), so drop those entries up front.
+    known = set(User.objects.filter(pk__in={e['user_id'] for e in entries}).values_list('pk', flat=True))
+    rows = [
+        AuditTrail(
+            user_id=e['user_id'], action=e['action'], timestamp=parse_datetime(e['timestamp']),
+            action_type=e.get('action_type', 'other'),
+            target_model=e.get('target_model', ''), target_id=e.get('target_id', ''),
+        )
+        for e in entries if e['user_id'] in known
+    ]
+    with transaction.atomic():
+        AuditTrail.objects.bulk_create(rows)
+    return len(rows)
+
+
+_buffer = AuditBuffer()
+
+
+def _entry(user, action, action_type, target):
+    return {
+        'user_id': user.pk, 'action': action[:255], 'action_type': action_type,
+        'target_model': target._meta.model_name if target is not None else '',
+        'target_id': str(target.pk) if target is not None else '',
+        'timestamp': timezone.now(),
+    }
+
+
+def record(user, action, action_type='other', target=None, strict=False):
+    """
+    Logs `action` against `user`, optionally about the model instance
+    `target` (record deletions before calling delete(), while it has a pk).
+
+    Buffered by default; strict=True writes the row immediately (use it for
+    money and anything that must commit or roll back together with the
+    change it describes).
+    """
+    entry = _entry(user, action, action_type, target)
+    if strict or _setting('AUDIT_SYNC', False):
+        return AuditTrail.objects.create(**entry)
+    # Inside an atomic block, only buffer the entry if the change commits
+    transaction.on_commit(lambda: _buffer.add(entry))
+    return None
+
+
+def flush():
+    return _buffer.flush()
+
+
+def flush_if_due(**kwargs):
+    """request_finished receiver: runs after the response has been sent."""
+    if _buffer.is_due():
+        _buffer.flush()
+
+
+atexit.register(flush)
@@ -0,0 +1,163 @@
+import datetime
+import logging
+import re
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+
+from .models import AuditRollup, AuditTrail
+
+# Retention for the audit log. Entries older than the retention window are
+# folded into AuditRollup (count per month, user and action type) and then
+# removed, one month per transaction. Months are UTC months, matching the
+# PostgreSQL partition bounds.
+#
+# On PostgreSQL core_audittrail is partitioned by month (migration 0011):
+# expired months are dropped as whole partitions instead of DELETEd, and
+# ensure_partitions() creates the partitions for the coming months so new
+# rows do not pile up in the default partition.
+
+logger = logging.getLogger(__name__)
+
+TABLE = AuditTrail._meta.db_table
+PARTITION_NAME = re.compile(rf'^{TABLE}_y(\d{{4}})m(\d{{2}})$')
+DELETE_BATCH_SIZE = 5000
+
+
+def month_start(value, months=0):
+    """First day (UTC midnight) of the month `months` away from `value`."""
+    index = value.year * 12 + value.month - 1 + months
+    return datetime.datetime(index // 12, index % 12 + 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def partition_name(month):
+    return f"{TABLE}_y{month:%Y}m{month:%m}"
+
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [TABLE])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def monthly_partitions():
+    """{month start: partition name} for the existing monthly partitions."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(%s)", [TABLE]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = {}
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            month = datetime.datetime(int(match[1]), int(match[2]), 1, tzinfo=datetime.timezone.utc)
+            partitions[month] = name
+    return partitions
+
+
+def ensure_partitions(months_ahead=3, now=None):
+    """Creates any missing partitions from this month to `months_ahead` on. Returns their names."""
+    if not is_partitioned():
+        return []
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    existing = monthly_partitions()
+    created = []
+    for offset in range(months_ahead + 1):
+        month = month_start(now, offset)
+        if month in existing:
+            continue
+        name = partition_name(month)
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    f'CREATE TABLE "{name}" PARTITION OF "{TABLE}" FOR VALUES FROM (%s) TO (%s)',
+                    [month, month_start(month, 1)],
+                )
+        except DatabaseError:
+            # Rows for this month already sit in the default partition; they
+            # stay there and are still found by every query on the table.
+            logger.warning("Could not create audit partition %s", name, exc_info=True)
+            continue
+        created.append(name)
+    return created
+
+
+def rollup(entries):
+    """Adds the counts of `entries` to AuditRollup. Returns how many entries were counted."""
+    counts = (
+        entries.order_by()
+        .annotate(month=TruncMonth('timestamp', tzinfo=datetime.timezone.utc))
+        .values('month', 'user_id', 'action_type')
+        .annotate(count=Count('id'))
+    )
+    fresh = {(row['month'].date(), row['user_id'], row['action_type']): row['count'] for row in counts}
+    if not fresh:
+        return 0
+    existing = {
+        (r.month, r.user_id, r.action_type): r
+        for r in AuditRollup.objects.filter(month__in={key[0] for key in fresh})
+    }
+    to_create, to_update = [], []
+    for key, count in fresh.items():
+        if key in existing:
+            existing[key].count += count
+            to_update.append(existing[key])
+        else:
+            to_create.append(AuditRollup(month=key[0], user_id=key[1], action_type=key[2], count=count))
+    AuditRollup.objects.bulk_create(to_create)
+    AuditRollup.objects.bulk_update(to_update, ['count'])
+    return sum(fresh.values())
+
+
+def _expire_month(month, partition=None):
+    """
+    Rolls up and removes the entries of `month` in one transaction, so a run
+    that stops part way leaves each month either counted and gone or
+    untouched, and a rerun never counts it twice. Returns the entries counted.
+    """
+    entries = AuditTrail.objects.filter(timestamp__gte=month, timestamp__lt=month_start(month, 1))
+    with transaction.atomic():
+        removed = rollup(entries)
+        if partition:
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP TABLE "{partition}"')
+        # Whatever is left (no partitions, or rows in the default partition)
+        # is deleted in batches to keep each statement short.
+        while True:
+            ids = list(entries.values_list('pk', flat=True)[:DELETE_BATCH_SIZE])
+            if not ids:
+                break
+            AuditTrail.objects.filter(pk__in=ids).delete()
+    return removed
+
+
+def apply_retention(keep_months, now=None, dry_run=False):
+    """
+    Rolls up and removes audit entries older than `keep_months` whole months,
+    oldest month first. Returns (cutoff, number of entries removed, partitions dropped).
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    cutoff = month_start(now, -keep_months)
+    expired = AuditTrail.objects.filter(timestamp__lt=cutoff)
+    if dry_run:
+        return cutoff, expired.count(), []
+
+    partitions = {}
+    if is_partitioned():
+        partitions = {month: name for month, name in monthly_partitions().items()
+                      if month_start(month, 1) <= cutoff}
+    months = set(partitions) | set(
+        expired.order_by()
+        .annotate(month=TruncMonth('timestamp', tzinfo=datetime.timezone.utc))
+        .values_list('month', flat=True).distinct()
+    )
+    removed = 0
+    for month in sorted(months):
+        removed += _expire_month(month, partitions.get(month))
+    return cutoff, removed, [partitions[month] for month in sorted(partitions)]
@@ -0,0 +1,362 @@
+import asyncio
+import datetime
+import io
+import platform
+import statistics
+import subprocess
+import threading
+import time
+import tracemalloc
+import warnings
+from urllib.parse import urlsplit
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+from . import urls
+from .instrumentation import QueryProfile
+from .models import AuditTrail, Consumable, Examination, Payment, PermanentEquipment, Student, UserProfile
+
+# End-to-end view benchmark.
+#
+# Requests every view in core/urls.py through the test client (the full
+# middleware stack) as a superuser and measures, per view: latency over
+# `repeat` warm requests (p50/p95/max), the first request after the caches
+# are cleared, query counts and the peak memory Python allocated for one
+# request (measured on a separate request, as tracemalloc slows everything
+# it traces).
+#
+# Each request runs in a transaction that is rolled back, so views that
+# change data on GET (approve, delete) see the same rows every time and the
+# database is left as it was. Results are plain dicts, saved as JSON so runs
+# on different commits can be compared.
+#
+# load_test() is the throughput side (bench_asgi): a dashboard requested by
+# many clients at once, through Django's WSGI handler from a pool of threads
+# (as a threaded WSGI server runs it) and through its ASGI handler from
+# concurrent tasks on one event loop (as an ASGI server does). The handlers
+# are called directly, without sockets, so the numbers leave out the server
+# and the network; they compare the sync views with their async versions
+# (core/streaming.py), not servers. Nothing is rolled back here: only point
+# it at views that do not write on GET.
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of sorted `samples`."""
+    return samples[max(0, -(-len(samples) * pct // 100) - 1)]
+
+
+def row_counts():
+    return {model.__name__: model.objects.count()
+            for model in (Student, Examination, Payment, AuditTrail, Consumable, PermanentEquipment)}
+
+
+def sample_urls():
+    """{url name: url} for every view, pointed at existing rows; views without one are left out."""
+    student = Student.objects.order_by('pk').first()
+    payment = Payment.objects.order_by('pk').first()
+    exam = Examination.objects.select_related('student').order_by('pk').first()
+    consumable = Consumable.objects.order_by('pk').first()
+    pending = UserProfile.objects.filter(is_approved=False, user__is_superuser=False).order_by('pk').first()
+    staff = (User.objects.filter(is_superuser=False).exclude(pk=pending.user_id if pending else None)
+             .order_by('pk').first())
+
+    kwargs = {
+        'student_profile': student and {'pk': student.pk},
+        'edit_student': student and {'pk': student.pk},
+        'process_payment': student and {'student_id': student.pk},
+        'print_receipt': payment and {'payment_id': payment.pk},
+        'transcript_status': {'job_id': 'no-such-job'},
+        'delete_store_item': consumable and {'item_type': 'consumable', 'pk': consumable.pk},
+        'approve_user': pending and {'user_id': pending.user_id},
+        'delete_user': staff and {'user_id': staff.pk},
+        'api_list': {'resource': 'payments'},
+        'api_detail': student and {'resource': 'students', 'pk': student.pk},
+    }
+    query = {
+        'student_autocomplete': student and f"?q={student.admission_number[:4]}",
+        'marks_sheet': exam and (f"?course={exam.student.course}&year_of_study={exam.year_of_study}"
+                                 f"&semester={exam.semester}&subject_name={exam.subject_name}"),
+        # The most recent day with payments, as the cashier prints at closing
+        'print_receipts': payment and "?date_from={0}&date_to={0}".format(
+            timezone.localtime(Payment.objects.latest('date').date).date()),
+    }
+
+    found = {}
+    for pattern in urls.urlpatterns:
+        if not isinstance(pattern, URLPattern):
+            continue
+        args = kwargs.get(pattern.name, {})
+        params = query.get(pattern.name, '')
+        if args is None or params is None:
+            continue
+        found[pattern.name] = reverse(pattern.name, kwargs=args) + params
+    return found
+
+
+def consume(response):
+    """The body of `response`, read as a WSGI server would, async streaming responses included."""
+    if not getattr(response, 'streaming', False):
+        return response.content
+    with warnings.catch_warnings():
+        # The async views' streams, served by the (sync) test client
+        warnings.filterwarnings('ignore', 'StreamingHttpResponse must consume asynchronous iterators')
+        return b''.join(response)
+
+
+def _get(client, url):
+    with transaction.atomic():
+        with QueryProfile() as profile:
+            response = client.get(url)
+            consume(response)
+        transaction.set_rollback(True)
+    return response, profile
+
+
+def measure(client, user, url, repeat):
+    for cache in caches.all():
+        cache.clear()
+    client.force_login(user)
+    response, cold = _get(client, url)
+
+    warm = [_get(client, url)[1] for _ in range(repeat)]
+    samples = sorted(profile.wall_time * 1000 for profile in warm)
+
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        _get(client, url)
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'url': url,
+        'status': response.status_code,
+        'cold_ms': round(cold.wall_time * 1000, 2),
+        'p50_ms': round(statistics.median(samples), 2),
+        'p95_ms': round(percentile(samples, 95), 2),
+        'max_ms': round(samples[-1], 2),
+        'cold_queries': cold.count,
+        'queries': warm[-1].count,
+        'sql_ms': round(statistics.median(profile.sql_time * 1000 for profile in warm), 2),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                              capture_output=True, text=True, timeout=10).stdout.strip()
+    except OSError:
+        return ''
+
+
+def run(repeat=20, names=None, log=None):
+    """Benchmarks every view (or those in `names`); returns the report as a dict."""
+    log = log or (lambda message: None)
+    report = {
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'repeat': repeat,
+        'rows': row_counts(),
+        'views': {},
+    }
+    targets = sample_urls()
+    with override_settings(DEBUG=False, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']), \
+            transaction.atomic():
+        # Rolled back with everything else
+        client = Client()
+        user = User.objects.create_superuser('bench_views_user')
+        for pattern in urls.urlpatterns:
+            name = getattr(pattern, 'name', None)
+            if names and name not in names:
+                continue
+            if name not in targets:
+                log(f"  {name:<22} skipped: no rows to point it at")
+                continue
+            result = report['views'][name] = measure(client, user, targets[name], repeat)
+            log(f"  {name:<22} {result['status']}  p50 {result['p50_ms']:8.2f} ms  "
+                f"p95 {result['p95_ms']:8.2f} ms  {result['queries']:3d} queries  "
+                f"{result['peak_kib']:9.1f} KiB")
+        transaction.set_rollback(True)
+    return report
+
+
+def compare(old, new):
+    """[(view, old p50, new p50, % change, old queries, new queries)] for views in both reports."""
+    rows = []
+    for name, result in new['views'].items():
+        before = old['views'].get(name)
+        if before is None:
+            continue
+        change = (result['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0.0
+        rows.append((name, before['p50_ms'], result['p50_ms'], change, before['queries'], result['queries']))
+    return rows
+
+
+# (sync view, async version) pairs load_test() compares
+LOAD_VIEWS = (('finance', 'finance_async'), ('examinations', 'examinations_async'))
+
+
+def _environ(url, cookie):
+    url = urlsplit(url)
+    return {
+        'REQUEST_METHOD': 'GET', 'SCRIPT_NAME': '', 'PATH_INFO': url.path, 'QUERY_STRING': url.query,
+        'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'testserver', 'HTTP_COOKIE': cookie, 'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.input': io.BytesIO(), 'wsgi.errors': io.StringIO(), 'wsgi.url_scheme': 'http',
+        'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+
+
+def _wsgi_get(app, url, cookie):
+    status = []
+    body = app(_environ(url, cookie), lambda line, headers, exc_info=None: status.append(line))
+    try:
+        for _ in body:
+            pass
+    finally:
+        body.close()
+    return int(status[0].split()[0])
+
+
+def _scope(url, cookie):
+    url = urlsplit(url)
+    return {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': url.path, 'raw_path': url.path.encode(), 'root_path': '',
+        'query_string': url.query.encode(), 'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+        'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+    }
+
+
+async def _asgi_get(app, url, cookie):
+    status = []
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            # The client stays connected until the handler is done
+            await asyncio.Future()
+        sent = True
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await app(_scope(url, cookie), receive, send)
+    return status[0]
+
+
+def _shares(total, concurrency):
+    return [total // concurrency + (n < total % concurrency) for n in range(concurrency)]
+
+
+def _timed_wsgi(app, url, cookie, concurrency, total):
+    samples, lock = [], threading.Lock()
+
+    def client(count):
+        for _ in range(count):
+            start = time.perf_counter()
+            status = _wsgi_get(app, url, cookie)
+            with lock:
+                samples.append((time.perf_counter() - start, status))
+
+    threads = [threading.Thread(target=client, args=(count,)) for count in _shares(total, concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, samples
+
+
+def _timed_asgi(app, url, cookie, concurrency, total):
+    async def client(count, samples):
+        for _ in range(count):
+            start = time.perf_counter()
+            status = await _asgi_get(app, url, cookie)
+            samples.append((time.perf_counter() - start, status))
+
+    async def main():
+        samples = []
+        start = time.perf_counter()
+        await asyncio.gather(*(client(count, samples) for count in _shares(total, concurrency)))
+        return time.perf_counter() - start, samples
+
+    return asyncio.run(main())
+
+
+def load(server, url, cookie, concurrency, total):
+    """`total` GETs of `url` by `concurrency` simultaneous clients through the 'wsgi' or 'asgi' handler."""
+    if server == 'wsgi':
+        app = WSGIHandler()
+        _wsgi_get(app, url, cookie)  # Warm up: caches, templates
+        elapsed, samples = _timed_wsgi(app, url, cookie, concurrency, total)
+    else:
+        app = ASGIHandler()
+        asyncio.run(_asgi_get(app, url, cookie))
+        elapsed, samples = _timed_asgi(app, url, cookie, concurrency, total)
+    latencies = sorted(seconds * 1000 for seconds, _ in samples)
+    return {
+        'requests_per_second': round(total / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'errors': sum(status >= 400 for _, status in samples),
+    }
+
+
+def load_test(concurrency=(1, 8, 32), requests=50, names=None, log=None):
+    """
+    Throughput of each LOAD_VIEWS pair (or those whose sync view is in
+    `names`): the sync view under WSGI and ASGI, the async one under ASGI, at
+    every `concurrency`. Returns the report as a dict.
+    """
+    log = log or (lambda message: None)
+    report = {
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'requests': requests,
+        'rows': row_counts(),
+        'results': [],
+    }
+    with override_settings(DEBUG=False, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+        # Committed, as the handlers' threads and connections must see it
+        user = User.objects.create_superuser('bench_asgi_user')
+        client = Client()
+        try:
+            client.force_login(user)
+            cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+            for sync_name, async_name in LOAD_VIEWS:
+                if names and sync_name not in names:
+                    continue
+                for server, name in (('wsgi', sync_name), ('asgi', sync_name), ('asgi', async_name)):
+                    for clients in concurrency:
+                        result = {'view': name, 'server': server, 'concurrency': clients,
+                                  **load(server, reverse(name), cookie, clients, requests)}
+                        report['results'].append(result)
+                        log(f"  {name:<20} {server}  x{clients:<3} {result['requests_per_second']:8.1f} req/s  "
+                            f"p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms"
+                            + (f"  {result['errors']} errors" if result['errors'] else ""))
+        finally:
+            client.logout()
+            user.delete()
+    return report
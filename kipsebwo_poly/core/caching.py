@@ -0,0 +1,156 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .models import FeeStructure, Student
+from .replicas import primary
+from .search import ranked_students
+
+# Cache for slow-changing reference data and template fragments.
+#
+# Every cached value depends on one or more models. Each model has a version
+# number in the cache, and the versions of its models are part of a value's
+# key, so bumping a version makes every value built from that model
+# unreachable at once without having to know their keys. register() bumps a
+# model's version on post_save/post_delete (after the transaction commits);
+# code that writes with bulk_create() or queryset.update() calls bump().
+#
+# Entries live in the cache named by CORE_CACHE_ALIAS (locmem by default, so
+# per process; point it at Redis/Memcached to share entries and invalidation
+# between workers). Hits and misses are counted per name in this process.
+#
+# Values are computed from the primary database even in views that read from
+# the replica: a lagging replica could otherwise put back rows that a version
+# bump has just invalidated, for as long as the entry lives.
+
+_MISSING = object()
+_lock = threading.Lock()
+_hits = Counter()
+_misses = Counter()
+
+
+def get_cache():
+    return caches[getattr(settings, 'CORE_CACHE_ALIAS', 'default')]
+
+
+def _version_key(model):
+    return f"core:version:{model._meta.label_lower}"
+
+
+def _new_version():
+    # Never 1: a version evicted from the cache and recreated must not match old keys
+    return time.time_ns()
+
+
+def versions(*models):
+    cache = get_cache()
+    keys = [_version_key(model) for model in models]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _new_version(), timeout=None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def make_key(name, models, *parts):
+    digest = hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()[:12] if parts else '-'
+    return f"core:{name}:{'.'.join(str(v) for v in versions(*models))}:{digest}"
+
+
+def _bump(models):
+    cache = get_cache()
+    for model in models:
+        try:
+            cache.incr(_version_key(model))
+        except ValueError:
+            cache.set(_version_key(model), _new_version(), timeout=None)
+
+
+def bump(*models):
+    """Invalidates everything cached from `models`, once the current transaction commits."""
+    transaction.on_commit(lambda: _bump(models))
+
+
+def cached(name, compute, depends_on, *parts, timeout=None):
+    """
+    The cached result of compute(), keyed on `name`, any extra `parts` and the
+    versions of the `depends_on` models.
+    """
+    cache = get_cache()
+    key = make_key(name, depends_on, *parts)
+    value = cache.get(key, _MISSING)
+    with _lock:
+        (_misses if value is _MISSING else _hits)[name] += 1
+    if value is _MISSING:
+        with primary():
+            value = compute()
+        cache.set(key, value, getattr(settings, 'CORE_CACHE_TIMEOUT', 3600) if timeout is None else timeout)
+    return value
+
+
+def cached_queryset(name, queryset, depends_on=None, timeout=None):
+    """The rows of `queryset` as a list; depends on its model unless `depends_on` says otherwise."""
+    return cached(name, lambda: list(queryset), depends_on or (queryset.model,),
+                  str(queryset.query), timeout=timeout)
+
+
+def stats():
+    """[(name, hits, misses)] for this process, busiest first."""
+    with _lock:
+        names = set(_hits) | set(_misses)
+        rows = [(name, _hits[name], _misses[name]) for name in names]
+    return sorted(rows, key=lambda row: -(row[1] + row[2]))
+
+
+def register(*models):
+    """Bumps each model's version whenever one of its rows is saved or deleted."""
+    for model in models:
+        label = model._meta.label_lower
+        post_save.connect(_changed, sender=model, dispatch_uid=f'core.caching.saved.{label}')
+        post_delete.connect(_changed, sender=model, dispatch_uid=f'core.caching.deleted.{label}')
+
+
+def _changed(sender, **kwargs):
+    bump(sender)
+
+
+# --- Reference data used by several views ---
+
+def student_courses():
+    """Distinct courses students are enrolled in."""
+    return cached_queryset(
+        'student_courses', Student.objects.order_by('course').values_list('course', flat=True).distinct(),
+    )
+
+
+def fee_structures():
+    return cached_queryset('fee_structures', FeeStructure.objects.order_by('course'))
+
+
+def student_label(admission_number, name):
+    return f"{admission_number} - {name}"
+
+
+def student_matches(query, limit=None):
+    """
+    [{'id', 'text'}] for the best `limit` students matching `query` (see
+    core/search.py), for the student pickers. Queries shorter than
+    AUTOCOMPLETE_MIN_LENGTH match nothing. Kept briefly, as each keystroke
+    is a new query.
+    """
+    query = ' '.join((query or '').split())
+    if len(query) < getattr(settings, 'AUTOCOMPLETE_MIN_LENGTH', 2):
+        return []
+    limit = limit or getattr(settings, 'AUTOCOMPLETE_LIMIT', 10)
+    return cached('student_matches', lambda: [
+        {'id': pk, 'text': student_label(adm, name)}
+        for pk, adm, name in ranked_students(Student.objects.all(), query)
+                             .values_list('id', 'admission_number', 'name')[:limit]
+    ], (Student,), query.upper(), limit, timeout=getattr(settings, 'AUTOCOMPLETE_CACHE_SECONDS', 60))
@@ -0,0 +1,126 @@
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from . import audit
+from .models import FeeBalance, FeeStructure, FeeStructureRevision, Payment, Student
+from .payments import SEMESTER_BALANCE_FIELDS
+
+# Fee structure revisions.
+#
+# Saving a structure records a FeeStructureRevision and recomputes every
+# balance of the course as
+#     semX_bal = structure.semester_X - SUM(payments of the student for X)
+# in a single UPDATE with one correlated SUM per semester, so balances stay
+# consistent with the payment history whatever happened before.
+
+STRUCTURE_FIELDS = {'1': 'semester_1', '2': 'semester_2', '3': 'semester_3'}
+PREVIEW_LIMIT = 200
+
+_money = DecimalField(max_digits=10, decimal_places=2)
+
+
+def _paid(semester, student_ref):
+    total = (
+        Payment.objects.filter(student=OuterRef(student_ref), semester=semester)
+        .order_by().values('student').annotate(total=Sum('amount')).values('total')
+    )
+    return Coalesce(Subquery(total), Value(0), output_field=_money)
+
+
+def latest_revision(course):
+    return FeeStructureRevision.objects.filter(course=course).order_by('-created_at', '-id').first()
+
+
+class RevisionPreview:
+    """What saving `amounts` for `course` would do to its balances."""
+
+    def __init__(self, course, amounts):
+        self.course = course
+        self.amounts = amounts
+        self.current = FeeStructure.objects.filter(course=course).first()
+        self.base_revision = latest_revision(course)
+        self.changes = []
+        self.students = 0
+        self.missing_balances = 0
+        self.total_before = Decimal('0')
+        self.total_after = Decimal('0')
+        self._compute()
+
+    def _compute(self):
+        # One query: every student of the course with their balance row and
+        # what they have paid per semester
+        rows = (
+            Student.objects.filter(course=self.course).order_by('admission_number')
+            .values('id', 'name', 'admission_number', 'feebalance__id',
+                    *[f'feebalance__{field}' for field in SEMESTER_BALANCE_FIELDS.values()])
+            .annotate(**{f'paid_{sem}': _paid(sem, 'pk') for sem in SEMESTER_BALANCE_FIELDS})
+        )
+        for row in rows.iterator():
+            self.students += 1
+            if row['feebalance__id'] is None:
+                self.missing_balances += 1
+            before, after = [], []
+            for sem, field in SEMESTER_BALANCE_FIELDS.items():
+                old = row[f'feebalance__{field}'] or Decimal('0')
+                new = self.amounts[STRUCTURE_FIELDS[sem]] - row[f'paid_{sem}']
+                before.append(old)
+                after.append(new)
+            self.total_before += sum(before)
+            self.total_after += sum(after)
+            if before != after:
+                self.changes.append({
+                    'name': row['name'], 'admission_number': row['admission_number'],
+                    'semesters': list(zip(before, after)), 'delta': sum(after) - sum(before),
+                })
+
+    @property
+    def shown_changes(self):
+        return self.changes[:PREVIEW_LIMIT]
+
+    @property
+    def total_delta(self):
+        return self.total_after - self.total_before
+
+
+def apply_revision(course, amounts, user=None, note='', base_revision=None):
+    """
+    Saves the structure, records a revision and recomputes the balances of
+    every student in `course`. Returns the FeeStructureRevision.
+
+    `base_revision` is the pk of the latest revision a preview was computed
+    from ('' if the course had none). If another revision was saved since,
+    nothing changes and ValidationError is raised.
+    """
+    with transaction.atomic():
+        # Lock the course's structure and balances first: a payment posted
+        # meanwhile waits and then applies its F() decrement to the
+        # recomputed value, and a second revision waits for this one.
+        list(FeeStructure.objects.select_for_update().filter(course=course).values_list('pk', flat=True))
+        list(FeeBalance.objects.select_for_update(of=('self',)).filter(student__course=course).values_list('pk', flat=True))
+        if base_revision is not None:
+            latest = latest_revision(course)
+            if str(base_revision) != (str(latest.pk) if latest else ''):
+                raise ValidationError(f"The {course} fee structure changed since this preview.")
+
+        FeeStructure.objects.update_or_create(course=course, defaults=amounts)
+        missing = Student.objects.filter(course=course, feebalance__isnull=True).values_list('pk', flat=True)
+        FeeBalance.objects.bulk_create([FeeBalance(student_id=pk) for pk in missing], ignore_conflicts=True)
+
+        updated = FeeBalance.objects.filter(student__course=course).update(**{
+            field: Value(amounts[STRUCTURE_FIELDS[sem]], output_field=_money) - _paid(sem, 'student')
+            for sem, field in SEMESTER_BALANCE_FIELDS.items()
+        })
+        revision = FeeStructureRevision.objects.create(
+            course=course, note=note, students_affected=updated, revised_by=user, **amounts
+        )
+        if user is not None:
+            audit.record(user, (
+                f"Revised fee structure for {course}: "
+                f"{amounts['semester_1']}/{amounts['semester_2']}/{amounts['semester_3']}, "
+                f"{updated} balance(s) recomputed"
+            ), action_type='update', target=revision, strict=True)
+    return revision
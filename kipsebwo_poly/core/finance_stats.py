@@ -0,0 +1,138 @@
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, DecimalField, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import FeeBalance, FeeStructure, Payment
+from .payments import SEMESTER_BALANCE_FIELDS
+from .replicas import primary
+
+# Finance analytics for the finance dashboard.
+#
+# Three GROUP BY queries: collections per course and semester, outstanding
+# arrears per course, and collections per day over the last TREND_DAYS days.
+# The result is cached as one entry and dropped whenever a Payment,
+# FeeBalance or FeeStructure is saved or deleted (after the transaction
+# commits, so a reader cannot re-cache the old figures in between). The
+# figures are computed from the primary for the same reason: the finance page
+# reads from the replica, which may not have the change yet.
+#
+# Bulk writes do not send those signals; code that changes balances with
+# bulk_create or queryset.update() outside a Payment/FeeStructure save calls
+# invalidate() itself.
+
+CACHE_KEY = 'finance:stats'
+TREND_DAYS = 30
+
+_money = DecimalField(max_digits=14, decimal_places=2)
+
+
+class CourseRow:
+    """Collections and arrears of one course."""
+
+    def __init__(self, course):
+        self.course = course
+        self.collected = {sem: 0 for sem in SEMESTER_BALANCE_FIELDS}
+        self.payments = 0
+        self.outstanding = {sem: 0 for sem in SEMESTER_BALANCE_FIELDS}
+        self.students = 0
+        self.in_arrears = 0
+
+    @property
+    def total_collected(self):
+        return sum(self.collected.values())
+
+    @property
+    def total_outstanding(self):
+        return sum(self.outstanding.values())
+
+    @property
+    def semesters(self):
+        return [(sem, self.collected[sem], self.outstanding[sem]) for sem in SEMESTER_BALANCE_FIELDS]
+
+
+def _compute(today):
+    rows = {}
+
+    def row(course):
+        return rows.setdefault(course or '(no course)', CourseRow(course or '(no course)'))
+
+    collected = (
+        Payment.objects.order_by().values('student__course', 'semester')
+        .annotate(total=Sum('amount'), n=Count('id'))
+    )
+    for r in collected:
+        course = row(r['student__course'])
+        course.collected[r['semester']] = r['total']
+        course.payments += r['n']
+
+    # Only money owed counts as arrears; an overpaid semester does not offset another student's debt
+    owed = {
+        sem: Coalesce(Sum(field, filter=Q(**{f'{field}__gt': 0})), 0, output_field=_money)
+        for sem, field in SEMESTER_BALANCE_FIELDS.items()
+    }
+    any_owed = Q()
+    for field in SEMESTER_BALANCE_FIELDS.values():
+        any_owed |= Q(**{f'{field}__gt': 0})
+    arrears = (
+        FeeBalance.objects.order_by().values('student__course')
+        .annotate(students=Count('id'), in_arrears=Count('id', filter=any_owed), **owed)
+    )
+    for r in arrears:
+        course = row(r['student__course'])
+        course.students = r['students']
+        course.in_arrears = r['in_arrears']
+        course.outstanding = {sem: r[sem] for sem in SEMESTER_BALANCE_FIELDS}
+
+    since = today - datetime.timedelta(days=TREND_DAYS - 1)
+    start = timezone.make_aware(datetime.datetime.combine(since, datetime.time.min))
+    per_day = dict(
+        Payment.objects.filter(date__gte=start).order_by()
+        .annotate(day=TruncDate('date')).values('day')
+        .annotate(total=Sum('amount')).values_list('day', 'total')
+    )
+    trend = [(since + datetime.timedelta(days=i), per_day.get(since + datetime.timedelta(days=i), 0))
+             for i in range(TREND_DAYS)]
+
+    courses = sorted(rows.values(), key=lambda r: r.course)
+    return {
+        'day': today,
+        'computed_at': timezone.now(),
+        'courses': courses,
+        'total_collected': sum(r.total_collected for r in courses),
+        'total_outstanding': sum(r.total_outstanding for r in courses),
+        'students_in_arrears': sum(r.in_arrears for r in courses),
+        'trend': trend,
+        'trend_peak': max((total for _, total in trend), default=0),
+    }
+
+
+def finance_stats():
+    """The cached figures for today, computed on a miss."""
+    today = timezone.localdate()
+    stats = cache.get(CACHE_KEY)
+    if stats is None or stats['day'] != today:
+        with primary():
+            stats = _compute(today)
+        cache.set(CACHE_KEY, stats, getattr(settings, 'FINANCE_STATS_TIMEOUT', 600))
+    return stats
+
+
+def invalidate():
+    transaction.on_commit(lambda: cache.delete(CACHE_KEY))
+
+
+@receiver(post_save, sender=Payment, dispatch_uid='core.finance_stats.payment_saved')
+@receiver(post_delete, sender=Payment, dispatch_uid='core.finance_stats.payment_deleted')
+@receiver(post_save, sender=FeeBalance, dispatch_uid='core.finance_stats.balance_saved')
+@receiver(post_delete, sender=FeeBalance, dispatch_uid='core.finance_stats.balance_deleted')
+@receiver(post_save, sender=FeeStructure, dispatch_uid='core.finance_stats.structure_saved')
+@receiver(post_delete, sender=FeeStructure, dispatch_uid='core.finance_stats.structure_deleted')
+def _finance_changed(sender, **kwargs):
+    invalidate()
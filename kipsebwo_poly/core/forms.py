@@ -1,17 +1,14 @@
 from django import forms
-from .models import Student, Examination, FeeStructure
-from .models import Consumable, PermanentEquipment
+from .models import Student, Examination, FeeStructure, FeeStructureRevision
+from .models import Consumable, PermanentEquipment, StockMovement
 from django.contrib.auth.models import User
+from django.urls import reverse
 from .models import UserProfile
+from .caching import student_courses, student_label
 #registration form that includes the department selection and the logic to reject the 3rd user.
 class RegistrationForm(forms.ModelForm):
-    # 1. Defining the 4 specific departments
-    DEPARTMENT_CHOICES = [
-        ('finance', 'Finance'),
-        ('admissions', 'Admissions'),
-        ('stores', 'Stores'),
-        ('examinations', 'Examinations'),
-    ]
+    # 1. The 4 departments, same codes as the profile model
+    DEPARTMENT_CHOICES = UserProfile.DEPARTMENT_CHOICES
 
     # 2. This creates the dropdown field
     department = forms.ChoiceField(
@@ -42,13 +39,30 @@ class StudentForm(forms.ModelForm):
         model = Student
         fields = '__all__'
 
+class StudentAutocomplete(forms.Widget):
+    """
+    Search box for a Student field. Matches come from the student_autocomplete
+    view as the user types instead of an <option> per student; rendering
+    reads only the chosen student.
+    """
+    template_name = 'widgets/student_autocomplete.html'
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        try:
+            student = Student.objects.filter(pk=value).values_list('admission_number', 'name').first() if value else None
+        except (TypeError, ValueError):
+            student = None
+        context['widget'].update(url=reverse('student_autocomplete'), label=student_label(*student) if student else '')
+        return context
+
 class ExaminationForm(forms.ModelForm):
     class Meta:
         model = Examination
         # Match these exactly to your model fields
         fields = ['student', 'subject_name', 'marks', 'year_of_study', 'semester']
         widgets = {
-            'student': forms.Select(attrs={'class': 'form-control'}),
+            'student': StudentAutocomplete(attrs={'class': 'form-control'}),
             'subject_name': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'e.g. Mathematics'}),
             'marks': forms.NumberInput(attrs={'class': 'form-control'}),
             'year_of_study': forms.Select(attrs={'class': 'form-control'}),
@@ -60,19 +74,127 @@ class FeeForm(forms.ModelForm):
         fields = '__all__'
 
 
+class FeeRevisionForm(forms.ModelForm):
+    """New or changed structure for a course; saved through core.fees after a preview."""
+    class Meta:
+        model = FeeStructureRevision
+        fields = ['course', 'semester_1', 'semester_2', 'semester_3', 'note']
+
+    def clean(self):
+        cleaned = super().clean()
+        for field in ('semester_1', 'semester_2', 'semester_3'):
+            if cleaned.get(field) is not None and cleaned[field] < 0:
+                self.add_error(field, "Fees cannot be negative.")
+        return cleaned
+
+
 class ConsumableForm(forms.ModelForm):
+    # After creation the balance only changes through stock movements (core/stores.py)
     class Meta:
         model = Consumable
-        fields = ['item_name', 'date_supplied', 'balance_stock', 'last_date_issued']
+        fields = ['item_name', 'date_supplied', 'balance_stock', 'reorder_level']
+        labels = {'balance_stock': 'Opening stock'}
         widgets = {
             'date_supplied': forms.DateInput(attrs={'type': 'date'}),
-            'last_date_issued': forms.DateInput(attrs={'type': 'date'}),
         }
 
+
+class StockMovementForm(forms.Form):
+    """Receive, issue or count one consumable."""
+    consumable = forms.ModelChoiceField(queryset=Consumable.objects.order_by('item_name'))
+    kind = forms.ChoiceField(choices=StockMovement.KIND_CHOICES, label="Movement")
+    quantity = forms.IntegerField(min_value=0, help_text="For a stock count, the number of items counted")
+    issued_to = forms.CharField(max_length=200, required=False)
+    note = forms.CharField(max_length=255, required=False)
+
+    def clean(self):
+        cleaned = super().clean()
+        if cleaned.get('kind') != 'adjust' and cleaned.get('quantity') == 0:
+            self.add_error('quantity', "The quantity must be greater than zero.")
+        return cleaned
+
+
+class IssueLineForm(forms.Form):
+    consumable = forms.ModelChoiceField(queryset=Consumable.objects.order_by('item_name'), required=False)
+    quantity = forms.IntegerField(min_value=1, required=False)
+
+    def clean(self):
+        cleaned = super().clean()
+        if cleaned.get('consumable') and not cleaned.get('quantity'):
+            self.add_error('quantity', "Enter how many to issue.")
+        return cleaned
+
+
+class BaseIssueLineFormSet(forms.BaseFormSet):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # One query for the item list, shared by every row's select
+        choices = list(forms.ModelChoiceField(queryset=Consumable.objects.order_by('item_name')).choices)
+        for form in self.forms:
+            form.fields['consumable'].choices = choices
+
+    def lines(self):
+        return [(f.cleaned_data['consumable'], f.cleaned_data['quantity'])
+                for f in self.forms if f.cleaned_data.get('consumable')]
+
+
+IssueLineFormSet = forms.formset_factory(IssueLineForm, formset=BaseIssueLineFormSet, extra=8)
+
+
+class BulkIssueForm(forms.Form):
+    issued_to = forms.CharField(max_length=200, help_text="Department, class or person receiving the items")
+    date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}), required=False)
+    note = forms.CharField(max_length=255, required=False)
+
 class EquipmentForm(forms.ModelForm):
     class Meta:
         model = PermanentEquipment
         fields = ['item_name', 'date_delivered', 'condition']
         widgets = {
             'date_delivered': forms.DateInput(attrs={'type': 'date'}),
-        }
\ No newline at end of file
+        }
+
+
+class StatementUploadForm(forms.Form):
+    statement = forms.FileField(
+        label="Bank / M-Pesa statement (CSV)",
+        help_text="Columns: admission_number, amount, semester, transaction_id",
+    )
+
+
+class IntakeUploadForm(forms.Form):
+    intake = forms.FileField(
+        label="Intake sheet (CSV or XLSX)",
+        help_text="Columns: name, admission_number, phone_number, sex, course, last_school, "
+                  "parent_contacts, religion (optional: id_number, email, birth_certificate_number, "
+                  "year_enrolled, residence, status)",
+    )
+    skip_invalid = forms.BooleanField(
+        required=False, label="Admit the valid rows even if some rows have errors",
+    )
+
+    def clean_intake(self):
+        upload = self.cleaned_data['intake']
+        if not upload.name.lower().endswith(('.csv', '.xlsx')):
+            raise forms.ValidationError("Upload a .csv or .xlsx file.")
+        return upload
+
+
+class CohortForm(forms.Form):
+    """Picks a class: course, year of study and semester."""
+    course = forms.ChoiceField(choices=[])
+    year_of_study = forms.ChoiceField(choices=Examination.YEAR_CHOICES)
+    semester = forms.ChoiceField(choices=Examination.SEM_CHOICES)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['course'].choices = [(c, c) for c in student_courses()]
+
+
+class MarksSheetForm(CohortForm):
+    """Picks the class and subject for the spreadsheet-style marks entry."""
+    subject_name = forms.CharField(max_length=100, widget=forms.TextInput(attrs={'placeholder': 'e.g. Mathematics'}))
+
+
+class MarksUploadForm(forms.Form):
+    marks_file = forms.FileField(label="Marks sheet (CSV)", help_text="Columns: admission_number, marks")
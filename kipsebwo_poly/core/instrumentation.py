@@ -0,0 +1,158 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+# Query counting and timing.
+#
+# QueryProfile wraps every database connection with an execute wrapper and
+# records each statement it runs: how many, how long they took in total, and
+# which statements ran more than once with only their parameters changed
+# (the signature of an N+1 loop). QueryMetricsMiddleware profiles each
+# request, adds the numbers to an in-process table per URL name and, when
+# QUERY_METRICS_HEADERS is on (DEBUG by default), returns them as X-Query-*
+# response headers.
+#
+# Queries run while a streaming response is being iterated happen after the
+# middleware has returned and are not counted.
+
+logger = logging.getLogger(__name__)
+
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_in_lists = re.compile(r"\bIN \((?:\s*(?:%s|\?)\s*,?)+\)", re.IGNORECASE)
+
+
+def signature(sql):
+    """The statement with its literal values and IN lists collapsed."""
+    sql = _literals.sub('?', sql)
+    return _in_lists.sub('IN (...)', sql)
+
+
+class QueryProfile:
+    """
+    with QueryProfile() as profile: ...
+    then profile.count, profile.sql_time, profile.wall_time (seconds) and
+    profile.duplicates ({signature: times run}, only those run more than once).
+    """
+
+    def __init__(self, aliases=None):
+        self.aliases = aliases
+        self.queries = []  # (sql, seconds)
+        self.wall_time = 0.0
+
+    def _record(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for alias in self.aliases or connections:
+            self._stack.enter_context(connections[alias].execute_wrapper(self._record))
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall_time = time.perf_counter() - self._start
+        self._stack.close()
+        return False
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def sql_time(self):
+        return sum(seconds for _, seconds in self.queries)
+
+    @property
+    def duplicates(self):
+        counts = Counter(signature(sql) for sql, _ in self.queries)
+        return {sql: n for sql, n in counts.items() if n > 1}
+
+    @property
+    def worst_duplicate(self):
+        """Times the most repeated statement ran (1 when nothing repeats)."""
+        return max(self.duplicates.values(), default=1)
+
+
+class Metrics:
+    """Per URL name totals for this process."""
+
+    FIELDS = ('requests', 'queries', 'max_queries', 'sql_time', 'wall_time', 'max_wall_time', 'n_plus_one')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows = {}
+
+    def add(self, name, profile, n_plus_one):
+        with self._lock:
+            row = self._rows.setdefault(name, dict.fromkeys(self.FIELDS, 0))
+            row['requests'] += 1
+            row['queries'] += profile.count
+            row['max_queries'] = max(row['max_queries'], profile.count)
+            row['sql_time'] += profile.sql_time
+            row['wall_time'] += profile.wall_time
+            row['max_wall_time'] = max(row['max_wall_time'], profile.wall_time)
+            row['n_plus_one'] += n_plus_one
+
+    def table(self):
+        """Rows with per-request averages (times in ms), slowest first."""
+        with self._lock:
+            rows = [(name, dict(row)) for name, row in self._rows.items()]
+        table = []
+        for name, row in rows:
+            n = row['requests']
+            table.append({
+                'url_name': name,
+                'requests': n,
+                'avg_queries': round(row['queries'] / n, 1),
+                'max_queries': row['max_queries'],
+                'avg_sql_ms': round(row['sql_time'] * 1000 / n, 1),
+                'avg_wall_ms': round(row['wall_time'] * 1000 / n, 1),
+                'max_wall_ms': round(row['max_wall_time'] * 1000, 1),
+                'n_plus_one': row['n_plus_one'],
+            })
+        return sorted(table, key=lambda row: -row['avg_wall_ms'])
+
+    def reset(self):
+        with self._lock:
+            self._rows.clear()
+
+
+metrics = Metrics()
+
+
+class QueryMetricsMiddleware:
+    """Profiles every request; put it first so the session and user lookups are counted too."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.headers = getattr(settings, 'QUERY_METRICS_HEADERS', settings.DEBUG)
+        self.threshold = getattr(settings, 'QUERY_DUPLICATE_THRESHOLD', 5)
+
+    def __call__(self, request):
+        with QueryProfile() as profile:
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        name = (match.view_name if match else None) or '(unresolved)'
+        repeated = {sql: n for sql, n in profile.duplicates.items() if n >= self.threshold}
+        if repeated:
+            sql, n = max(repeated.items(), key=lambda item: item[1])
+            logger.warning("Possible N+1 in %s: %d runs of %s", name, n, sql[:200])
+        metrics.add(name, profile, bool(repeated))
+
+        if self.headers:
+            response['X-Query-Count'] = str(profile.count)
+            response['X-Query-Time-Ms'] = f"{profile.sql_time * 1000:.1f}"
+            response['X-Query-Duplicates'] = str(profile.worst_duplicate)
+            response['X-Response-Time-Ms'] = f"{profile.wall_time * 1000:.1f}"
+        return response
@@ -0,0 +1,251 @@
+import csv
+import re
+import zipfile
+from decimal import Decimal, InvalidOperation
+from xml.etree import ElementTree
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from . import audit, caching, finance_stats
+from .models import FeeBalance, FeeStructure, Student
+
+# Bulk admission of an intake from a CSV or XLSX sheet.
+#
+# Every row is validated before anything is written: field checks come from
+# the model (full_clean without the per-row unique query) and admission
+# numbers are checked against the database in one query. The students then
+# go in with bulk_create, their FeeBalance rows with a second bulk_create
+# from one course -> FeeStructure map, and one audit entry covers the batch.
+# bulk_create does not fire post_save, so create_student_financials and the
+# per-student audit entry are deliberately bypassed here.
+
+BATCH_SIZE = 500
+
+# Column headers we understand, lower-cased -> Student field
+COLUMN_ALIASES = {
+    'name': 'name', 'full name': 'name', 'student name': 'name',
+    'admission_number': 'admission_number', 'admission number': 'admission_number',
+    'admission no': 'admission_number', 'adm no': 'admission_number',
+    'id_number': 'id_number', 'id number': 'id_number', 'id no': 'id_number',
+    'email': 'email',
+    'birth_certificate_number': 'birth_certificate_number', 'birth certificate number': 'birth_certificate_number',
+    'birth cert no': 'birth_certificate_number',
+    'phone_number': 'phone_number', 'phone number': 'phone_number', 'phone': 'phone_number',
+    'sex': 'sex', 'gender': 'sex',
+    'course': 'course',
+    'last_school': 'last_school', 'last school': 'last_school', 'previous school': 'last_school',
+    'parent_contacts': 'parent_contacts', 'parent contacts': 'parent_contacts', 'parent contact': 'parent_contacts',
+    'religion': 'religion',
+    'year_enrolled': 'year_enrolled', 'year enrolled': 'year_enrolled', 'year': 'year_enrolled',
+    'residence': 'residence',
+    'status': 'status',
+}
+REQUIRED_COLUMNS = ('name', 'admission_number', 'phone_number', 'sex', 'course',
+                    'last_school', 'parent_contacts', 'religion')
+# Digits that are not numbers: a spreadsheet number loses their leading zeros (0712... -> 712...)
+TEXT_COLUMNS = ('phone_number', 'id_number', 'birth_certificate_number')
+# Short forms people type for choice fields
+CHOICE_ALIASES = {
+    'sex': {'m': 'Male', 'f': 'Female'},
+    'residence': {'day': 'Day Scholar', 'day scholar': 'Day Scholar', 'boarding': 'Boarder'},
+}
+
+
+class IntakeReport:
+    """What an intake import did: the students created plus every row error."""
+
+    def __init__(self, source):
+        self.source = source
+        self.rows = 0
+        self.created = 0
+        self.balances = 0
+        self.errors = []  # (line number, admission number, message)
+
+    def error(self, line_no, admission_number, message):
+        self.errors.append((line_no, admission_number, message))
+
+    @property
+    def summary(self):
+        return (f"Imported intake {self.source}: {self.created} student(s) admitted, "
+                f"{len(self.errors)} row error(s)")
+
+
+class NumberCell(str):
+    """An XLSX cell stored as a number rather than text, written out in full."""
+
+
+def _number(raw):
+    # Whole numbers come back as '712345678', '712345678.0' or '7.12345678E8'
+    try:
+        value = Decimal(raw)
+    except InvalidOperation:
+        return NumberCell(raw)
+    if value == value.to_integral_value():
+        return NumberCell(f"{value:f}".split('.')[0])
+    return NumberCell(f"{value.normalize():f}")
+
+
+def _xlsx_rows(fileobj):
+    """(line number, row) for the first worksheet, cells as strings (stdlib only)."""
+    ns = {'m': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+    try:
+        archive = zipfile.ZipFile(fileobj)
+        shared = []
+        if 'xl/sharedStrings.xml' in archive.namelist():
+            root = ElementTree.fromstring(archive.read('xl/sharedStrings.xml'))
+            shared = [''.join(t.text or '' for t in si.iter(f"{{{ns['m']}}}t")) for si in root.findall('m:si', ns)]
+        sheets = sorted(n for n in archive.namelist() if re.match(r'xl/worksheets/sheet\d+\.xml$', n))
+        if not sheets:
+            raise ValidationError("The workbook has no worksheet.")
+        root = ElementTree.fromstring(archive.read(sheets[0]))
+    except (zipfile.BadZipFile, KeyError, ElementTree.ParseError):
+        raise ValidationError("Could not read the XLSX file.")
+
+    line_no = 0
+    for row in root.iter(f"{{{ns['m']}}}row"):
+        # Empty rows are left out of the file; r says which row this is
+        line_no = int(row.get('r')) if (row.get('r') or '').isdigit() else line_no + 1
+        values = {}
+        for cell in row.findall('m:c', ns):
+            ref = re.match(r'([A-Z]+)', cell.get('r', ''))
+            column = 0
+            for letter in ref.group(1) if ref else '':
+                column = column * 26 + ord(letter) - 64
+            kind = cell.get('t')
+            if kind == 'inlineStr':
+                value = ''.join(t.text or '' for t in cell.iter(f"{{{ns['m']}}}t"))
+            else:
+                raw = cell.findtext('m:v', default='', namespaces=ns)
+                if kind == 's':
+                    value = shared[int(raw)] if raw else ''
+                elif kind in (None, 'n') and raw:
+                    value = _number(raw)
+                else:
+                    value = raw
+            values[column - 1 if column else len(values)] = value
+        if values:
+            yield line_no, [values.get(i, '') for i in range(max(values) + 1)]
+
+
+def _csv_rows(fileobj):
+    reader = csv.reader(fileobj)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_rows(fileobj, filename):
+    """(line number, {field: value}) for a CSV (text) or XLSX (binary) upload."""
+    if filename.lower().endswith('.xlsx'):
+        rows = _xlsx_rows(fileobj)
+    else:
+        rows = _csv_rows(fileobj)
+    _, header = next(rows, (None, None))
+    if header is None:
+        raise ValidationError("The file is empty.")
+    mapping = {}
+    for index, name in enumerate(header):
+        field = COLUMN_ALIASES.get((name or '').strip().lower())
+        if field and field not in mapping.values():
+            mapping[index] = field
+    missing = [c for c in REQUIRED_COLUMNS if c not in mapping.values()]
+    if missing:
+        raise ValidationError(f"The sheet is missing column(s): {', '.join(missing)}")
+
+    for line_no, row in rows:
+        data = {}
+        for i, field in mapping.items():
+            value = row[i] if i < len(row) else ''
+            # A NumberCell stays one, so _clean_row can tell it from text
+            data[field] = value if isinstance(value, NumberCell) else value.strip()
+        if any(data.values()):
+            yield line_no, data
+
+
+def _clean_row(data):
+    lost = {field: f"Stored as the number {data[field]}, which drops any leading 0; "
+                   f"format the column as Text and enter it again."
+            for field in TEXT_COLUMNS if isinstance(data.get(field), NumberCell)}
+    if lost:
+        raise ValidationError(lost)
+    for field, aliases in CHOICE_ALIASES.items():
+        if data.get(field):
+            data[field] = aliases.get(data[field].lower(), data[field])
+    for field in ('sex', 'residence', 'status'):
+        # Accept any capitalisation of a valid choice
+        choices = {value.lower(): value for value, _ in Student._meta.get_field(field).choices}
+        if data.get(field):
+            data[field] = choices.get(data[field].lower(), data[field])
+    for field in ('residence', 'status', 'year_enrolled'):
+        if not data.get(field):
+            data.pop(field, None)  # model default
+    for field in ('id_number', 'email', 'birth_certificate_number'):
+        if field in data and not data[field]:
+            data[field] = None
+    student = Student(**data)
+    # Field validation only; admission numbers are checked in bulk
+    student.full_clean(validate_unique=False, validate_constraints=False)
+    return student
+
+
+def import_students(rows, user, source='', skip_invalid=False):
+    """
+    Validates every row of `rows` (see read_rows) and admits the intake.
+    Nothing is written if any row fails, unless skip_invalid is set, in which
+    case the valid rows are admitted and the rest reported. Returns an IntakeReport.
+    """
+    report = IntakeReport(source)
+    students, lines = [], {}
+    for line_no, data in rows:
+        report.rows += 1
+        adm = data.get('admission_number', '')
+        try:
+            student = _clean_row(data)
+        except ValidationError as e:
+            messages = [f"{field}: {' '.join(errs)}" for field, errs in e.message_dict.items()]
+            report.error(line_no, adm, "; ".join(messages))
+            continue
+        if adm in lines:
+            report.error(line_no, adm, f"Admission number repeated (first on line {lines[adm]})")
+            continue
+        lines[adm] = line_no
+        students.append(student)
+
+    taken = set(Student.objects.filter(admission_number__in=lines).values_list('admission_number', flat=True))
+    for adm in sorted(taken, key=lines.get):
+        report.error(lines[adm], adm, "Admission number already exists")
+    students = [s for s in students if s.admission_number not in taken]
+    report.errors.sort(key=lambda e: e[0])
+
+    if not students or (report.errors and not skip_invalid):
+        return report
+
+    structures = {s.course: s for s in FeeStructure.objects.filter(course__in={s.course for s in students})}
+    try:
+        with transaction.atomic():
+            Student.objects.bulk_create(students, batch_size=BATCH_SIZE)
+            if any(s.pk is None for s in students):
+                # Backends that cannot return ids from a bulk insert
+                ids = dict(Student.objects.filter(admission_number__in=[s.admission_number for s in students])
+                           .values_list('admission_number', 'id'))
+                for s in students:
+                    s.pk = ids[s.admission_number]
+            balances = []
+            for s in students:
+                structure = structures.get(s.course)
+                balances.append(FeeBalance(
+                    student_id=s.pk,
+                    sem1_bal=structure.semester_1 if structure else 0,
+                    sem2_bal=structure.semester_2 if structure else 0,
+                    sem3_bal=structure.semester_3 if structure else 0,
+                ))
+            FeeBalance.objects.bulk_create(balances, batch_size=BATCH_SIZE)
+            # bulk_create sends no post_save
+            finance_stats.invalidate()
+            caching.bump(Student)
+            report.created, report.balances = len(students), len(balances)
+            audit.record(user, report.summary, action_type='import')
+    except IntegrityError:
+        raise ValidationError("Some of these admission numbers were added while importing; "
+                              "nothing was imported. Please try again.")
+    return report
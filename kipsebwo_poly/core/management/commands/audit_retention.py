@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from core.audit_retention import apply_retention, ensure_partitions
+
+
+class Command(BaseCommand):
+    help = ("Rolls up and removes audit entries older than the retention window and, "
+            "on PostgreSQL, creates the monthly partitions for the coming months. "
+            "Run it once a month (e.g. from cron).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-months', type=int, default=24,
+                            help="Whole months of detailed entries to keep (default 24).")
+        parser.add_argument('--months-ahead', type=int, default=3,
+                            help="Monthly partitions to create ahead of time (PostgreSQL).")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only report how many entries would be removed.")
+
+    def handle(self, *args, **options):
+        if not options['dry_run']:
+            for name in ensure_partitions(options['months_ahead']):
+                self.stdout.write(f"Created partition {name}")
+
+        cutoff, removed, dropped = apply_retention(options['keep_months'], dry_run=options['dry_run'])
+        for name in dropped:
+            self.stdout.write(f"Dropped partition {name}")
+        verb = "Would remove" if options['dry_run'] else "Rolled up and removed"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {removed} audit entr{'y' if removed == 1 else 'ies'} older than {cutoff:%Y-%m-%d}."
+        ))
@@ -0,0 +1,68 @@
+import json
+import pathlib
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from core import benchmark
+from core.seeding import seed
+
+
+class Command(BaseCommand):
+    help = ("Compares the throughput of the finance and examinations dashboards under "
+            "concurrent load: the sync views through the WSGI and ASGI handlers and their "
+            "async versions through the ASGI handler (see core/benchmark.py), saved as JSON. "
+            "Seeds a throwaway test database unless --existing is given.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=0.002,
+                            help="seed_scale volume for the throwaway database")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--existing', action='store_true',
+                            help="Load the configured database as it is, e.g. after seed_scale. "
+                                 "The views only read, but a benchmark user is created and every "
+                                 "request competes with real traffic: never point this at production.")
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32],
+                            help="Simultaneous clients; each level is measured separately")
+        parser.add_argument('--requests', type=int, default=50, help="Requests per view, server and level")
+        parser.add_argument('--views', nargs='+', metavar='URL_NAME',
+                            help=f"Only these sync views (of {', '.join(s for s, _ in benchmark.LOAD_VIEWS)})")
+        parser.add_argument('--output', help="JSON report path (default var/benchmarks/asgi-<commit>.json)")
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or min(options['concurrency']) < 1:
+            raise CommandError("--requests and --concurrency must be at least 1")
+
+        if options['existing']:
+            report = self.run(options)
+        else:
+            # Never touch the real database: build, seed and drop a test one.
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                self.stdout.write(f"Seeding at scale {options['scale']} ...")
+                seed(options['scale'], options['seed'])
+                # Only the primary has a test copy; the replica still has the real data
+                with override_settings(REPLICA_DATABASE=None):
+                    report = self.run(options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+        report['scale'] = None if options['existing'] else options['scale']
+
+        output = pathlib.Path(options['output'] or pathlib.Path(settings.BASE_DIR) / 'var' / 'benchmarks'
+                              / f"asgi-{report['commit'] or report['created_at'].replace(':', '')}.json")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Saved {output}"))
+
+    def run(self, options):
+        rows = ", ".join(f"{count:,} {name}" for name, count in benchmark.row_counts().items())
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{options['requests']} requests per view, server and level ({connection.vendor}: {rows})"))
+        # Buffered audit entries journal to disk before they are written; keep those out of var/
+        with tempfile.TemporaryDirectory() as journal_dir, override_settings(AUDIT_JOURNAL_DIR=journal_dir):
+            return benchmark.load_test(options['concurrency'], options['requests'], options['views'],
+                                       log=self.stdout.write)
@@ -0,0 +1,65 @@
+import statistics
+import tempfile
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from core import audit
+from core.models import AuditTrail
+
+
+class Command(BaseCommand):
+    help = ("Measures the per-request cost of writing AuditTrail entries "
+            "synchronously vs through the buffered writer (core.audit), "
+            "on a throwaway test database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--buffer-size', type=int, default=50)
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with tempfile.TemporaryDirectory() as journal_dir, override_settings(
+                AUDIT_JOURNAL_DIR=journal_dir, AUDIT_BUFFER_SIZE=options['buffer_size'],
+                AUDIT_FLUSH_INTERVAL=3600, AUDIT_SYNC=False,
+            ):
+                self.run(options['requests'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run(self, count):
+        user = User.objects.create(username='bench')
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{count:,} requests, one audit entry each ({connection.vendor})"))
+
+        sync = self.time(count, lambda i: audit.record(user, f"Updated student: {i}", strict=True))
+        # Buffered: record() in the request; every Nth request also pays for the
+        # bulk_create when the buffer fills. The timer/request_finished flushes
+        # happen after the response and are not counted.
+        buffered = self.time(count, lambda i: audit.record(user, f"Updated student: {i}"))
+        audit.flush()
+
+        for label, samples in (('synchronous', sync), ('buffered', buffered)):
+            self.stdout.write(
+                f"  {label:<12} p50 {statistics.median(samples):7.3f} ms  "
+                f"p95 {samples[int(len(samples) * 0.95) - 1]:7.3f} ms  "
+                f"max {samples[-1]:7.3f} ms  total {sum(samples):8.1f} ms"
+            )
+        saved = (sum(sync) - sum(buffered)) / count
+        self.stdout.write(f"  saved per request: {saved:.3f} ms "
+                          f"({AuditTrail.objects.count():,} rows written)")
+
+    @staticmethod
+    def time(count, func):
+        samples = []
+        for i in range(count):
+            start = time.perf_counter()
+            func(i)
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        return samples
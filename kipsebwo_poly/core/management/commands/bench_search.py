@@ -0,0 +1,76 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+
+from core.models import Student
+from core.search import ranked_students
+from core.seeding import COURSES, FIRST_NAMES, LAST_NAMES
+
+
+class Command(BaseCommand):
+    help = ("Benchmarks student search (core.search) against the old icontains "
+            "filter on a throwaway test database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[10_000, 100_000])
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        # Never touch the real database: build and drop a test one.
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            for size in options['sizes']:
+                self.seed(size)
+                self.run_size(size, options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def seed(self, size):
+        Student.objects.all().delete()
+        rng = random.Random(size)
+        batch = [
+            Student(
+                name=f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.choice(FIRST_NAMES)}",
+                admission_number=f"KVTC/{2020 + i % 7}/{i:06d}",
+                phone_number='0700000000', sex=rng.choice(['Male', 'Female']),
+                course=rng.choice(list(COURSES)), last_school='-', parent_contacts='-',
+                religion='-',
+            )
+            for i in range(size)
+        ]
+        # bulk_create skips the FeeBalance signal, which is irrelevant here.
+        Student.objects.bulk_create(batch, batch_size=2000)
+
+    def run_size(self, size, repeat):
+        queries = ['Wanjiru', 'kipt', 'KVTC/2023/0001', 'Odhiambo Kamau']
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{size:,} students ({connection.vendor})"))
+        for query in queries:
+            # Both sides do what a paginated view does: count, then the first page.
+            legacy = self.time(repeat, lambda: self.first_page(Student.objects.filter(
+                Q(name__icontains=query) | Q(admission_number__icontains=query)
+            ).order_by('name')))
+            indexed = self.time(repeat, lambda: self.first_page(
+                ranked_students(Student.objects.all(), query)))
+            self.stdout.write(
+                f"  {query!r:<20} icontains p50 {legacy[0]:7.2f} ms  p95 {legacy[1]:7.2f} ms"
+                f"  | search p50 {indexed[0]:7.2f} ms  p95 {indexed[1]:7.2f} ms"
+            )
+
+    @staticmethod
+    def first_page(queryset):
+        return queryset.count(), list(queryset[:50])
+
+    @staticmethod
+    def time(repeat, func):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
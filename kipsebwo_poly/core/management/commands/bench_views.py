@@ -0,0 +1,78 @@
+import json
+import pathlib
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from core import benchmark
+from core.seeding import seed
+
+
+class Command(BaseCommand):
+    help = ("Benchmarks every view in core/urls.py through the test client (see "
+            "core/benchmark.py): p50/p95 latency, query counts and peak memory, "
+            "saved as JSON. Seeds a throwaway test database unless --existing is given.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=0.05,
+                            help="seed_scale volume for the throwaway database")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--existing', action='store_true',
+                            help="Benchmark the configured database as it is, e.g. after seed_scale. "
+                                 "Requests are rolled back, but every cache is cleared: never point "
+                                 "this at production.")
+        parser.add_argument('--repeat', type=int, default=20, help="Warm requests per view")
+        parser.add_argument('--views', nargs='+', metavar='URL_NAME', help="Only these views")
+        parser.add_argument('--output', help="JSON report path (default var/benchmarks/views-<commit>.json)")
+        parser.add_argument('--compare', help="Earlier JSON report to compare p50 latency and queries with")
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError("--repeat must be at least 1")
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read {options['compare']}: {e}")
+
+        if options['existing']:
+            report = self.run(options)
+        else:
+            # Never touch the real database: build, seed and drop a test one.
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                self.stdout.write(f"Seeding at scale {options['scale']} ...")
+                seed(options['scale'], options['seed'])
+                # Only the primary has a test copy; the replica still has the real data
+                with override_settings(REPLICA_DATABASE=None):
+                    report = self.run(options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+        report['scale'] = None if options['existing'] else options['scale']
+
+        output = pathlib.Path(options['output'] or pathlib.Path(settings.BASE_DIR) / 'var' / 'benchmarks'
+                              / f"views-{report['commit'] or report['created_at'].replace(':', '')}.json")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Saved {output}"))
+
+        if baseline:
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"Compared with {baseline.get('commit') or options['compare']}"))
+            for name, before, after, change, q_before, q_after in benchmark.compare(baseline, report):
+                self.stdout.write(f"  {name:<22} p50 {before:8.2f} -> {after:8.2f} ms ({change:+6.1f}%)  "
+                                  f"queries {q_before} -> {q_after}")
+
+    def run(self, options):
+        rows = ", ".join(f"{count:,} {name}" for name, count in benchmark.row_counts().items())
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{options['repeat']} requests per view ({connection.vendor}: {rows})"))
+        # Buffered audit entries journal to disk before they are written; keep those out of var/
+        with tempfile.TemporaryDirectory() as journal_dir, override_settings(AUDIT_JOURNAL_DIR=journal_dir):
+            return benchmark.run(options['repeat'], options['views'], log=self.stdout.write)
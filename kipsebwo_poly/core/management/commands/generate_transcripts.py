@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.transcripts import TranscriptJob
+
+
+class Command(BaseCommand):
+    help = ("Generates result slips for a course/year/semester in parallel and zips them. "
+            "Re-running the same job resumes it.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course')
+        parser.add_argument('--year', choices=['1', '2', '3'])
+        parser.add_argument('--semester', choices=['1', '2'])
+        parser.add_argument('--job', help="Resume an existing job by id instead")
+        parser.add_argument('--workers', type=int, default=None, help="Processes to use (default: CPU count)")
+        parser.add_argument('--fresh', action='store_true', help="Discard earlier output and start over")
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        if options['job']:
+            job = TranscriptJob.load(options['job'])
+            if job is None:
+                raise CommandError(f"No transcript job {options['job']!r}")
+        elif options['course'] and options['year'] and options['semester']:
+            job = TranscriptJob(options['course'], options['year'], options['semester'])
+        else:
+            raise CommandError("Give --course, --year and --semester, or --job.")
+
+        def progress(done, total):
+            if self.verbosity and (done % 100 == 0 or done == total):
+                self.stdout.write(f"  {done}/{total} transcripts")
+
+        path = job.run(workers=options['workers'], progress=progress, fresh=options['fresh'])
+        self.stdout.write(self.style.SUCCESS(f"Transcripts written to {path}"))
@@ -0,0 +1,41 @@
+import csv
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from core.statements import BATCH_SIZE, import_statement
+
+
+class Command(BaseCommand):
+    help = "Posts every payment in a bank / M-Pesa CSV statement (see core/statements.py)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV statement to import")
+        parser.add_argument('--user', required=True, help="Username recorded in the audit trail")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--rejects', help="Write rejected rows to this CSV file")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['user']!r}")
+
+        try:
+            with open(options['path'], newline='', encoding='utf-8-sig') as statement:
+                report = import_statement(statement, user, source=options['path'],
+                                          batch_size=options['batch_size'])
+        except ValidationError as e:
+            raise CommandError(' '.join(e.messages))
+        except (OSError, UnicodeDecodeError, csv.Error) as e:
+            raise CommandError(str(e))
+
+        for line_no, ref, reason in report.rejected:
+            self.stderr.write(f"line {line_no} [{ref or '-'}]: {reason}")
+        if options['rejects'] and report.rejected:
+            with open(options['rejects'], 'w', newline='') as out:
+                writer = csv.writer(out)
+                writer.writerow(['line', 'transaction_id', 'reason'])
+                writer.writerows(report.rejected)
+        self.stdout.write(self.style.SUCCESS(report.summary))
@@ -0,0 +1,48 @@
+import csv
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from core.intake import import_students, read_rows
+
+
+class Command(BaseCommand):
+    help = "Admits every student in a CSV/XLSX intake sheet in bulk (see core/intake.py)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or XLSX intake sheet")
+        parser.add_argument('--user', required=True, help="Username recorded in the audit trail")
+        parser.add_argument('--skip-invalid', action='store_true',
+                            help="Admit the valid rows even if some rows have errors")
+        parser.add_argument('--errors', help="Write row errors to this CSV file")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['user']!r}")
+
+        path = options['path']
+        try:
+            if path.lower().endswith('.xlsx'):
+                with open(path, 'rb') as sheet:
+                    report = import_students(read_rows(sheet, path), user, source=path,
+                                             skip_invalid=options['skip_invalid'])
+            else:
+                with open(path, newline='', encoding='utf-8-sig') as sheet:
+                    report = import_students(read_rows(sheet, path), user, source=path,
+                                             skip_invalid=options['skip_invalid'])
+        except (OSError, ValidationError, csv.Error) as e:
+            raise CommandError(" ".join(getattr(e, 'messages', [str(e)])))
+
+        for line_no, adm, message in report.errors:
+            self.stderr.write(f"line {line_no} [{adm or '-'}]: {message}")
+        if options['errors'] and report.errors:
+            with open(options['errors'], 'w', newline='') as out:
+                writer = csv.writer(out)
+                writer.writerow(['line', 'admission_number', 'error'])
+                writer.writerows(report.errors)
+        if report.errors and not report.created:
+            raise CommandError("Nothing was imported; fix the rows above or use --skip-invalid.")
+        self.stdout.write(self.style.SUCCESS(report.summary))
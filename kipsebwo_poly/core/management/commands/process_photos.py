@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Student
+from core.photos import backfill_photos, unprocessed
+
+
+class Command(BaseCommand):
+    help = ("Strips EXIF from existing passport photos and builds their WebP/JPEG "
+            "derivatives in parallel. Photos already processed are skipped.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help="Processes to use (default: CPU count)")
+        parser.add_argument('--force', action='store_true', help="Re-process every photo")
+
+    def handle(self, *args, **options):
+        students = Student.objects.exclude(passport_photo='').exclude(passport_photo__isnull=True)
+        if not options['force']:
+            students = unprocessed(students)
+
+        def progress(done, total):
+            if options['verbosity'] and (done % 100 == 0 or done == total):
+                self.stdout.write(f"  {done}/{total} photos")
+
+        errors = backfill_photos(students, workers=options['workers'], progress=progress)
+        for student_id, error in sorted(errors.items()):
+            self.stderr.write(f"Student {student_id}: {error}")
+        self.stdout.write(self.style.SUCCESS(f"Done, {len(errors)} photo(s) could not be processed."))
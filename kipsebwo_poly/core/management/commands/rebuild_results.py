@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.results import rebuild_semester_results
+
+
+class Command(BaseCommand):
+    help = "Recomputes every SemesterResult (totals, means, grades, ranks) from Examination."
+
+    def handle(self, *args, **options):
+        created = rebuild_semester_results()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {created} semester result(s)."))
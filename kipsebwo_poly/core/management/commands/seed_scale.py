@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.models import Student
+from core.seeding import BATCH_SIZE, seed, volumes
+
+
+class Command(BaseCommand):
+    help = ("Fills an empty database with production-scale synthetic data (see "
+            "core/seeding.py): 50k students, 1M marks, 300k payments, 500k audit "
+            "entries and thousands of stores items at --scale 1.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help="Multiplies every volume, e.g. 0.01 for a quick local dataset")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed; the same seed gives the same rows")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['scale'] <= 0:
+            raise CommandError("--scale must be positive")
+        # Admission numbers, receipt numbers and usernames would collide with real rows
+        if Student.objects.exists():
+            raise CommandError("The database already has students; seed_scale only fills an empty database.")
+
+        planned = volumes(options['scale'])
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Seeding {connection.vendor} database: "
+            + ", ".join(f"{count:,} {name.replace('_', ' ')}" for name, count in planned.items())))
+        start = time.perf_counter()
+        created = seed(options['scale'], options['seed'], options['batch_size'],
+                       log=lambda message: self.stdout.write(f"  {message}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {sum(created.values()):,} rows in {time.perf_counter() - start:.0f} s: "
+            + ", ".join(f"{count:,} {name.replace('_', ' ')}" for name, count in created.items())))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.replicas import replica_alias
+
+
+class Command(BaseCommand):
+    help = ("Copies the primary SQLite database over the replica, standing in for "
+            "replication when trying the read replica locally (see core/replicas.py).")
+
+    def handle(self, *args, **options):
+        alias = replica_alias()
+        if alias is None:
+            raise CommandError("No replica database is configured.")
+        source, target = connections[DEFAULT_DB_ALIAS], connections[alias]
+        if source.vendor != 'sqlite' or target.vendor != 'sqlite':
+            raise CommandError("Only for a local pair of SQLite databases; a real replica "
+                               "is kept in sync by the database server.")
+        source.ensure_connection()
+        target.ensure_connection()
+        source.connection.backup(target.connection)
+        self.stdout.write(self.style.SUCCESS(f"Copied {source.settings_dict['NAME']} to {target.settings_dict['NAME']}."))
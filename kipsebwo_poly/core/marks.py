@@ -0,0 +1,123 @@
+import csv
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from . import audit
+from .models import Examination, Student
+from .results import refresh_semester_results
+
+MAX_MARKS = 100
+
+
+class MarksSheet:
+    """
+    One subject for one class: every student of `course` with their current
+    Examination row (if any) for the given year of study and semester.
+    """
+
+    def __init__(self, course, year_of_study, semester, subject_name):
+        self.course = course
+        self.year_of_study = str(year_of_study)
+        self.semester = str(semester)
+        self.subject_name = subject_name.strip()
+
+    def students(self):
+        return Student.objects.filter(course=self.course).order_by('admission_number')
+
+    def existing(self):
+        """{student_id: Examination} for this sheet, in one query."""
+        exams = Examination.objects.filter(
+            student__course=self.course, year_of_study=self.year_of_study,
+            semester=self.semester, subject_name__iexact=self.subject_name,
+        ).order_by('id')
+        return {exam.student_id: exam for exam in exams}
+
+    def rows(self):
+        """[(student, Examination or None)] for the grid: two queries in total."""
+        existing = self.existing()
+        return [(s, existing.get(s.pk)) for s in self.students().only('id', 'name', 'admission_number')]
+
+    def save(self, marks_by_student, user):
+        """
+        Applies {student_id: marks} in one transaction: new rows go through
+        bulk_create and changed rows through bulk_update. Writes one audit
+        entry for the whole batch. Returns (created, updated).
+        """
+        for marks in marks_by_student.values():
+            if not 0 <= marks <= MAX_MARKS:
+                raise ValidationError(f"Marks must be between 0 and {MAX_MARKS}.")
+        valid_ids = set(self.students().filter(pk__in=marks_by_student).values_list('pk', flat=True))
+
+        with transaction.atomic():
+            existing = self.existing()
+            to_create, to_update = [], []
+            for student_id, marks in marks_by_student.items():
+                if student_id not in valid_ids:
+                    continue
+                exam = existing.get(student_id)
+                if exam is None:
+                    to_create.append(Examination(
+                        student_id=student_id, subject_name=self.subject_name, marks=marks,
+                        year_of_study=self.year_of_study, semester=self.semester,
+                    ))
+                elif exam.marks != marks:
+                    exam.marks = marks
+                    to_update.append(exam)
+            Examination.objects.bulk_create(to_create)
+            Examination.objects.bulk_update(to_update, ['marks'])
+            # bulk operations skip the Examination signals, so refresh the summaries here
+            refresh_semester_results({e.student_id for e in to_create + to_update})
+            if to_create or to_update:
+                audit.record(user, (
+                    f"Marks sheet {self.subject_name} ({self.course}, Y{self.year_of_study} "
+                    f"S{self.semester}): {len(to_create)} recorded, {len(to_update)} updated"
+                ), action_type='marks')
+        return len(to_create), len(to_update)
+
+    def parse_grid(self, data):
+        """Reads the `marks_<student id>` inputs of the grid; blanks are skipped."""
+        marks = {}
+        for key, value in data.items():
+            if not key.startswith('marks_') or not value.strip():
+                continue
+            try:
+                marks[int(key[len('marks_'):])] = int(value)
+            except ValueError:
+                raise ValidationError(f"'{value}' is not a valid mark.")
+        return marks
+
+    def parse_csv(self, lines):
+        """
+        Reads an uploaded sheet with `admission_number` and `marks` columns
+        and maps it to {student_id: marks} for students in this course.
+        Returns (marks, errors).
+        """
+        reader = csv.DictReader(lines)
+        header = {(name or '').strip().lower(): name for name in reader.fieldnames or []}
+        if 'admission_number' not in header or 'marks' not in header:
+            raise ValidationError("The CSV needs 'admission_number' and 'marks' columns.")
+        rows = []
+        for row in reader:
+            adm = (row.get(header['admission_number']) or '').strip()
+            value = (row.get(header['marks']) or '').strip()
+            if adm and value:
+                rows.append((reader.line_num, adm, value))
+
+        ids = dict(self.students().filter(admission_number__in=[adm for _, adm, _ in rows])
+                   .values_list('admission_number', 'id'))
+        marks, errors = {}, []
+        for line_no, adm, value in rows:
+            if adm not in ids:
+                errors.append(f"Line {line_no}: {adm} is not enrolled in {self.course}")
+                continue
+            try:
+                mark = int(value)
+            except ValueError:
+                errors.append(f"Line {line_no}: '{value}' is not a valid mark")
+                continue
+            if not 0 <= mark <= MAX_MARKS:
+                errors.append(f"Line {line_no}: marks must be between 0 and {MAX_MARKS}")
+                continue
+            marks[ids[adm]] = mark
+        return marks, errors
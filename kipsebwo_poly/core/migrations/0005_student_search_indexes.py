@@ -0,0 +1,81 @@
+from django.db import migrations
+
+# Backend-specific search structures for core.search. PostgreSQL gets pg_trgm
+# GIN indexes; SQLite gets an FTS5 shadow table kept in sync by triggers.
+
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS core_student_name_trgm "
+    "ON core_student USING gin (UPPER(name) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS core_student_admno_trgm "
+    "ON core_student USING gin (UPPER(admission_number) gin_trgm_ops)",
+]
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS core_student_admno_trgm",
+    "DROP INDEX IF EXISTS core_student_name_trgm",
+]
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE core_student_fts USING fts5("
+    "name, admission_number, content='core_student', content_rowid='id', "
+    "tokenize='unicode61', prefix='2 3')",
+    "CREATE TRIGGER core_student_fts_ai AFTER INSERT ON core_student BEGIN "
+    "INSERT INTO core_student_fts(rowid, name, admission_number) "
+    "VALUES (new.id, new.name, new.admission_number); END",
+    "CREATE TRIGGER core_student_fts_ad AFTER DELETE ON core_student BEGIN "
+    "INSERT INTO core_student_fts(core_student_fts, rowid, name, admission_number) "
+    "VALUES ('delete', old.id, old.name, old.admission_number); END",
+    "CREATE TRIGGER core_student_fts_au AFTER UPDATE OF name, admission_number ON core_student BEGIN "
+    "INSERT INTO core_student_fts(core_student_fts, rowid, name, admission_number) "
+    "VALUES ('delete', old.id, old.name, old.admission_number); "
+    "INSERT INTO core_student_fts(rowid, name, admission_number) "
+    "VALUES (new.id, new.name, new.admission_number); END",
+    "INSERT INTO core_student_fts(core_student_fts) VALUES ('rebuild')",
+]
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS core_student_fts_au",
+    "DROP TRIGGER IF EXISTS core_student_fts_ad",
+    "DROP TRIGGER IF EXISTS core_student_fts_ai",
+    "DROP TABLE IF EXISTS core_student_fts",
+]
+
+
+def _sqlite_has_fts5(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return any('FTS5' in row[0] for row in cursor.fetchall())
+
+
+def create_search_structures(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        statements = POSTGRES_FORWARD
+    elif connection.vendor == 'sqlite' and _sqlite_has_fts5(connection):
+        statements = SQLITE_FORWARD
+    else:
+        return
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def drop_search_structures(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        statements = POSTGRES_REVERSE
+    elif connection.vendor == 'sqlite':
+        statements = SQLITE_REVERSE
+    else:
+        return
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_remove_student_id_birth_number'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_structures, drop_search_structures),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations, models
+
+
+def suffix_duplicate_transaction_ids(apps, schema_editor):
+    # Double-submitted forms may already have stored the same reference twice.
+    # Keep the first one as-is and suffix the rest so the constraint can be added.
+    Payment = apps.get_model('core', 'Payment')
+    duplicates = (
+        Payment.objects.exclude(transaction_id__isnull=True).exclude(transaction_id='')
+        .values('transaction_id').annotate(n=models.Count('id')).filter(n__gt=1)
+        .values_list('transaction_id', flat=True)
+    )
+    for transaction_id in list(duplicates):
+        payments = Payment.objects.filter(transaction_id=transaction_id).order_by('id')
+        for payment in payments[1:]:
+            payment.transaction_id = f"{transaction_id}-DUP{payment.pk}"
+            payment.save(update_fields=['transaction_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_student_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(suffix_duplicate_transaction_ids, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='payment',
+            constraint=models.UniqueConstraint(condition=models.Q(('transaction_id__isnull', False), models.Q(('transaction_id', ''), _negated=True)), fields=('transaction_id',), name='unique_payment_transaction_id'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_payment_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SemesterResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year_of_study', models.CharField(choices=[('1', 'Year 1'), ('2', 'Year 2'), ('3', 'Year 3')], max_length=1)),
+                ('semester', models.CharField(choices=[('1', 'Semester 1'), ('2', 'Semester 2')], max_length=1)),
+                ('subject_count', models.PositiveIntegerField(default=0)),
+                ('total_marks', models.PositiveIntegerField(default=0)),
+                ('mean_marks', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('grade', models.CharField(max_length=1)),
+                ('failed_subjects', models.PositiveIntegerField(default=0)),
+                ('rank', models.PositiveIntegerField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='semester_results', to='core.student')),
+            ],
+            options={
+                'ordering': ['year_of_study', 'semester'],
+                'indexes': [models.Index(fields=['year_of_study', 'semester', '-mean_marks'], name='semester_result_rank_idx')],
+                'constraints': [models.UniqueConstraint(fields=('student', 'year_of_study', 'semester'), name='unique_semester_result')],
+            },
+        ),
+    ]
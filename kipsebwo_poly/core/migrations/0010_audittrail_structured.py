@@ -0,0 +1,84 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Free-text prefixes written before action types existed, most specific first
+ACTION_PREFIXES = [
+    ('Registered', 'register'),
+    ('Approved user', 'approve'),
+    ('Admitted student', 'create'),
+    ('Added Consumable', 'create'),
+    ('Added Equipment', 'create'),
+    ('Updated student', 'update'),
+    ('Deleted marks', 'marks'),
+    ('Deleted', 'delete'),
+    ('Recorded marks', 'marks'),
+    ('Updated marks', 'marks'),
+    ('Marks sheet', 'marks'),
+    ('Payment', 'payment'),
+    ('Imported statement', 'import'),
+    ('Started result slips', 'generate'),
+]
+
+
+def classify_existing_entries(apps, schema_editor):
+    AuditTrail = apps.get_model('core', 'AuditTrail')
+    for prefix, action_type in ACTION_PREFIXES:
+        AuditTrail.objects.filter(action_type='other', action__startswith=prefix).update(action_type=action_type)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_audittrail_timestamp_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('action_type', models.CharField(choices=[('create', 'Create'), ('update', 'Update'), ('delete', 'Delete'), ('payment', 'Payment'), ('import', 'Import'), ('marks', 'Marks'), ('generate', 'Generate'), ('register', 'Register'), ('approve', 'Approve'), ('other', 'Other')], max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='audittrail',
+            name='action_type',
+            field=models.CharField(choices=[('create', 'Create'), ('update', 'Update'), ('delete', 'Delete'), ('payment', 'Payment'), ('import', 'Import'), ('marks', 'Marks'), ('generate', 'Generate'), ('register', 'Register'), ('approve', 'Approve'), ('other', 'Other')], default='other', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='audittrail',
+            name='target_id',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='audittrail',
+            name='target_model',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.RunPython(classify_existing_entries, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='audittrail',
+            index=models.Index(fields=['timestamp', 'id'], name='audit_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='audittrail',
+            index=models.Index(fields=['user', 'timestamp'], name='audit_user_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='audittrail',
+            index=models.Index(fields=['action_type', 'timestamp'], name='audit_type_timestamp_idx'),
+        ),
+        migrations.AddField(
+            model_name='auditrollup',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='auditrollup',
+            constraint=models.UniqueConstraint(fields=('month', 'user', 'action_type'), name='unique_audit_rollup'),
+        ),
+    ]
@@ -0,0 +1,86 @@
+import datetime
+
+from django.db import migrations
+
+# PostgreSQL only: rebuilds core_audittrail as a table range-partitioned by
+# month on "timestamp", plus a default partition for anything outside the
+# monthly ones. The primary key becomes (id, timestamp) because a partitioned
+# table's unique keys must include the partition column; Django still treats
+# `id` as the primary key. `id` moves from an identity column to a sequence
+# default (identity columns on partitioned tables need PostgreSQL 17).
+#
+# Later partitions are created by the audit_retention command. Other
+# databases keep the plain table.
+
+TABLE = 'core_audittrail'
+MONTHS_AHEAD = 3
+
+
+def _month_start(value, months=0):
+    index = value.year * 12 + value.month - 1 + months
+    return datetime.datetime(index // 12, index % 12 + 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def partition_audit_trail(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    old = f'{TABLE}_unpartitioned'
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes "
+            "WHERE schemaname = current_schema() AND tablename = %s AND indexname <> %s",
+            [TABLE, f'{TABLE}_pkey'],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(f'SELECT min("timestamp") FROM "{TABLE}"')
+        first = cursor.fetchone()[0]
+
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{old}"')
+        cursor.execute(f'ALTER TABLE "{old}" RENAME CONSTRAINT "{TABLE}_pkey" TO "{old}_pkey"')
+        for name, _ in indexes:
+            cursor.execute(f'ALTER INDEX "{name}" RENAME TO "{name[:50]}_unpart"')
+
+        cursor.execute(
+            f'CREATE TABLE "{TABLE}" (LIKE "{old}" INCLUDING DEFAULTS) PARTITION BY RANGE ("timestamp")'
+        )
+        cursor.execute(f'CREATE SEQUENCE "{TABLE}_id_seq" OWNED BY "{TABLE}".id')
+        cursor.execute(f'ALTER TABLE "{TABLE}" ALTER COLUMN id SET DEFAULT nextval(\'"{TABLE}_id_seq"\')')
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_pkey" PRIMARY KEY (id, "timestamp")')
+        cursor.execute(
+            f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_user_id_fk_auth_user_id" '
+            f'FOREIGN KEY (user_id) REFERENCES auth_user (id) DEFERRABLE INITIALLY DEFERRED'
+        )
+        for _, definition in indexes:
+            # Created on the parent, so every partition gets the same index
+            cursor.execute(definition)
+
+        now = datetime.datetime.now(datetime.timezone.utc)
+        month = _month_start(first or now)
+        last = _month_start(now, MONTHS_AHEAD)
+        while month <= last:
+            cursor.execute(
+                f'CREATE TABLE "{TABLE}_y{month:%Y}m{month:%m}" PARTITION OF "{TABLE}" '
+                f'FOR VALUES FROM (%s) TO (%s)',
+                [month, _month_start(month, 1)],
+            )
+            month = _month_start(month, 1)
+        cursor.execute(f'CREATE TABLE "{TABLE}_default" PARTITION OF "{TABLE}" DEFAULT')
+
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{old}"')
+        cursor.execute(
+            f"SELECT setval('\"{TABLE}_id_seq\"', COALESCE((SELECT max(id) FROM \"{TABLE}\"), 0) + 1, false)"
+        )
+        cursor.execute(f'DROP TABLE "{old}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_audittrail_structured'),
+    ]
+
+    operations = [
+        # Not reversible in place; the partitioned table works for the
+        # earlier schema too, so going back just leaves it as it is.
+        migrations.RunPython(partition_audit_trail, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+# Codes the old model choices offered (the registration form and the
+# decorators always used the plural/full names)
+LEGACY_CODES = {
+    'admission': 'admissions',
+    'exams': 'examinations',
+    'store': 'stores',
+}
+
+
+def normalize_departments(apps, schema_editor):
+    UserProfile = apps.get_model('core', 'UserProfile')
+    for old, new in LEGACY_CODES.items():
+        UserProfile.objects.filter(department=old).update(department=new)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_audittrail_partition'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userprofile',
+            name='department',
+            field=models.CharField(choices=[('finance', 'Finance'), ('admissions', 'Admissions'), ('examinations', 'Examinations'), ('stores', 'Stores')], max_length=20),
+        ),
+        migrations.RunPython(normalize_departments, migrations.RunPython.noop),
+    ]
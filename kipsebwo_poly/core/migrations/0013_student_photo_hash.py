@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+# On SQLite the AddField rebuilds core_student, which drops the FTS triggers
+# 0005 created; core.search.install_fts_triggers() puts them back after the
+# migrate (post_migrate).
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_normalize_departments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='photo_hash',
+            field=models.CharField(blank=True, editable=False, max_length=16),
+        ),
+    ]
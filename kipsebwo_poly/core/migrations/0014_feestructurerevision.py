@@ -0,0 +1,44 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def record_initial_revisions(apps, schema_editor):
+    # Every existing structure starts its history as an initial revision
+    FeeStructure = apps.get_model('core', 'FeeStructure')
+    FeeStructureRevision = apps.get_model('core', 'FeeStructureRevision')
+    FeeStructureRevision.objects.bulk_create([
+        FeeStructureRevision(course=s.course, semester_1=s.semester_1, semester_2=s.semester_2,
+                             semester_3=s.semester_3, note='Initial structure')
+        for s in FeeStructure.objects.all()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_student_photo_hash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeeStructureRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('course', models.CharField(max_length=100)),
+                ('semester_1', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('semester_2', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('semester_3', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('note', models.CharField(blank=True, max_length=255)),
+                ('students_affected', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('revised_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['course', '-created_at'], name='fee_revision_course_idx')],
+            },
+        ),
+        migrations.RunPython(record_initial_revisions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def record_opening_balances(apps, schema_editor):
+    # The ledger of every existing item starts from the balance it has now
+    Consumable = apps.get_model('core', 'Consumable')
+    StockMovement = apps.get_model('core', 'StockMovement')
+    StockMovement.objects.bulk_create([
+        StockMovement(consumable_id=item.pk, kind='adjust', quantity=item.balance_stock,
+                      balance_after=item.balance_stock, date=item.date_supplied,
+                      note='Opening balance', created_by_id=item.added_by_id)
+        for item in Consumable.objects.all()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_feestructurerevision'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('receive', 'Received'), ('issue', 'Issued'), ('adjust', 'Stock count adjustment')], max_length=10)),
+                ('quantity', models.IntegerField()),
+                ('balance_after', models.PositiveIntegerField()),
+                ('date', models.DateField(default=django.utils.timezone.localdate)),
+                ('issued_to', models.CharField(blank=True, max_length=200)),
+                ('note', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='consumable',
+            name='reorder_level',
+            field=models.PositiveIntegerField(default=0, help_text='Reorder when the balance falls to this level'),
+        ),
+        migrations.AlterField(
+            model_name='auditrollup',
+            name='action_type',
+            field=models.CharField(choices=[('create', 'Create'), ('update', 'Update'), ('delete', 'Delete'), ('payment', 'Payment'), ('import', 'Import'), ('marks', 'Marks'), ('generate', 'Generate'), ('register', 'Register'), ('approve', 'Approve'), ('stock', 'Stock movement'), ('other', 'Other')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='audittrail',
+            name='action_type',
+            field=models.CharField(choices=[('create', 'Create'), ('update', 'Update'), ('delete', 'Delete'), ('payment', 'Payment'), ('import', 'Import'), ('marks', 'Marks'), ('generate', 'Generate'), ('register', 'Register'), ('approve', 'Approve'), ('stock', 'Stock movement'), ('other', 'Other')], default='other', max_length=20),
+        ),
+        migrations.AddConstraint(
+            model_name='consumable',
+            constraint=models.CheckConstraint(condition=models.Q(('balance_stock__gte', 0)), name='consumable_stock_non_negative'),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='consumable',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='core.consumable'),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='created_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['consumable', '-created_at'], name='stock_movement_item_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['kind', 'date'], name='stock_movement_kind_date_idx'),
+        ),
+        migrations.RunPython(record_opening_balances, migrations.RunPython.noop),
+    ]
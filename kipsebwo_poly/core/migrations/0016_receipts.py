@@ -0,0 +1,55 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def number_existing_payments(apps, schema_editor):
+    # Existing payments get numbers in date order within their (local) year.
+    # Their snapshot is rendered on first print.
+    Payment = apps.get_model('core', 'Payment')
+    Receipt = apps.get_model('core', 'Receipt')
+    ReceiptSequence = apps.get_model('core', 'ReceiptSequence')
+    last = {}
+    receipts = []
+    for pk, date in Payment.objects.order_by('date', 'id').values_list('id', 'date').iterator():
+        year = timezone.localtime(date).year if timezone.is_aware(date) else date.year
+        last[year] = last.get(year, 0) + 1
+        receipts.append(Receipt(payment_id=pk, year=year, number=last[year], issued_at=date))
+    Receipt.objects.bulk_create(receipts, batch_size=500)
+    ReceiptSequence.objects.bulk_create([ReceiptSequence(year=y, last_number=n) for y, n in last.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_stock_movements'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReceiptSequence',
+            fields=[
+                ('year', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('last_number', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Receipt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveIntegerField()),
+                ('number', models.PositiveIntegerField()),
+                ('html', models.TextField(blank=True)),
+                ('issued_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('issued_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('payment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='receipt', to='core.payment')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('year', 'number'), name='unique_receipt_number')],
+            },
+        ),
+        migrations.RunPython(number_existing_payments, migrations.RunPython.noop),
+    ]
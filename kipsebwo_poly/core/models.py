@@ -1,15 +1,17 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
+from django.utils import timezone
 
 #tracks the user's requested department, their approval status, and define the department choices.
 class UserProfile(models.Model):
+    # Codes match the department_required() names and URL names (see core/rbac.py)
     DEPARTMENT_CHOICES = [
         ('finance', 'Finance'),
-        ('admission', 'Admission'),
-        ('exams', 'Examinations'),
-        ('store', 'Store'),
+        ('admissions', 'Admissions'),
+        ('examinations', 'Examinations'),
+        ('stores', 'Stores'),
     ]
     
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -21,9 +23,53 @@ class UserProfile(models.Model):
 
 # 1. Audit Trail
 class AuditTrail(models.Model):
+    ACTION_TYPES = [
+        ('create', 'Create'),
+        ('update', 'Update'),
+        ('delete', 'Delete'),
+        ('payment', 'Payment'),
+        ('import', 'Import'),
+        ('marks', 'Marks'),
+        ('generate', 'Generate'),
+        ('register', 'Register'),
+        ('approve', 'Approve'),
+        ('stock', 'Stock movement'),
+        ('other', 'Other'),
+    ]
+
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     action = models.CharField(max_length=255)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    action_type = models.CharField(max_length=20, choices=ACTION_TYPES, default='other')
+    # What the action was about, e.g. ('student', '42'); blank for batch actions
+    target_model = models.CharField(max_length=50, blank=True)
+    target_id = models.CharField(max_length=64, blank=True)
+    # Not auto_now_add: buffered entries keep the time they were recorded (core/audit.py)
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # On PostgreSQL the table is range-partitioned by month on timestamp
+        # (migration 0011); the audit_retention command maintains partitions.
+        indexes = [
+            models.Index(fields=['timestamp', 'id'], name='audit_timestamp_idx'),
+            models.Index(fields=['user', 'timestamp'], name='audit_user_timestamp_idx'),
+            models.Index(fields=['action_type', 'timestamp'], name='audit_type_timestamp_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.timestamp:%Y-%m-%d %H:%M} {self.user_id}: {self.action}"
+
+
+class AuditRollup(models.Model):
+    """Monthly counts kept for audit entries removed by the retention policy."""
+    month = models.DateField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    action_type = models.CharField(max_length=20, choices=AuditTrail.ACTION_TYPES)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['month', 'user', 'action_type'], name='unique_audit_rollup'),
+        ]
 
 # 2. Student Model
 
@@ -54,6 +100,8 @@ class Student(models.Model):
     residence = models.CharField(max_length=20, choices=RESIDENCE_CHOICES, default='Day Scholar')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Active')
     passport_photo = models.ImageField(upload_to='student_photos/', blank=True, null=True)
+    # Content hash of the processed photo; names its derivatives (core/photos.py)
+    photo_hash = models.CharField(max_length=16, blank=True, editable=False)
 
     def __str__(self):
         return f"{self.admission_number} - {self.name}"
@@ -109,6 +157,32 @@ class Examination(models.Model):
         # This ensures that when we fetch exams, they are always ordered
         # This makes the {% regroup %} logic in your HTML work perfectly
         ordering = ['year_of_study', 'semester', 'subject_name']
+# Per-student semester summary of Examination rows, maintained by core.results
+class SemesterResult(models.Model):
+    student = models.ForeignKey('Student', on_delete=models.CASCADE, related_name='semester_results')
+    year_of_study = models.CharField(max_length=1, choices=Examination.YEAR_CHOICES)
+    semester = models.CharField(max_length=1, choices=Examination.SEM_CHOICES)
+    subject_count = models.PositiveIntegerField(default=0)
+    total_marks = models.PositiveIntegerField(default=0)
+    mean_marks = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    grade = models.CharField(max_length=1)
+    failed_subjects = models.PositiveIntegerField(default=0)
+    # Position within the course for this year/semester (1 = best mean)
+    rank = models.PositiveIntegerField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.student.name} - Y{self.year_of_study} S{self.semester}: {self.mean_marks} ({self.grade})"
+
+    class Meta:
+        ordering = ['year_of_study', 'semester']
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'year_of_study', 'semester'], name='unique_semester_result'),
+        ]
+        indexes = [
+            models.Index(fields=['year_of_study', 'semester', '-mean_marks'], name='semester_result_rank_idx'),
+        ]
+
 # 4. Fee Structure
 class FeeStructure(models.Model):
     course = models.CharField(max_length=100, unique=True)
@@ -116,6 +190,24 @@ class FeeStructure(models.Model):
     semester_2 = models.DecimalField(max_digits=10, decimal_places=2)
     semester_3 = models.DecimalField(max_digits=10, decimal_places=2)
 
+
+class FeeStructureRevision(models.Model):
+    """One saved version of a course's fee structure (see core/fees.py)."""
+    course = models.CharField(max_length=100)
+    semester_1 = models.DecimalField(max_digits=10, decimal_places=2)
+    semester_2 = models.DecimalField(max_digits=10, decimal_places=2)
+    semester_3 = models.DecimalField(max_digits=10, decimal_places=2)
+    note = models.CharField(max_length=255, blank=True)
+    students_affected = models.PositiveIntegerField(default=0)
+    revised_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['course', '-created_at'], name='fee_revision_course_idx')]
+
+    def __str__(self):
+        return f"{self.course} @ {self.created_at:%Y-%m-%d %H:%M}"
+
 # 5. Fee Balance
 class FeeBalance(models.Model):
     student = models.OneToOneField(Student, on_delete=models.CASCADE, related_name='feebalance')
@@ -140,18 +232,105 @@ class Payment(models.Model):
     def __str__(self):
         return f"{self.student.name} - {self.amount} ({self.date.strftime('%Y-%m-%d')})"
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of the payment history walks (date, id) backwards
+            models.Index(fields=['-date', '-id'], name='payment_date_id_idx'),
+        ]
+        constraints = [
+            # Idempotency key for core.payments.post_payment: a reference can only be posted once
+            models.UniqueConstraint(
+                fields=['transaction_id'],
+                condition=models.Q(transaction_id__isnull=False) & ~models.Q(transaction_id=''),
+                name='unique_payment_transaction_id',
+            ),
+        ]
+
+class ReceiptSequence(models.Model):
+    """Last receipt number issued in a year; the row is locked while a number is allocated."""
+    year = models.PositiveIntegerField(primary_key=True)
+    last_number = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.year}: {self.last_number}"
+
+
+class Receipt(models.Model):
+    """
+    The receipt of a payment: its number in the year's sequence and the HTML
+    rendered when it was issued (see core/receipts.py). Reprints serve that
+    snapshot unchanged.
+    """
+    payment = models.OneToOneField(Payment, on_delete=models.CASCADE, related_name='receipt')
+    year = models.PositiveIntegerField()
+    number = models.PositiveIntegerField()
+    html = models.TextField(blank=True)
+    issued_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    issued_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['year', 'number'], name='unique_receipt_number'),
+        ]
+
+    @property
+    def receipt_no(self):
+        return f"RCT/{self.year}/{self.number:05d}"
+
+    def __str__(self):
+        return self.receipt_no
+
 # --- STORES MODELS ---
 
 class Consumable(models.Model):
     item_name = models.CharField(max_length=200)
     date_supplied = models.DateField()
+    # Only changed through core/stores.py, which records a StockMovement for each change
     balance_stock = models.PositiveIntegerField(default=0)
+    reorder_level = models.PositiveIntegerField(default=0, help_text="Reorder when the balance falls to this level")
     last_date_issued = models.DateField(null=True, blank=True)
     added_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
 
     def __str__(self):
         return f"{self.item_name} ({self.balance_stock} left)"
 
+    @property
+    def needs_reorder(self):
+        return self.balance_stock <= self.reorder_level
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(condition=models.Q(balance_stock__gte=0), name='consumable_stock_non_negative'),
+        ]
+
+
+class StockMovement(models.Model):
+    """One receipt, issue or stock-count adjustment of a Consumable (see core/stores.py)."""
+    KIND_CHOICES = [
+        ('receive', 'Received'),
+        ('issue', 'Issued'),
+        ('adjust', 'Stock count adjustment'),
+    ]
+    consumable = models.ForeignKey(Consumable, on_delete=models.CASCADE, related_name='movements')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # Signed: positive into the store, negative out of it
+    quantity = models.IntegerField()
+    balance_after = models.PositiveIntegerField()
+    date = models.DateField(default=timezone.localdate)
+    issued_to = models.CharField(max_length=200, blank=True)
+    note = models.CharField(max_length=255, blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['consumable', '-created_at'], name='stock_movement_item_idx'),
+            models.Index(fields=['kind', 'date'], name='stock_movement_kind_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.quantity:+d} {self.consumable.item_name}"
+
 class PermanentEquipment(models.Model):
     CONDITION_CHOICES = [
         ('Good', 'Good'),
@@ -179,4 +358,61 @@ def create_student_financials(sender, instance, created, **kwargs):
                 sem3_bal=struct.semester_3
             )
         except FeeStructure.DoesNotExist:
-            FeeBalance.objects.create(student=instance)
\ No newline at end of file
+            FeeBalance.objects.create(student=instance)
+
+@receiver(post_save, sender=Student)
+def process_passport_photo(sender, instance, **kwargs):
+    from .photos import is_processed, process_student_photo
+    if instance.passport_photo and not is_processed(instance):
+        # After commit, so a rolled back upload is never processed
+        transaction.on_commit(lambda: process_student_photo(instance.pk))
+
+@receiver(pre_save, sender=Examination)
+def remember_examination_owner(sender, instance, **kwargs):
+    # An edit can move marks to another student; both summaries need refreshing
+    instance._previous_student_id = None
+    if instance.pk:
+        instance._previous_student_id = (
+            Examination.objects.filter(pk=instance.pk).values_list('student_id', flat=True).first()
+        )
+
+@receiver(post_save, sender=Examination)
+def refresh_results_on_save(sender, instance, **kwargs):
+    from .results import refresh_semester_results
+    student_ids = {instance.student_id, getattr(instance, '_previous_student_id', None)} - {None}
+    refresh_semester_results(student_ids)
+
+@receiver(post_delete, sender=Examination)
+def refresh_results_on_delete(sender, instance, origin=None, **kwargs):
+    from .results import refresh_after_delete, refresh_semester_results
+    if origin is None or origin is instance:
+        refresh_semester_results({instance.student_id})
+    elif getattr(origin, 'model', type(origin)) is not Student:
+        # Several rows at once: refresh their students once, after the delete
+        refresh_after_delete(origin, student_ids={instance.student_id})
+    # A student's own delete takes their results with it; see rerank_before_student_delete
+
+@receiver(pre_save, sender=Student)
+def remember_student_course(sender, instance, update_fields=None, **kwargs):
+    # A student who changes course leaves one ranked cohort and joins another
+    instance._previous_course = None
+    if instance.pk and (update_fields is None or 'course' in update_fields):
+        instance._previous_course = (
+            Student.objects.filter(pk=instance.pk).values_list('course', flat=True).first()
+        )
+
+@receiver(post_save, sender=Student)
+def rerank_on_course_change(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_course', None)
+    if not created and previous is not None and previous != instance.course:
+        from .results import rank_after_course_change
+        rank_after_course_change(instance, previous)
+
+@receiver(pre_delete, sender=Student)
+def rerank_before_student_delete(sender, instance, origin=None, **kwargs):
+    # Their results are about to go; the rest of each cohort moves up after the delete
+    from .results import refresh_after_delete
+    cohorts = {(instance.course, year, semester)
+               for year, semester in instance.semester_results.values_list('year_of_study', 'semester')}
+    if cohorts:
+        refresh_after_delete(origin if origin is not None else instance, cohorts=cohorts)
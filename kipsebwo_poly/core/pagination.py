@@ -0,0 +1,104 @@
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+PAGE_SIZE = 50
+
+
+class KeysetPage:
+    """A page of rows plus opaque cursors for the pages either side of it."""
+
+    def __init__(self, object_list, next_cursor, prev_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+
+def encode_cursor(values):
+    raw = json.dumps([str(v) for v in values]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(model, fields, cursor):
+    """Returns the python values stored in `cursor`, or None if it is invalid."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if len(values) != len(fields):
+            return None
+        return [model._meta.get_field(f).to_python(v) for f, v in zip(fields, values)]
+    except (ValueError, TypeError, FieldDoesNotExist, ValidationError):
+        return None
+
+
+def _after(fields, values, descending):
+    # (a, b) < (x, y)  ==  a < x OR (a = x AND b < y), spelled out so any
+    # backend can use the composite index.
+    op = 'lt' if descending else 'gt'
+    condition = Q()
+    for i, field in enumerate(fields):
+        clause = Q(**{f'{field}__{op}': values[i]})
+        for prev_field, prev_value in zip(fields[:i], values[:i]):
+            clause &= Q(**{prev_field: prev_value})
+        condition |= clause
+    return condition
+
+
+def keyset_paginate(queryset, fields=('date', 'id'), after=None, before=None,
+                    page_size=PAGE_SIZE):
+    """
+    Keyset (seek) pagination over `queryset` in descending `fields` order.
+    Unlike OFFSET paging the cost of a page does not grow with its depth:
+    each page is one indexed range scan of page_size + 1 rows.
+
+    Pass the `after` cursor of the previous page to move forward, or the
+    `before` cursor to step back. The last field must be unique (the pk).
+    """
+    model = queryset.model
+    fields = list(fields)
+    descending_order = [f'-{f}' for f in fields]
+
+    if before:
+        values = decode_cursor(model, fields, before)
+        qs = queryset.order_by(*fields)
+        if values is not None:
+            qs = qs.filter(_after(fields, values, descending=False))
+        rows = list(qs[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        has_next = True
+        has_previous = has_more
+    else:
+        values = decode_cursor(model, fields, after) if after else None
+        qs = queryset.order_by(*descending_order)
+        if values is not None:
+            qs = qs.filter(_after(fields, values, descending=True))
+        rows = list(qs[:page_size + 1])
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        has_previous = values is not None
+
+    def key(row):
+        if isinstance(row, dict):
+            return [row[f] for f in fields]
+        return [getattr(row, f) for f in fields]
+
+    next_cursor = encode_cursor(key(rows[-1])) if rows and has_next else None
+    prev_cursor = encode_cursor(key(rows[0])) if rows and has_previous else None
+    return KeysetPage(rows, next_cursor, prev_cursor)
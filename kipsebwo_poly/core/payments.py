@@ -0,0 +1,86 @@
+import uuid
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from . import audit
+from .receipts import issue_receipt
+from .models import FeeBalance, Payment
+
+# Payment.semester -> the FeeBalance column it is deducted from
+SEMESTER_BALANCE_FIELDS = {'1': 'sem1_bal', '2': 'sem2_bal', '3': 'sem3_bal'}
+
+
+def new_transaction_id():
+    """Reference pre-filled on the payment form for payments without one (cash)."""
+    return f"CASH-{uuid.uuid4().hex[:12].upper()}"
+
+
+def parse_amount(raw):
+    """`raw` as a Decimal that fits Payment.amount, rounded to its decimal places."""
+    try:
+        amount = Decimal(str(raw).strip())
+    except (InvalidOperation, TypeError):
+        raise ValidationError("Enter a valid amount.")
+    if not amount.is_finite() or amount <= 0:
+        raise ValidationError("The amount must be greater than zero.")
+    field = Payment._meta.get_field('amount')
+    cent = Decimal(1).scaleb(-field.decimal_places)
+    limit = Decimal(10) ** (field.max_digits - field.decimal_places) - cent
+    # Compared before rounding too, as quantize() fails on huge values
+    if amount > limit or amount.quantize(cent) > limit:
+        raise ValidationError(f"The amount cannot be more than {limit:,}.")
+    amount = amount.quantize(cent)
+    if amount == 0:
+        raise ValidationError("The amount must be greater than zero.")
+    return amount
+
+
+def post_payment(student, amount, semester, transaction_id, user=None):
+    """
+    Records a payment and deducts it from the student's semester balance.
+
+    Safe under concurrency: the balance is decremented with a single
+    UPDATE ... SET semX_bal = semX_bal - amount, so only that student's
+    FeeBalance row is locked and no update is lost between cashiers.
+
+    Idempotent on transaction_id (unique on Payment): posting the same
+    reference twice returns the original payment and leaves the balance
+    alone. A new payment gets its receipt (core/receipts.py) in the same
+    transaction. Returns (payment, created).
+    """
+    amount = parse_amount(amount)
+    semester = str(semester)
+    field = SEMESTER_BALANCE_FIELDS.get(semester)
+    if field is None:
+        raise ValidationError("Select a valid semester.")
+    transaction_id = (transaction_id or '').strip() or new_transaction_id()
+
+    # Make sure the row exists before the transaction that decrements it.
+    FeeBalance.objects.get_or_create(student=student)
+
+    try:
+        with transaction.atomic():
+            payment = Payment.objects.create(
+                student=student, amount=amount, semester=semester,
+                transaction_id=transaction_id,
+            )
+            FeeBalance.objects.filter(student=student).update(**{field: F(field) - amount})
+            # Numbered in this transaction, so a rolled-back payment leaves no gap
+            issue_receipt(payment, user)
+            if user is not None:
+                audit.record(user, f"Payment {amount} for {student.name}", action_type='payment',
+                             target=payment, strict=True)
+    except IntegrityError:
+        # Lost the race to an identical submission (or a re-post of the form).
+        payment = Payment.objects.filter(transaction_id=transaction_id).first()
+        if payment is None:
+            raise
+        if (payment.student_id, payment.amount, payment.semester) != (student.pk, amount, semester):
+            raise ValidationError(
+                f"Transaction ID {transaction_id} was already used for another payment."
+            )
+        return payment, False
+    return payment, True
@@ -0,0 +1,169 @@
+import hashlib
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections
+from django.db.models import Q, Value
+from django.db.models.functions import Concat
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Passport photo derivatives.
+#
+# An uploaded photo is re-encoded once: EXIF (GPS, camera, orientation) is
+# dropped after applying the orientation, and the result is stored under a
+# content-hash name, so a new photo always gets a new URL and old ones can be
+# cached forever. Alongside it go square WebP + JPEG derivatives for every
+# entry of PHOTO_SIZES at 1x and 2x, used by the {% student_photo %} tag.
+#
+# render_photo() only touches files, so it can run in a worker process; the
+# backfill command (process_photos) runs it over existing photos in a pool.
+
+logger = logging.getLogger(__name__)
+
+PHOTO_DIR = 'student_photos'
+PHOTO_SIZES = {'thumb': 48, 'profile': 200}  # CSS pixels, square
+DENSITIES = (1, 2)
+ORIGINAL_MAX = 1200
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+HASH_LENGTH = 16
+
+
+def original_name(photo_hash):
+    return f"{PHOTO_DIR}/{photo_hash}.jpg"
+
+
+def derivative_name(photo_hash, size, density, ext):
+    suffix = '' if density == 1 else f'@{density}x'
+    return f"{PHOTO_DIR}/{photo_hash}-{size}{suffix}.{ext}"
+
+
+def derivative_names(photo_hash):
+    return [
+        derivative_name(photo_hash, size, density, ext)
+        for size in PHOTO_SIZES for density in DENSITIES for ext in ('webp', 'jpg')
+    ]
+
+
+def is_processed(student):
+    return bool(student.photo_hash) and student.passport_photo.name == original_name(student.photo_hash)
+
+
+def unprocessed(students):
+    """Filters a Student queryset down to photos that still need processing."""
+    return students.exclude(
+        Q(passport_photo=Concat(Value(f'{PHOTO_DIR}/'), 'photo_hash', Value('.jpg'))) & ~Q(photo_hash='')
+    )
+
+
+def _save(image, path, fmt, **params):
+    if path.exists():
+        return  # same hash, same content
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.part')
+    # No exif= argument: Pillow writes no EXIF block unless asked to
+    image.save(tmp, fmt, **params)
+    os.replace(tmp, path)
+
+
+def render_photo(source_path, media_root):
+    """
+    Writes the stripped original and every derivative of the image at
+    `source_path` under `media_root`. Returns the photo hash.
+    """
+    with open(source_path, 'rb') as fh:
+        data = fh.read()
+    photo_hash = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    media_root = Path(media_root)
+
+    with Image.open(io.BytesIO(data)) as upload:
+        image = ImageOps.exif_transpose(upload).convert('RGB')
+
+    original = image.copy()
+    original.thumbnail((ORIGINAL_MAX, ORIGINAL_MAX), Image.LANCZOS)
+    _save(original, media_root / original_name(photo_hash), 'JPEG', quality=90, optimize=True)
+
+    for size, pixels in PHOTO_SIZES.items():
+        for density in DENSITIES:
+            side = pixels * density
+            square = ImageOps.fit(image, (side, side), Image.LANCZOS, centering=(0.5, 0.4))
+            _save(square, media_root / derivative_name(photo_hash, size, density, 'webp'),
+                  'WEBP', quality=WEBP_QUALITY, method=4)
+            _save(square, media_root / derivative_name(photo_hash, size, density, 'jpg'),
+                  'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return photo_hash
+
+
+def apply_photo(student_id, photo_hash, previous_name, previous_hash):
+    """Points the student at the processed photo and removes the files it replaced."""
+    from .models import Student
+    Student.objects.filter(pk=student_id).update(
+        passport_photo=original_name(photo_hash), photo_hash=photo_hash,
+    )
+    # Two students can share a photo, so only remove files no row points at
+    if previous_name and previous_name != original_name(photo_hash):
+        if not Student.objects.filter(passport_photo=previous_name).exists():
+            default_storage.delete(previous_name)
+    if previous_hash and previous_hash != photo_hash:
+        if not Student.objects.filter(photo_hash=previous_hash).exists():
+            for name in [original_name(previous_hash), *derivative_names(previous_hash)]:
+                default_storage.delete(name)
+
+
+def process_student_photo(student_id):
+    """Processes one student's photo in this process (called after an upload commits)."""
+    from .models import Student
+    student = Student.objects.filter(pk=student_id).only('passport_photo', 'photo_hash').first()
+    if student is None or not student.passport_photo or is_processed(student):
+        return
+    try:
+        photo_hash = render_photo(default_storage.path(student.passport_photo.name), settings.MEDIA_ROOT)
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+        # Keep the upload as it is; the backfill command will report it
+        logger.exception("Could not process passport photo of student %s", student_id)
+        return
+    apply_photo(student_id, photo_hash, student.passport_photo.name, student.photo_hash)
+
+
+def _render_job(student_id, source_path, media_root):
+    try:
+        return student_id, render_photo(source_path, media_root), ''
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+        return student_id, None, str(e)
+
+
+def backfill_photos(students, workers=None, progress=None):
+    """
+    Renders the photos of `students` (a queryset) in a process pool and
+    applies the results from this process. Returns {student_id: error} for
+    photos that could not be processed.
+    """
+    pending = {
+        s.pk: (s.passport_photo.name, s.photo_hash)
+        for s in students.exclude(passport_photo='').exclude(passport_photo__isnull=True)
+        .only('passport_photo', 'photo_hash')
+    }
+    errors = {}
+    if not pending:
+        return errors
+    # Forked workers must not share this process's DB sockets
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(_render_job, pk, default_storage.path(name), str(settings.MEDIA_ROOT))
+            for pk, (name, _) in pending.items()
+        ]
+        for done, future in enumerate(as_completed(futures), 1):
+            student_id, photo_hash, error = future.result()
+            if photo_hash is None:
+                errors[student_id] = error
+            else:
+                apply_photo(student_id, photo_hash, *pending[student_id])
+            if progress:
+                progress(done, len(futures))
+    return errors
@@ -0,0 +1,120 @@
+from typing import NamedTuple
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.functional import SimpleLazyObject
+
+from .models import UserProfile
+
+# Department access decisions.
+#
+# ProfileBackend loads the user and their UserProfile in the one query
+# AuthenticationMiddleware already makes. DepartmentMiddleware exposes the
+# decision as request.department, cached per user in the Django cache and
+# dropped by the User/UserProfile signals below, so department_required
+# costs no queries of its own.
+#
+# The default cache is per process (locmem): a change saved in one worker
+# reaches the others after RBAC_CACHE_TIMEOUT. Point CACHES at a shared
+# backend to make invalidation immediate everywhere.
+
+# Older rows and code used singular/short names for the same departments
+DEPARTMENT_ALIASES = {
+    'admission': 'admissions',
+    'exams': 'examinations',
+    'exam': 'examinations',
+    'store': 'stores',
+}
+
+
+def normalize_department(code):
+    code = (code or '').strip().lower()
+    return DEPARTMENT_ALIASES.get(code, code)
+
+
+class Access(NamedTuple):
+    department: str = ''
+    is_approved: bool = False
+    is_superuser: bool = False
+    is_staff: bool = False
+
+    def allows(self, department):
+        if self.is_superuser:
+            return True
+        return self.is_approved and self.department == normalize_department(department)
+
+    def __str__(self):
+        return self.department
+
+
+ANONYMOUS = Access()
+
+
+def _cache_key(user_id):
+    return f"rbac:access:{user_id}"
+
+
+def access_for(user):
+    """The cached Access of `user`; on a miss it is built from the already-loaded profile."""
+    if not user.is_authenticated:
+        return ANONYMOUS
+    key = _cache_key(user.pk)
+    cached = cache.get(key)
+    if cached is not None:
+        return Access(*cached)
+    profile = getattr(user, 'userprofile', None)
+    access = Access(
+        department=normalize_department(profile.department) if profile else '',
+        is_approved=bool(profile and profile.is_approved),
+        is_superuser=user.is_superuser,
+        is_staff=user.is_staff,
+    )
+    cache.set(key, tuple(access), getattr(settings, 'RBAC_CACHE_TIMEOUT', 300))
+    return access
+
+
+def request_access(request):
+    """The Access of request.user, from DepartmentMiddleware when it has run."""
+    return getattr(request, 'department', None) or access_for(request.user)
+
+
+def invalidate(*user_ids):
+    cache.delete_many([_cache_key(user_id) for user_id in user_ids])
+
+
+class ProfileBackend(ModelBackend):
+    """ModelBackend whose per-request user lookup joins the UserProfile."""
+
+    def get_user(self, user_id):
+        try:
+            user = User._default_manager.select_related('userprofile').get(pk=user_id)
+        except User.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+
+class DepartmentMiddleware:
+    """Sets request.department (an Access) lazily; goes after AuthenticationMiddleware."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.department = SimpleLazyObject(lambda: access_for(request.user))
+        return self.get_response(request)
+
+
+@receiver(post_save, sender=User, dispatch_uid='core.rbac.user_saved')
+@receiver(post_delete, sender=User, dispatch_uid='core.rbac.user_deleted')
+def _user_changed(sender, instance, **kwargs):
+    invalidate(instance.pk)
+
+
+@receiver(post_save, sender=UserProfile, dispatch_uid='core.rbac.profile_saved')
+@receiver(post_delete, sender=UserProfile, dispatch_uid='core.rbac.profile_deleted')
+def _profile_changed(sender, instance, **kwargs):
+    invalidate(instance.user_id)
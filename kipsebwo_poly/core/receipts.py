@@ -0,0 +1,71 @@
+from django.db import transaction
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Receipt, ReceiptSequence
+
+# Receipt numbering and snapshots.
+#
+# Numbers run from 1 in each calendar year with no gaps. A number is taken by
+# incrementing that year's ReceiptSequence row inside the payment's own
+# transaction: the UPDATE locks just that row until the payment commits, and
+# if the payment rolls back so does the increment, so no number is skipped.
+#
+# The receipt is rendered once, when it is issued, and stored on the Receipt.
+# Reprints (single or in batches) serve that HTML as it was issued.
+
+BATCH_PRINT_LIMIT = 500
+
+
+def receipt_year(payment):
+    return timezone.localtime(payment.date).year
+
+
+def allocate(year, count=1):
+    """Reserves `count` consecutive numbers in `year`; returns the first. Call inside a transaction."""
+    ReceiptSequence.objects.get_or_create(year=year)
+    ReceiptSequence.objects.filter(year=year).update(last_number=F('last_number') + count)
+    last = ReceiptSequence.objects.values_list('last_number', flat=True).get(year=year)
+    return last - count + 1
+
+
+def render_receipt(receipt):
+    return render_to_string('receipt_snapshot.html', {
+        'receipt': receipt, 'payment': receipt.payment, 'issued_by': receipt.issued_by,
+    })
+
+
+def issue_receipts(payments, user=None):
+    """
+    Numbers and renders receipts for newly created `payments` (with their
+    student loaded). Must run in the transaction that created them.
+    """
+    by_year = {}
+    for payment in payments:
+        by_year.setdefault(receipt_year(payment), []).append(payment)
+
+    receipts = []
+    with transaction.atomic():
+        # Fixed year order, so two batches never wait on each other's rows crosswise
+        for year in sorted(by_year):
+            first = allocate(year, len(by_year[year]))
+            for offset, payment in enumerate(by_year[year]):
+                receipt = Receipt(payment=payment, year=year, number=first + offset,
+                                  issued_by=user, issued_at=timezone.now())
+                receipt.html = render_receipt(receipt)
+                receipts.append(receipt)
+        Receipt.objects.bulk_create(receipts)
+    return receipts
+
+
+def issue_receipt(payment, user=None):
+    return issue_receipts([payment], user)[0]
+
+
+def snapshot(receipt):
+    """The stored HTML; receipts numbered before snapshots existed are rendered once and kept."""
+    if not receipt.html:
+        receipt.html = render_receipt(receipt)
+        Receipt.objects.filter(pk=receipt.pk, html='').update(html=receipt.html)
+    return receipt.html
@@ -0,0 +1,167 @@
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, InterfaceError, OperationalError, connections
+
+# Read replica routing.
+#
+# Views decorated with @read_replica only read (listings and reports). On
+# GET/HEAD, ReplicaMiddleware points the reads of `core` models at the
+# REPLICA_DATABASE alias for the rest of the request; everything else, and
+# every write, goes to the primary ('default'). Auth and session tables
+# always stay on the primary, so a login is never lost to replication lag.
+#
+# Read-your-writes: a POST, or any request that wrote a `core` row, pins the
+# session to the primary for REPLICA_PIN_SECONDS, so the page a user is
+# redirected to after saving shows what they saved.
+#
+# Fallback: a replica that cannot be reached (or, on PostgreSQL, is more than
+# REPLICA_MAX_LAG seconds behind) is skipped for REPLICA_RETRY_SECONDS. A
+# connection error while a view reads from it re-runs the view on the primary.
+#
+# Without a REPLICA_DATABASE entry in DATABASES everything reads from the
+# primary. Locally, two SQLite files stand in for a primary and a replica:
+#
+#     DATABASES['replica'] = {'ENGINE': 'django.db.backends.sqlite3',
+#                             'NAME': BASE_DIR / 'replica.sqlite3'}
+#
+# then `manage.py migrate --database replica` once, and `manage.py
+# sync_replica` whenever the replica should catch up with the primary.
+
+logger = logging.getLogger(__name__)
+
+ROUTED_APPS = {'core'}
+PIN_SESSION_KEY = '_replica_pinned_until'
+SAFE_METHODS = ('GET', 'HEAD')
+
+# Alias reads go to in this request/task (None: the primary)
+_reads = contextvars.ContextVar('core_replica_reads', default=None)
+# Whether this request has written a routed row
+_wrote = contextvars.ContextVar('core_replica_wrote', default=False)
+# alias -> time.monotonic() until which it is considered down
+_down_until = {}
+
+
+def replica_alias():
+    """The configured replica alias, or None."""
+    alias = getattr(settings, 'REPLICA_DATABASE', 'replica')
+    return alias if alias and alias in settings.DATABASES else None
+
+
+def read_replica(view):
+    """Marks a view whose GET/HEAD requests only read. Put it above the other decorators."""
+    view.reads_from_replica = True
+    return view
+
+
+@contextmanager
+def reading_from(alias):
+    """Routes reads of core models to `alias` (None: the primary) inside the block."""
+    token = _reads.set(alias)
+    try:
+        yield
+    finally:
+        _reads.reset(token)
+
+
+def primary():
+    """Reads inside the block go to the primary, e.g. to fill a cache shared with other requests."""
+    return reading_from(None)
+
+
+def mark_down(alias, error):
+    logger.warning("Read replica %r unavailable, using the primary: %s", alias, error)
+    _down_until[alias] = time.monotonic() + getattr(settings, 'REPLICA_RETRY_SECONDS', 30)
+
+
+def _lag(connection):
+    """Seconds the PostgreSQL replica is behind; 0 when it has replayed everything it received."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+            "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+        )
+        return cursor.fetchone()[0] or 0
+
+
+def available(alias):
+    if _down_until.get(alias, 0) > time.monotonic():
+        return False
+    connection = connections[alias]
+    try:
+        connection.ensure_connection()
+        max_lag = getattr(settings, 'REPLICA_MAX_LAG', None)
+        if max_lag is not None and connection.vendor == 'postgresql':
+            lag = _lag(connection)
+            if lag > max_lag:
+                mark_down(alias, f"{lag:.0f}s behind the primary")
+                return False
+    except (OperationalError, InterfaceError) as e:
+        mark_down(alias, e)
+        return False
+    return True
+
+
+def pinned(request):
+    session = getattr(request, 'session', None)
+    return session is not None and session.get(PIN_SESSION_KEY, 0) > time.time()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in ROUTED_APPS:
+            # Explicit, so rows read from the replica never send related lookups back there
+            return _reads.get() or DEFAULT_DB_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label in ROUTED_APPS:
+            _wrote.set(True)
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+
+class ReplicaMiddleware:
+    """Routes @read_replica views to the replica and pins sessions after writes; place after the auth middleware."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reads_token, wrote_token = _reads.set(None), _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            user = getattr(request, 'user', None)
+            wrote = request.method not in SAFE_METHODS or _wrote.get()
+            if wrote and user and user.is_authenticated and replica_alias():
+                request.session[PIN_SESSION_KEY] = time.time() + getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+        finally:
+            _reads.reset(reads_token)
+            _wrote.reset(wrote_token)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in SAFE_METHODS or not getattr(view_func, 'reads_from_replica', False):
+            return None
+        alias = replica_alias()
+        if alias and not pinned(request) and available(alias):
+            _reads.set(alias)
+        return None
+
+    def process_exception(self, request, exception):
+        alias = _reads.get()
+        if alias is None or not isinstance(exception, (OperationalError, InterfaceError)):
+            return None
+        mark_down(alias, exception)
+        _reads.set(None)
+        match = request.resolver_match
+        return match.func(request, *match.args, **match.kwargs)
@@ -0,0 +1,175 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.db.models import Avg, Count, F, Q, Sum, Window
+from django.db.models.functions import Rank
+from django.utils import timezone
+
+from .models import Examination, SemesterResult, Student
+
+PASS_MARK = 40
+# Lowest mark for each letter grade, best first; anything below is an E (Fail)
+GRADE_BOUNDARIES = [(70, 'A'), (60, 'B'), (50, 'C'), (PASS_MARK, 'D')]
+REBUILD_BATCH_SIZE = 2000
+RESULT_FIELDS = ['subject_count', 'total_marks', 'mean_marks', 'grade', 'failed_subjects']
+
+
+def grade_for(marks):
+    for lowest, grade in GRADE_BOUNDARIES:
+        if marks >= lowest:
+            return grade
+    return 'E'
+
+
+def _semester_aggregates(exams):
+    """One GROUP BY over Examination: count/total/mean/failed per student-semester."""
+    return (
+        exams.order_by()
+        .values('student_id', 'year_of_study', 'semester')
+        .annotate(
+            subject_count=Count('id'),
+            total_marks=Sum('marks'),
+            mean_marks=Avg('marks'),
+            failed_subjects=Count('id', filter=Q(marks__lt=PASS_MARK)),
+        )
+    )
+
+
+def _result_fields(row):
+    mean = Decimal(str(row['mean_marks'])).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    return {
+        'subject_count': row['subject_count'],
+        'total_marks': row['total_marks'],
+        'mean_marks': mean,
+        'grade': grade_for(mean),
+        'failed_subjects': row['failed_subjects'],
+    }
+
+
+def rank_cohorts(cohorts=None):
+    """
+    Recomputes SemesterResult.rank within each (course, year, semester) cohort
+    from one windowed query, writing back only the ranks that changed.
+    `cohorts` is an iterable of (course, year_of_study, semester); None means all.
+    """
+    results = SemesterResult.objects.all()
+    if cohorts is not None:
+        cohort_filter = Q()
+        for course, year, semester in cohorts:
+            cohort_filter |= Q(student__course=course, year_of_study=year, semester=semester)
+        if not cohort_filter:
+            return
+        results = results.filter(cohort_filter)
+
+    ranked = results.annotate(new_rank=Window(
+        expression=Rank(),
+        partition_by=[F('student__course'), F('year_of_study'), F('semester')],
+        order_by=F('mean_marks').desc(),
+    )).only('id', 'rank')
+
+    changed = []
+    now = timezone.now()
+    for result in ranked.iterator(chunk_size=REBUILD_BATCH_SIZE):
+        if result.rank != result.new_rank:
+            result.rank = result.new_rank
+            result.updated_at = now
+            changed.append(result)
+    # bulk_update does not apply auto_now, so updated_at is set above
+    SemesterResult.objects.bulk_update(changed, ['rank', 'updated_at'], batch_size=REBUILD_BATCH_SIZE)
+
+
+def refresh_semester_results(student_ids):
+    """
+    Incremental update after Examination rows of `student_ids` changed:
+    re-aggregates just those students, creates/updates/deletes their summary
+    rows, then re-ranks the cohorts they belong to.
+    """
+    student_ids = set(student_ids)
+    if not student_ids:
+        return
+    with transaction.atomic():
+        fresh = {
+            (row['student_id'], row['year_of_study'], row['semester']): _result_fields(row)
+            for row in _semester_aggregates(Examination.objects.filter(student_id__in=student_ids))
+        }
+        existing = {
+            (r.student_id, r.year_of_study, r.semester): r
+            for r in SemesterResult.objects.filter(student_id__in=student_ids)
+        }
+
+        to_create, to_update = [], []
+        now = timezone.now()
+        for key, fields in fresh.items():
+            result = existing.get(key)
+            if result is None:
+                to_create.append(SemesterResult(
+                    student_id=key[0], year_of_study=key[1], semester=key[2], **fields
+                ))
+            elif any(getattr(result, name) != value for name, value in fields.items()):
+                for name, value in fields.items():
+                    setattr(result, name, value)
+                result.updated_at = now
+                to_update.append(result)
+        stale = [r.pk for key, r in existing.items() if key not in fresh]
+
+        SemesterResult.objects.bulk_create(to_create)
+        SemesterResult.objects.bulk_update(to_update, [*RESULT_FIELDS, 'updated_at'])
+        if stale:
+            SemesterResult.objects.filter(pk__in=stale).delete()
+
+        courses = dict(Student.objects.filter(pk__in=student_ids).values_list('id', 'course'))
+        rank_cohorts({
+            (courses[student_id], year, semester)
+            for student_id, year, semester in set(fresh) | set(existing)
+            if student_id in courses
+        })
+
+
+def rank_after_course_change(student, previous_course):
+    """Re-ranks the cohorts `student` left and joined, for every term they have results in."""
+    terms = set(SemesterResult.objects.filter(student=student).values_list('year_of_study', 'semester'))
+    rank_cohorts({(course, year, semester)
+                  for course in (previous_course, student.course) for year, semester in terms})
+
+
+def _refresh_deleted(student_ids, cohorts):
+    refresh_semester_results(student_ids)
+    rank_cohorts(cohorts)
+
+
+def refresh_after_delete(origin, student_ids=(), cohorts=()):
+    """
+    Refreshes the results of `student_ids` and re-ranks `cohorts` once the
+    delete started by `origin` (the instance or queryset delete() was called
+    on) commits, instead of once for every row its cascade removes.
+    """
+    pending = getattr(origin, '_pending_results', None)
+    if pending is None:
+        pending = origin._pending_results = (set(), set())
+        transaction.on_commit(lambda: _refresh_deleted(*pending))
+    pending[0].update(student_ids)
+    pending[1].update(cohorts)
+
+
+def rebuild_semester_results():
+    """
+    Full set-based rebuild: drops every summary, recreates them from a single
+    aggregate query in bulk batches and ranks all cohorts. Returns the row count.
+    """
+    created = 0
+    with transaction.atomic():
+        SemesterResult.objects.all().delete()
+        batch = []
+        for row in _semester_aggregates(Examination.objects.all()).iterator(chunk_size=REBUILD_BATCH_SIZE):
+            batch.append(SemesterResult(
+                student_id=row['student_id'], year_of_study=row['year_of_study'],
+                semester=row['semester'], **_result_fields(row)
+            ))
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                SemesterResult.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        SemesterResult.objects.bulk_create(batch)
+        created += len(batch)
+        rank_cohorts()
+    return created
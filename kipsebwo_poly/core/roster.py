@@ -0,0 +1,103 @@
+from itertools import groupby
+
+from django.core.paginator import Paginator
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+
+# How many course groups are shown per page, and how many students per group.
+COURSES_PER_PAGE = 5
+STUDENTS_PER_COURSE = 50
+
+
+class CourseGroup:
+    """
+    One course section of a roster page. Behaves like the old per-course
+    queryset in the templates: it is iterable, falsy when empty and exposes
+    `count` (the full number of matching students, not just those shown).
+    """
+
+    def __init__(self, course, count, students, offset, per_course):
+        self.course = course
+        self.count = count
+        self.students = students
+        self.offset = offset
+        self.per_course = per_course
+
+    def __iter__(self):
+        return iter(self.students)
+
+    def __len__(self):
+        return len(self.students)
+
+    @property
+    def start_index(self):
+        return self.offset + 1 if self.students else 0
+
+    @property
+    def end_index(self):
+        return self.offset + len(self.students)
+
+    @property
+    def has_more(self):
+        return self.end_index < self.count
+
+    @property
+    def next_course_page(self):
+        return self.offset // self.per_course + 2
+
+
+def build_course_roster(students_list, page_number=1, course_page=1,
+                        courses_per_page=COURSES_PER_PAGE,
+                        per_course=STUDENTS_PER_COURSE, order_by=('name',)):
+    """
+    Groups a (possibly filtered) Student queryset by course in two queries:
+    one GROUP BY for the per-course counts and one ordered query for the rows
+    of the courses on the requested page. Within each course only the
+    `course_page` slice of `per_course` students is loaded, using a
+    ROW_NUMBER() window partitioned by course and ordered by `order_by`
+    (field names, '-' prefix for descending).
+
+    Returns (page_obj, grouped) where `grouped` maps course -> CourseGroup,
+    in course order, ready for the admissions/finance templates.
+    """
+    counts = list(
+        students_list.order_by()
+        .values('course')
+        .annotate(total=Count('id'))
+        .order_by('course')
+    )
+    paginator = Paginator(counts, courses_per_page)
+    page_obj = paginator.get_page(page_number)
+
+    try:
+        course_page = max(int(course_page), 1)
+    except (TypeError, ValueError):
+        course_page = 1
+    offset = (course_page - 1) * per_course
+
+    page_courses = [row['course'] for row in page_obj]
+    grouped = {}
+    if page_courses:
+        rows = (
+            students_list.filter(course__in=page_courses)
+            .annotate(position=Window(
+                expression=RowNumber(),
+                partition_by=F('course'),
+                order_by=[
+                    F(field[1:]).desc() if field.startswith('-') else F(field).asc()
+                    for field in order_by
+                ] + [F('id').asc()],
+            ))
+            .filter(position__gt=offset, position__lte=offset + per_course)
+            .order_by('course', 'position')
+        )
+        by_course = {
+            course: list(students)
+            for course, students in groupby(rows, key=lambda s: s.course)
+        }
+        for row in page_obj:
+            grouped[row['course']] = CourseGroup(
+                row['course'], row['total'],
+                by_course.get(row['course'], []), offset, per_course,
+            )
+    return page_obj, grouped
@@ -0,0 +1,187 @@
+import re
+
+from django.db import connections
+from django.db.models import Case, CharField, F, FloatField, Func, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Upper
+from django.db.models.lookups import PostgresOperatorLookup
+
+# Search subsystem for Student.
+#
+# PostgreSQL: pg_trgm GIN indexes on UPPER(name) and UPPER(admission_number)
+# (migration 0005) make the icontains/istartswith filters and the fuzzy
+# word-similarity match below index scans instead of sequential scans.
+#
+# SQLite (local/test runs): an FTS5 shadow table, core_student_fts, kept in
+# sync by triggers, answers token-prefix queries. SQLite drops a table's
+# triggers whenever a migration rebuilds it (most AlterField/AddField on
+# core_student), so install_fts_triggers() puts them back after every
+# migrate (post_migrate, see apps.py).
+#
+# Any other backend falls back to plain icontains.
+
+FTS_TABLE = 'core_student_fts'
+
+FTS_TRIGGERS = {
+    'core_student_fts_ai':
+        "CREATE TRIGGER IF NOT EXISTS core_student_fts_ai AFTER INSERT ON core_student BEGIN "
+        "INSERT INTO core_student_fts(rowid, name, admission_number) "
+        "VALUES (new.id, new.name, new.admission_number); END",
+    'core_student_fts_ad':
+        "CREATE TRIGGER IF NOT EXISTS core_student_fts_ad AFTER DELETE ON core_student BEGIN "
+        "INSERT INTO core_student_fts(core_student_fts, rowid, name, admission_number) "
+        "VALUES ('delete', old.id, old.name, old.admission_number); END",
+    'core_student_fts_au':
+        "CREATE TRIGGER IF NOT EXISTS core_student_fts_au AFTER UPDATE OF name, admission_number "
+        "ON core_student BEGIN "
+        "INSERT INTO core_student_fts(core_student_fts, rowid, name, admission_number) "
+        "VALUES ('delete', old.id, old.name, old.admission_number); "
+        "INSERT INTO core_student_fts(rowid, name, admission_number) "
+        "VALUES (new.id, new.name, new.admission_number); END",
+}
+
+# Ranks given to admission number hits so they always sort above name hits.
+EXACT_ADMISSION_RANK = 100.0
+PREFIX_ADMISSION_RANK = 50.0
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class TrigramWordSimilar(PostgresOperatorLookup):
+    """
+    `field %> value`: value is word-similar to the field (pg_trgm), using the
+    server's pg_trgm.word_similarity_threshold (0.6 by default).
+    """
+    lookup_name = 'trigram_word_similar'
+    postgres_operator = '%%>'
+
+
+CharField.register_lookup(TrigramWordSimilar)
+
+
+class WordSimilarity(Func):
+    function = 'WORD_SIMILARITY'
+    output_field = FloatField()
+
+
+def _has_fts_table(connection):
+    # The table only exists once migration 0005 has run on an SQLite build that
+    # ships FTS5. Only a positive answer is cached, per connection.
+    if not getattr(connection, '_core_student_fts', False):
+        connection._core_student_fts = FTS_TABLE in connection.introspection.table_names()
+    return connection._core_student_fts
+
+
+def install_fts_triggers(connection):
+    """
+    Creates whichever FTS sync triggers are missing on `connection` and, if
+    any were, re-indexes core_student_fts (rows written without them are not
+    in it). Returns the names created; does nothing off SQLite or without
+    the FTS table.
+    """
+    if connection.vendor != 'sqlite' or FTS_TABLE not in connection.introspection.table_names():
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'core_student'")
+        existing = {row[0] for row in cursor.fetchall()}
+        missing = [name for name in FTS_TRIGGERS if name not in existing]
+        for name in missing:
+            cursor.execute(FTS_TRIGGERS[name])
+        if missing:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return missing
+
+
+def restore_fts_triggers(sender, using, **kwargs):
+    """post_migrate receiver for install_fts_triggers()."""
+    install_fts_triggers(connections[using])
+
+
+def fts_match_expression(query):
+    """Turns free text into an FTS5 MATCH string: every word is a prefix term."""
+    tokens = _TOKEN_RE.findall(query)
+    return ' '.join('"%s"*' % token.replace('"', '') for token in tokens)
+
+
+def _admission_rank(query, default):
+    return Case(
+        When(admission_number__iexact=query, then=Value(EXACT_ADMISSION_RANK)),
+        When(admission_number__istartswith=query, then=Value(PREFIX_ADMISSION_RANK)),
+        default=default,
+        output_field=FloatField(),
+    )
+
+
+def _name_rank(query):
+    return Case(
+        When(name__iexact=query, then=Value(2.0)),
+        When(name__istartswith=query, then=Value(1.5)),
+        default=Value(1.0),
+        output_field=FloatField(),
+    )
+
+
+def _search_postgresql(queryset, query):
+    return (
+        queryset
+        .alias(upper_name=Upper('name'))
+        .filter(
+            Q(admission_number__istartswith=query)
+            | Q(name__icontains=query)
+            | Q(upper_name__trigram_word_similar=query.upper())
+        )
+        .annotate(search_rank=_admission_rank(
+            query, WordSimilarity(Value(query.upper()), F('upper_name'))
+        ))
+    )
+
+
+def _search_sqlite(queryset, query):
+    match = fts_match_expression(query)
+    if not match:
+        return queryset.none()
+    matched_ids = RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match]
+    )
+    # The MATCH runs once as an IN (...) subquery; admission numbers are
+    # tokenised too, so prefix hits on them come from the index as well.
+    # Ranking is kept to cheap column expressions: a per-row bm25() would
+    # re-run the MATCH for every hit, which is quadratic on common names.
+    return (
+        queryset
+        .filter(id__in=matched_ids)
+        .annotate(search_rank=_admission_rank(query, _name_rank(query)))
+    )
+
+
+def _search_fallback(queryset, query):
+    return (
+        queryset
+        .filter(Q(name__icontains=query) | Q(admission_number__icontains=query))
+        .annotate(search_rank=_admission_rank(query, _name_rank(query)))
+    )
+
+
+def search_students(queryset, query):
+    """
+    Filters a Student queryset down to the rows matching `query` and annotates
+    each with `search_rank` (higher is better). Exact and prefix admission
+    number matches rank first. The queryset is returned unordered so callers
+    can group it; use ranked_students() for a flat best-first list.
+    """
+    query = (query or '').strip()
+    if not query:
+        return queryset
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        return _search_postgresql(queryset, query)
+    if connection.vendor == 'sqlite' and _has_fts_table(connection):
+        return _search_sqlite(queryset, query)
+    return _search_fallback(queryset, query)
+
+
+def ranked_students(queryset, query):
+    """search_students() ordered best match first."""
+    if not (query or '').strip():
+        return queryset.order_by('name')
+    return search_students(queryset, query).order_by('-search_rank', 'name')
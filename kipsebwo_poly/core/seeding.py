@@ -0,0 +1,320 @@
+import datetime
+import random
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from . import caching, finance_stats
+from .models import (
+    AuditTrail, Consumable, Examination, FeeBalance, FeeStructure, Payment, PermanentEquipment,
+    Receipt, ReceiptSequence, Student, StockMovement, UserProfile,
+)
+from .payments import SEMESTER_BALANCE_FIELDS
+from .results import rebuild_semester_results
+
+# Synthetic data at production scale.
+#
+# seed() fills an empty database with VOLUMES (times `scale`) of realistic
+# rows: students with their fee balances, marks, payments and receipts,
+# stores items with their movement history and audit trail, plus STAFF
+# accounts.
+# Everything goes in with bulk_create in batches, so model signals do not
+# fire; what they would have maintained (fee balances, semester results,
+# receipt sequences, cache versions) is written here directly.
+#
+# The same `seed` number always produces the same rows.
+
+VOLUMES = {
+    'students': 50_000,
+    'examinations': 1_000_000,
+    'payments': 300_000,
+    'audit_entries': 500_000,
+    'consumables': 3_000,
+    'equipment': 2_000,
+}
+# The same staff handle any number of students
+STAFF = 40
+BATCH_SIZE = 2_000
+HISTORY_DAYS = 730
+
+FIRST_NAMES = ['Kipchoge', 'Wanjiru', 'Achieng', 'Kiprono', 'Chebet', 'Mutua',
+               'Njeri', 'Otieno', 'Jepkosgei', 'Kamau', 'Wafula', 'Nyambura']
+LAST_NAMES = ['Rotich', 'Kiptoo', 'Odhiambo', 'Mwangi', 'Cheruiyot', 'Langat',
+              'Koech', 'Wambui', 'Ochieng', 'Kosgei', 'Mutai', 'Barasa']
+# course -> semester 1/2/3 fees
+COURSES = {
+    'Electrical': (32000, 28000, 25000),
+    'Plumbing': (28000, 25000, 22000),
+    'Fashion Design': (26000, 24000, 21000),
+    'ICT': (34000, 30000, 27000),
+    'Motor Vehicle': (35000, 31000, 28000),
+    'Masonry': (25000, 22000, 20000),
+    'Hair Dressing': (24000, 22000, 19000),
+    'Welding': (30000, 27000, 24000),
+}
+COMMON_SUBJECTS = ['Communication Skills', 'Entrepreneurship', 'Mathematics']
+SCHOOLS = ['Kapsabet Boys', 'Moi Girls Eldoret', 'Kipsebwo Mixed', 'Chepterit Secondary', 'Lelmokwo Day']
+RELIGIONS = ['Christian', 'Muslim', 'Hindu', 'Other']
+CONSUMABLES = ['Cement 50kg', 'PVC pipe 1"', 'Welding rods', 'Copper wire 2.5mm', 'Chalk box',
+               'Printer paper', 'Fabric (m)', 'Engine oil 5L', 'Hair relaxer', 'Sandpaper']
+EQUIPMENT = ['Desk', 'Lathe', 'Sewing machine', 'Welding set', 'Desktop computer',
+             'Projector', 'Hair dryer', 'Spanner set', 'Wheelbarrow', 'Cabinet']
+AUDIT_ACTIONS = [
+    ('payment', "Recorded payment of Ksh {amount} for {adm}", 'student'),
+    ('update', "Updated student: {adm}", 'student'),
+    ('marks', "Recorded marks for {adm}", 'student'),
+    ('create', "Admitted student: {adm}", 'student'),
+    ('stock', "Issued stock to {adm}", 'consumable'),
+    ('generate', "Generated transcripts", ''),
+]
+AUDIT_WEIGHTS = [40, 20, 25, 5, 8, 2]
+
+
+def volumes(scale=1.0):
+    """VOLUMES times `scale`, never below one of anything."""
+    return {name: max(1, round(count * scale)) for name, count in VOLUMES.items()}
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Seeder:
+    def __init__(self, scale=1.0, seed=0, batch_size=BATCH_SIZE, log=None):
+        self.counts = volumes(scale)
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        self.now = timezone.now()
+
+    def past(self, days=HISTORY_DAYS):
+        return self.now - datetime.timedelta(seconds=self.rng.randrange(days * 86400))
+
+    def run(self):
+        """Writes everything; returns {model name: rows created}."""
+        created = {}
+        created['staff'] = self.seed_staff()
+        created['fee_structures'] = len(FeeStructure.objects.bulk_create(
+            FeeStructure(course=course, semester_1=s1, semester_2=s2, semester_3=s3)
+            for course, (s1, s2, s3) in COURSES.items()
+        ))
+        created.update(self.seed_students())
+        created['receipts'] = self.seed_receipts()
+        created['semester_results'] = rebuild_semester_results()
+        self.log(f"semester results: {created['semester_results']:,}")
+        created.update(self.seed_stores())
+        created['audit_entries'] = self.seed_audit()
+
+        caching.bump(FeeStructure, Payment, Student)
+        finance_stats.invalidate()
+        return created
+
+    def seed_staff(self):
+        # No usable password: seeded accounts exist to own rows, not to log in
+        password = make_password(None)
+        departments = [code for code, _ in UserProfile.DEPARTMENT_CHOICES]
+        users = User.objects.bulk_create(
+            User(username=f"seed_{departments[n % len(departments)]}{n}", password=password,
+                 first_name=self.rng.choice(FIRST_NAMES), last_name=self.rng.choice(LAST_NAMES),
+                 date_joined=self.past())
+            for n in range(STAFF)
+        )
+        # One in ten is still waiting for approval
+        UserProfile.objects.bulk_create(
+            UserProfile(user=user, department=departments[n % len(departments)], is_approved=n % 10 != 9)
+            for n, user in enumerate(users)
+        )
+        self.staff = users
+        self.log(f"staff: {len(users):,}")
+        return len(users)
+
+    def _student(self, n):
+        course = self.rng.choice(list(COURSES))
+        year = self.rng.choice([2023, 2024, 2025, 2026])
+        return Student(
+            name=f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)} {self.rng.choice(FIRST_NAMES)}",
+            admission_number=f"KVTC/{year}/{n:06d}",
+            id_number=str(20_000_000 + n) if self.rng.random() < 0.6 else None,
+            phone_number=f"07{self.rng.randrange(10 ** 8):08d}",
+            sex=self.rng.choice(['Male', 'Female']),
+            course=course,
+            last_school=self.rng.choice(SCHOOLS),
+            parent_contacts=f"07{self.rng.randrange(10 ** 8):08d}",
+            religion=self.rng.choices(RELIGIONS, [85, 10, 2, 3])[0],
+            year_enrolled=year,
+            residence=self.rng.choice(['Boarder', 'Day Scholar']),
+            status=self.rng.choices(['Active', 'Deferred', 'Dropout', 'Completed'], [80, 5, 5, 10])[0],
+        )
+
+    def _examinations(self, student, count):
+        subjects = [f"{student.course} Theory", f"{student.course} Practical"] + COMMON_SUBJECTS
+        for i in range(count):
+            slot, subject = divmod(i, len(subjects))
+            yield Examination(
+                student_id=student.pk, subject_name=subjects[subject],
+                marks=min(100, max(0, round(self.rng.gauss(58, 15)))),
+                year_of_study=str(slot // 2 % 3 + 1), semester=str(slot % 2 + 1),
+            )
+
+    def _payments(self, student, count, first):
+        for n in range(first, first + count):
+            semester = str(n % len(SEMESTER_BALANCE_FIELDS) + 1)
+            yield Payment(
+                student_id=student.pk, semester=semester,
+                amount=Decimal(self.rng.randrange(1000, 10001, 500)),
+                # Mobile money references; some cash payments have none
+                transaction_id=f"SEED{n:09d}" if self.rng.random() < 0.8 else None,
+                date=self.past(),
+            )
+
+    def seed_students(self):
+        students = self.counts['students']
+        exams_each = max(1, round(self.counts['examinations'] / students))
+        payments_each = max(1, round(self.counts['payments'] / students))
+        totals = {'students': 0, 'examinations': 0, 'payments': 0}
+
+        for batch in _batches((self._student(n) for n in range(students)), self.batch_size):
+            Student.objects.bulk_create(batch)
+            exams, payments, balances = [], [], []
+            for student in batch:
+                exams.extend(self._examinations(student, exams_each))
+                paid = dict.fromkeys(SEMESTER_BALANCE_FIELDS, 0)
+                for payment in self._payments(student, payments_each, totals['payments'] + len(payments)):
+                    paid[payment.semester] += payment.amount
+                    payments.append(payment)
+                fees = COURSES[student.course]
+                balances.append(FeeBalance(student_id=student.pk, **{
+                    field: fees[int(sem) - 1] - paid[sem] for sem, field in SEMESTER_BALANCE_FIELDS.items()
+                }))
+            FeeBalance.objects.bulk_create(balances)
+            Examination.objects.bulk_create(exams, batch_size=self.batch_size)
+            dates = [payment.date for payment in payments]
+            Payment.objects.bulk_create(payments, batch_size=self.batch_size)
+            # auto_now_add overwrote the dates on insert; put the history back
+            for payment, date in zip(payments, dates):
+                payment.date = date
+            Payment.objects.bulk_update(payments, ['date'], batch_size=500)
+
+            totals['students'] += len(batch)
+            totals['examinations'] += len(exams)
+            totals['payments'] += len(payments)
+            self.log(f"students: {totals['students']:,}/{students:,}")
+        return totals
+
+    def seed_receipts(self):
+        """Receipt numbers in payment date order per year, as if issued when posted."""
+        last = {}
+
+        def receipts():
+            for pk, date in Payment.objects.order_by('date', 'id').values_list('id', 'date').iterator():
+                year = timezone.localtime(date).year
+                last[year] = last.get(year, 0) + 1
+                # Snapshots are rendered on first print (core/receipts.py)
+                yield Receipt(payment_id=pk, year=year, number=last[year], issued_at=date)
+
+        created = 0
+        for batch in _batches(receipts(), self.batch_size):
+            Receipt.objects.bulk_create(batch)
+            created += len(batch)
+        ReceiptSequence.objects.bulk_create(
+            ReceiptSequence(year=year, last_number=number) for year, number in last.items()
+        )
+        self.log(f"receipts: {created:,}")
+        return created
+
+    def _history(self, user):
+        """Movements of one consumable, oldest first, and its final balance."""
+        start = self.past()
+        balance = self.rng.randrange(20, 200)
+        movements = [StockMovement(kind='adjust', quantity=balance, balance_after=balance,
+                                   date=start.date(), note='Opening balance', created_by=user, created_at=start)]
+        when = start
+        for _ in range(self.rng.randrange(3, 15)):
+            when = min(self.now, when + datetime.timedelta(days=self.rng.randrange(1, 30)))
+            if balance and self.rng.random() < 0.75:
+                quantity = -self.rng.randrange(1, balance + 1)
+                kind, issued_to = 'issue', self.rng.choice(list(COURSES)) + ' workshop'
+            else:
+                quantity, kind, issued_to = self.rng.randrange(10, 100), 'receive', ''
+            balance += quantity
+            movements.append(StockMovement(kind=kind, quantity=quantity, balance_after=balance,
+                                           date=when.date(), issued_to=issued_to,
+                                           created_by=user, created_at=when))
+        return movements, balance
+
+    def seed_stores(self):
+        store_staff = [user for user in self.staff if 'stores' in user.username] or self.staff
+        totals = {'consumables': 0, 'stock_movements': 0, 'equipment': 0}
+
+        def consumables():
+            for n in range(self.counts['consumables']):
+                user = self.rng.choice(store_staff)
+                movements, balance = self._history(user)
+                issued = [m.date for m in movements if m.kind == 'issue']
+                item = Consumable(
+                    item_name=f"{self.rng.choice(CONSUMABLES)} #{n}", date_supplied=movements[0].date,
+                    balance_stock=balance, reorder_level=self.rng.choice([0, 5, 10, 20]),
+                    last_date_issued=issued[-1] if issued else None, added_by=user,
+                )
+                item._movements = movements
+                yield item
+
+        for batch in _batches(consumables(), self.batch_size):
+            Consumable.objects.bulk_create(batch)
+            movements = []
+            for item in batch:
+                for movement in item._movements:
+                    movement.consumable_id = item.pk
+                    movements.append(movement)
+            StockMovement.objects.bulk_create(movements, batch_size=self.batch_size)
+            totals['consumables'] += len(batch)
+            totals['stock_movements'] += len(movements)
+
+        equipment = (
+            PermanentEquipment(
+                item_name=f"{self.rng.choice(EQUIPMENT)} #{n}", date_delivered=self.past().date(),
+                condition=self.rng.choices(['Good', 'Fair', 'Damaged', 'Under Repair'], [60, 25, 10, 5])[0],
+                added_by=self.rng.choice(store_staff),
+            )
+            for n in range(self.counts['equipment'])
+        )
+        for batch in _batches(equipment, self.batch_size):
+            totals['equipment'] += len(PermanentEquipment.objects.bulk_create(batch))
+        self.log(f"stores: {totals['consumables']:,} consumables, {totals['equipment']:,} equipment")
+        return totals
+
+    def seed_audit(self):
+        students = list(Student.objects.values_list('id', 'admission_number')[:10_000])
+        consumables = list(Consumable.objects.values_list('id', flat=True)[:1_000])
+
+        def entries():
+            for _ in range(self.counts['audit_entries']):
+                action_type, text, target = self.rng.choices(AUDIT_ACTIONS, AUDIT_WEIGHTS)[0]
+                pk, adm = self.rng.choice(students)
+                if target == 'consumable':
+                    pk = self.rng.choice(consumables)
+                yield AuditTrail(
+                    user=self.rng.choice(self.staff), action_type=action_type,
+                    action=text.format(adm=adm, amount=self.rng.randrange(1000, 10001, 500)),
+                    target_model=target, target_id=str(pk) if target else '', timestamp=self.past(),
+                )
+
+        created = 0
+        for batch in _batches(entries(), self.batch_size):
+            AuditTrail.objects.bulk_create(batch)
+            created += len(batch)
+        self.log(f"audit entries: {created:,}")
+        return created
+
+
+def seed(scale=1.0, seed=0, batch_size=BATCH_SIZE, log=None):
+    return Seeder(scale, seed, batch_size, log).run()
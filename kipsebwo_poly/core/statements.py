@@ -0,0 +1,200 @@
+import csv
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from . import audit, caching, finance_stats
+from .models import FeeBalance, Payment, Student
+from .payments import SEMESTER_BALANCE_FIELDS, parse_amount, post_payment
+from .receipts import issue_receipts
+
+BATCH_SIZE = 500
+
+# Statement column headers we understand, lower-cased -> our field name.
+# Bank exports and M-Pesa paybill statements name the same things differently.
+COLUMN_ALIASES = {
+    'admission_number': 'admission_number', 'admission number': 'admission_number',
+    'adm no': 'admission_number', 'account': 'admission_number',
+    'account no': 'admission_number', 'a/c no.': 'admission_number',
+    'amount': 'amount', 'paid in': 'amount', 'credit': 'amount',
+    'semester': 'semester', 'sem': 'semester',
+    'transaction_id': 'transaction_id', 'transaction id': 'transaction_id',
+    'receipt no.': 'transaction_id', 'receipt no': 'transaction_id',
+    'reference': 'transaction_id', 'ref': 'transaction_id',
+}
+REQUIRED_COLUMNS = ('admission_number', 'amount', 'semester', 'transaction_id')
+
+
+class StatementImportReport:
+    """What an import did: totals for the summary plus every rejected row."""
+
+    def __init__(self, source):
+        self.source = source
+        self.posted = 0
+        self.total_amount = 0
+        self.duplicates = 0
+        self.rejected = []  # (line number, transaction_id, reason)
+        self.error = ''  # Why the file could not be read to the end
+
+    def reject(self, line_no, transaction_id, reason):
+        self.rejected.append((line_no, transaction_id, reason))
+
+    @property
+    def summary(self):
+        summary = (f"Imported statement {self.source}: {self.posted} payment(s) totalling "
+                   f"Ksh {self.total_amount}, {self.duplicates} duplicate(s) skipped, "
+                   f"{len(self.rejected)} row(s) rejected")
+        return f"{summary}; stopped early, {self.error}" if self.error else summary
+
+
+def _normalise_header(fieldnames):
+    mapping = {}
+    for name in fieldnames or []:
+        field = COLUMN_ALIASES.get((name or '').strip().lower())
+        if field and field not in mapping.values():
+            mapping[name] = field
+    missing = [c for c in REQUIRED_COLUMNS if c not in mapping.values()]
+    if missing:
+        raise ValidationError(f"Statement is missing column(s): {', '.join(missing)}")
+    return mapping
+
+
+def _parse_rows(reader, mapping, report):
+    """Yields (line_no, cleaned row) for rows that pass field validation."""
+    for row in reader:
+        line_no = reader.line_num
+        data = {field: (row.get(name) or '').strip() for name, field in mapping.items()}
+        if not any(data.values()):
+            continue
+        ref = data['transaction_id']
+        if not ref:
+            report.reject(line_no, ref, "Missing transaction ID")
+            continue
+        if data['semester'] not in SEMESTER_BALANCE_FIELDS:
+            report.reject(line_no, ref, f"Invalid semester '{data['semester']}'")
+            continue
+        try:
+            data['amount'] = parse_amount(data['amount'].replace(',', ''))
+        except ValidationError as e:
+            report.reject(line_no, ref, " ".join(e.messages))
+            continue
+        yield line_no, data
+
+
+def _apply_balances(refs):
+    """
+    Deducts the payments identified by `refs` from FeeBalance with one UPDATE:
+    each semester column is reduced by a correlated SUM over those payments.
+    """
+    def paid(semester):
+        total = (
+            Payment.objects.filter(student=OuterRef('student'), semester=semester,
+                                   transaction_id__in=refs)
+            .order_by().values('student').annotate(total=Sum('amount')).values('total')
+        )
+        return Coalesce(Subquery(total), Value(0), output_field=DecimalField(max_digits=10, decimal_places=2))
+
+    student_ids = Payment.objects.filter(transaction_id__in=refs).values('student_id')
+    FeeBalance.objects.filter(student_id__in=student_ids).update(**{
+        field: F(field) - paid(semester)
+        for semester, field in SEMESTER_BALANCE_FIELDS.items()
+    })
+
+
+def _post_batch(batch, report, seen, user=None):
+    refs = [data['transaction_id'] for _, data in batch]
+    existing = set(Payment.objects.filter(transaction_id__in=refs).values_list('transaction_id', flat=True))
+    # The fields the receipts print
+    students = {
+        s.admission_number: s for s in
+        Student.objects.filter(admission_number__in={data['admission_number'] for _, data in batch})
+        .only('id', 'name', 'admission_number', 'course')
+    }
+
+    payments = []
+    for line_no, data in batch:
+        ref = data['transaction_id']
+        if ref in existing or ref in seen:
+            report.duplicates += 1
+            continue
+        student = students.get(data['admission_number'])
+        if student is None:
+            report.reject(line_no, ref, f"Unknown admission number '{data['admission_number']}'")
+            continue
+        seen.add(ref)
+        payments.append(Payment(student=student, amount=data['amount'],
+                                semester=data['semester'], transaction_id=ref))
+    if not payments:
+        return
+
+    FeeBalance.objects.bulk_create(
+        [FeeBalance(student_id=sid) for sid in {p.student_id for p in payments}],
+        ignore_conflicts=True,
+    )
+    try:
+        with transaction.atomic():
+            Payment.objects.bulk_create(payments)
+            _apply_balances([p.transaction_id for p in payments])
+            if any(p.pk is None for p in payments):
+                # Backends that cannot return ids from a bulk insert
+                ids = dict(Payment.objects.filter(transaction_id__in=[p.transaction_id for p in payments])
+                           .values_list('transaction_id', 'id'))
+                for p in payments:
+                    p.pk = ids[p.transaction_id]
+            issue_receipts(payments, user)
+            # bulk_create and update() send no post_save
+            caching.bump(Payment)
+            finance_stats.invalidate()
+    except IntegrityError:
+        # Someone posted one of these references while we were importing:
+        # fall back to the idempotent single-payment path for this batch.
+        for payment in payments:
+            try:
+                _, created = post_payment(payment.student, payment.amount, payment.semester,
+                                          payment.transaction_id)
+            except ValidationError as e:
+                report.reject(None, payment.transaction_id, " ".join(e.messages))
+                continue
+            if created:
+                report.posted += 1
+                report.total_amount += payment.amount
+            else:
+                report.duplicates += 1
+        return
+    report.posted += len(payments)
+    report.total_amount += sum(p.amount for p in payments)
+
+
+def import_statement(lines, user, source='statement', batch_size=BATCH_SIZE):
+    """
+    Streams a CSV statement (any iterable of text lines, e.g. an open file)
+    into Payment rows, `batch_size` rows at a time: one lookup for known
+    references, one for students, one bulk_create and one balance UPDATE per
+    batch. Rows are de-duplicated on transaction_id against the database and
+    within the file. Writes a single summary AuditTrail entry.
+
+    Batches commit as they go: if the file turns out to be unreadable part
+    way, the batches before stay posted, the summary records them and a
+    ValidationError carrying that summary is raised.
+    """
+    report = StatementImportReport(source)
+    reader = csv.DictReader(lines)
+    mapping = _normalise_header(reader.fieldnames)
+    rows = _parse_rows(reader, mapping, report)
+    seen = set()
+    try:
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            _post_batch(batch, report, seen, user)
+    except (csv.Error, UnicodeDecodeError) as e:
+        report.error = f"could not read past line {reader.line_num}: {e}"
+    report.rejected.sort(key=lambda rejected: rejected[0] or 0)
+    audit.record(user, report.summary, action_type='import', strict=True)
+    if report.error:
+        raise ValidationError(report.summary)
+    return report
@@ -0,0 +1,193 @@
+import datetime
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Sum, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import audit
+from .models import Consumable, PermanentEquipment, StockMovement
+
+# Stock movements for consumables.
+#
+# balance_stock is never written from a form: receive/issue/adjust change it
+# with a single UPDATE ... SET balance_stock = balance_stock +/- n and record
+# a StockMovement in the same transaction, so two storekeepers issuing the
+# same item at once cannot lose an update. An issue only matches the row
+# while enough stock is left (balance_stock >= n); the CHECK constraint on
+# Consumable backs this up at the database level.
+
+USAGE_DAYS = 30
+INVENTORY_PAGE_SIZE = 25
+
+
+def _movement(item_id, kind, quantity, user, date=None, issued_to='', note='', balance=None):
+    if balance is None:
+        balance = Consumable.objects.values_list('balance_stock', flat=True).get(pk=item_id)
+    return StockMovement(
+        consumable_id=item_id, kind=kind, quantity=quantity, balance_after=balance,
+        date=date or timezone.localdate(), issued_to=issued_to, note=note, created_by=user,
+    )
+
+
+def _quantity(quantity):
+    try:
+        quantity = int(quantity)
+    except (TypeError, ValueError):
+        raise ValidationError("Enter a whole number of items.")
+    if quantity <= 0:
+        raise ValidationError("The quantity must be greater than zero.")
+    return quantity
+
+
+def _issue(item_id, quantity, date):
+    """The conditional decrement; returns False when there is not enough stock."""
+    return bool(Consumable.objects.filter(pk=item_id, balance_stock__gte=quantity).update(
+        balance_stock=F('balance_stock') - quantity,
+        # Back-dated issues leave a later last_date_issued alone
+        last_date_issued=Case(
+            When(Q(last_date_issued__isnull=True) | Q(last_date_issued__lt=date), then=date),
+            default=F('last_date_issued'),
+        ),
+    ))
+
+
+def open_item(item, user):
+    """Records the stock an item was created with as its first receipt."""
+    if item.balance_stock:
+        StockMovement.objects.create(
+            consumable=item, kind='receive', quantity=item.balance_stock, balance_after=item.balance_stock,
+            date=item.date_supplied, note='Opening stock', created_by=user,
+        )
+
+
+def receive(item, quantity, user, date=None, note=''):
+    quantity = _quantity(quantity)
+    date = date or timezone.localdate()
+    with transaction.atomic():
+        Consumable.objects.filter(pk=item.pk).update(balance_stock=F('balance_stock') + quantity, date_supplied=date)
+        movement = _movement(item.pk, 'receive', quantity, user, date=date, note=note)
+        movement.save()
+        audit.record(user, f"Received {quantity} x {item.item_name}", action_type='stock', target=movement)
+    return movement
+
+
+def issue(item, quantity, user, issued_to='', date=None, note=''):
+    return issue_many([(item, quantity)], user, issued_to=issued_to, date=date, note=note)[0]
+
+
+def issue_many(lines, user, issued_to='', date=None, note=''):
+    """
+    Issues every (item, quantity) of `lines` or none of them: if any item is
+    short, nothing is issued and the ValidationError lists every shortage.
+    Returns the StockMovements.
+    """
+    date = date or timezone.localdate()
+    wanted, items = {}, {}
+    for item, quantity in lines:
+        wanted[item.pk] = wanted.get(item.pk, 0) + _quantity(quantity)
+        items[item.pk] = item
+    if not wanted:
+        raise ValidationError("Select at least one item to issue.")
+
+    with transaction.atomic():
+        short = []
+        # Same order in every transaction, so concurrent bulk issues cannot deadlock
+        for item_id in sorted(wanted):
+            if not _issue(item_id, wanted[item_id], date):
+                short.append(item_id)
+        if short:
+            left = dict(Consumable.objects.filter(pk__in=short).values_list('pk', 'balance_stock'))
+            raise ValidationError([
+                f"Only {left.get(pk, 0)} {items[pk].item_name} left (asked for {wanted[pk]})." for pk in short
+            ])
+        # Our UPDATEs hold the row locks, so these are the balances we left
+        balances = dict(Consumable.objects.filter(pk__in=wanted).values_list('pk', 'balance_stock'))
+        movements = StockMovement.objects.bulk_create([
+            _movement(item_id, 'issue', -wanted[item_id], user, date=date, issued_to=issued_to, note=note,
+                      balance=balances[item_id])
+            for item_id in sorted(wanted)
+        ])
+        summary = ", ".join(f"{wanted[pk]} x {items[pk].item_name}" for pk in sorted(wanted))
+        audit.record(user, f"Issued {summary}" + (f" to {issued_to}" if issued_to else ''),
+                     action_type='stock', target=movements[0] if len(movements) == 1 else None)
+    return movements
+
+
+def adjust(item, counted, user, note=''):
+    """Sets the balance to a physical stock count, recording the difference."""
+    try:
+        counted = int(counted)
+    except (TypeError, ValueError):
+        raise ValidationError("Enter the counted number of items.")
+    if counted < 0:
+        raise ValidationError("A stock count cannot be negative.")
+    with transaction.atomic():
+        current = Consumable.objects.select_for_update().values_list('balance_stock', flat=True).get(pk=item.pk)
+        Consumable.objects.filter(pk=item.pk).update(balance_stock=counted)
+        movement = _movement(item.pk, 'adjust', counted - current, user, note=note or 'Stock count')
+        movement.save()
+        audit.record(user, f"Stock count of {item.item_name}: {current} -> {counted}",
+                     action_type='stock', target=movement)
+    return movement
+
+
+def low_stock(days=USAGE_DAYS):
+    """
+    Items at or below their reorder level, with what was issued in the last
+    `days` days and roughly how many days the stock will last. One query.
+    """
+    since = timezone.localdate() - datetime.timedelta(days=days)
+    items = (
+        Consumable.objects.filter(balance_stock__lte=F('reorder_level'))
+        .annotate(
+            issued=Coalesce(-Sum('movements__quantity', filter=Q(movements__kind='issue', movements__date__gte=since)),
+                            0, output_field=IntegerField()),
+            issues=Count('movements', filter=Q(movements__kind='issue', movements__date__gte=since)),
+        )
+        .order_by('balance_stock', 'item_name')
+    )
+    items = list(items)
+    for item in items:
+        item.days_left = round(item.balance_stock * days / item.issued) if item.issued else None
+    return items
+
+
+def filter_inventory(consumables, equipment, q='', condition='', date_from=None, date_to=None, low=False):
+    """Applies the stores page filters; the date range is the supply/delivery date."""
+    if q:
+        consumables = consumables.filter(item_name__icontains=q)
+        equipment = equipment.filter(item_name__icontains=q)
+    if condition:
+        equipment = equipment.filter(condition=condition)
+    if date_from:
+        consumables = consumables.filter(date_supplied__gte=date_from)
+        equipment = equipment.filter(date_delivered__gte=date_from)
+    if date_to:
+        consumables = consumables.filter(date_supplied__lte=date_to)
+        equipment = equipment.filter(date_delivered__lte=date_to)
+    if low:
+        consumables = consumables.filter(balance_stock__lte=F('reorder_level'))
+    return consumables, equipment
+
+
+class InventorySummary:
+    """Header figures for the stores page: one GROUP BY over equipment, one aggregate over consumables."""
+
+    def __init__(self):
+        by_condition = dict(
+            PermanentEquipment.objects.order_by().values_list('condition').annotate(n=Count('id'))
+        )
+        self.conditions = [
+            (label, by_condition.get(value, 0)) for value, label in PermanentEquipment.CONDITION_CHOICES
+        ]
+        self.equipment = sum(by_condition.values())
+        totals = Consumable.objects.aggregate(
+            items=Count('id'),
+            units=Coalesce(Sum('balance_stock'), 0),
+            low=Count('id', filter=Q(balance_stock__lte=F('reorder_level'))),
+        )
+        self.consumables = totals['items']
+        self.units = totals['units']
+        self.low = totals['low']
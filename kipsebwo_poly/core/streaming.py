@@ -0,0 +1,118 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connection
+from django.template.loader import render_to_string
+
+# Async dashboards: concurrent independent queries and streamed tables.
+#
+# gather() runs independent pieces of ORM work at the same time. The async
+# ORM on its own would not: every `await queryset.afirst()` of a request runs
+# on that request's one sync thread, one after another. Each callable here
+# gets a worker thread and with it its own database connection (closed after
+# it, as CONN_MAX_AGE says). Inside a transaction (ATOMIC_REQUESTS, tests)
+# other connections cannot see its uncommitted rows, so the callables run in
+# turn on the request's own connection instead.
+#
+# Large tables are streamed. The page is rendered once with STREAM_MARKER
+# where the table goes and split there; the rows in between are fetched with
+# aiterator() and rendered STREAM_CHUNK_SIZE at a time, so neither the rows
+# nor the HTML are ever held whole. group_events() turns ordered rows into
+# the open/row/close events the table partials render, so the sync views
+# render the same partials from a plain iterator.
+#
+# Queries run in worker threads, or while a response streams, are not seen
+# by QueryMetricsMiddleware.
+
+STREAM_MARKER = '<!--stream-->'
+STREAM_CHUNK_SIZE = 500
+
+
+def _closing_connections(func):
+    def run():
+        try:
+            return func()
+        finally:
+            close_old_connections()
+    return run
+
+
+async def gather(*funcs):
+    """The results of the sync callables `funcs`, run concurrently when the database allows it."""
+    if await sync_to_async(lambda: connection.in_atomic_block)():
+        return [await sync_to_async(func)() for func in funcs]
+    return await asyncio.gather(*(
+        sync_to_async(_closing_connections(func), thread_sensitive=False)() for func in funcs
+    ))
+
+
+class GroupEvent:
+    """Opening the group `key` at `opens` (0 = outermost), closing the group at `closes`, or a `row`."""
+    __slots__ = ('opens', 'closes', 'key', 'row')
+
+    def __init__(self, opens=None, closes=None, key=None, row=None):
+        self.opens, self.closes, self.key, self.row = opens, closes, key, row
+
+
+class Grouper:
+    """Feeds rows ordered by `keys` (functions of a row) and returns the events each one causes."""
+
+    def __init__(self, *keys):
+        self.keys = keys
+        self.current = None
+
+    def feed(self, row):
+        values = tuple(key(row) for key in self.keys)
+        events = []
+        if values != self.current:
+            changed = 0
+            if self.current is not None:
+                changed = next(level for level, (new, old) in enumerate(zip(values, self.current)) if new != old)
+                events.extend(GroupEvent(closes=level) for level in reversed(range(changed, len(self.keys))))
+            events.extend(GroupEvent(opens=level, key=values[level]) for level in range(changed, len(self.keys)))
+            self.current = values
+        events.append(GroupEvent(row=row))
+        return events
+
+    def finish(self):
+        if self.current is None:
+            return []
+        self.current = None
+        return [GroupEvent(closes=level) for level in reversed(range(len(self.keys)))]
+
+
+def group_events(rows, *keys):
+    grouper = Grouper(*keys)
+    for row in rows:
+        yield from grouper.feed(row)
+    yield from grouper.finish()
+
+
+async def render_parts(template_name, context, request):
+    """The page rendered around STREAM_MARKER: (before, after)."""
+    html = await sync_to_async(render_to_string)(
+        template_name, {**context, 'stream_marker': STREAM_MARKER}, request)
+    head, _, tail = html.partition(STREAM_MARKER)
+    return head, tail
+
+
+async def stream_table(head, tail, queryset, template_name, context, *keys, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Yields `head`, then `template_name` rendered with the `events` of each
+    chunk of `queryset` (grouped by `keys`), then `tail`. The template is
+    rendered without a request: put anything it needs (csrf_token) in
+    `context`.
+    """
+    yield head
+    grouper = Grouper(*keys)
+    events, empty = [], True
+    async for row in queryset.aiterator(chunk_size=chunk_size):
+        empty = False
+        events.extend(grouper.feed(row))
+        if len(events) >= chunk_size:
+            yield render_to_string(template_name, {**context, 'events': events})
+            events = []
+    events.extend(grouper.finish())
+    if events or empty:
+        yield render_to_string(template_name, {**context, 'events': events})
+    yield tail
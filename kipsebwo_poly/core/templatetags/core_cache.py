@@ -0,0 +1,34 @@
+from django import template
+from django.apps import apps
+
+from core.caching import cached
+
+register = template.Library()
+
+
+class CachedFragmentNode(template.Node):
+    def __init__(self, nodelist, name, models):
+        self.nodelist = nodelist
+        self.name = name
+        self.models = models
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        models = [apps.get_model(label.resolve(context)) for label in self.models]
+        return cached(f"fragment:{name}", lambda: self.nodelist.render(context), models)
+
+
+@register.tag('cachedfragment')
+def do_cachedfragment(parser, token):
+    """
+    {% cachedfragment "name" "core.Payment" "core.Student" %}...{% endcachedfragment %}
+    caches the rendered block until a row of any listed model changes (see
+    core/caching.py). Querysets used only inside the block are not evaluated
+    on a hit.
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a fragment name and at least one model label")
+    nodelist = parser.parse(('endcachedfragment',))
+    parser.delete_first_token()
+    return CachedFragmentNode(nodelist, parser.compile_filter(bits[1]), [parser.compile_filter(b) for b in bits[2:]])
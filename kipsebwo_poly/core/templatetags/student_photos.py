@@ -0,0 +1,42 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html
+
+from core.photos import DENSITIES, PHOTO_SIZES, derivative_name, is_processed
+
+register = template.Library()
+
+
+def _srcset(photo_hash, size, ext):
+    return ', '.join(
+        f"{default_storage.url(derivative_name(photo_hash, size, density, ext))} {density}x"
+        for density in DENSITIES
+    )
+
+
+@register.simple_tag
+def student_photo(student, size='profile', style='', lazy=True):
+    """
+    {% student_photo student 'thumb' %}: a <picture> with WebP and JPEG
+    sources at 1x/2x, lazy loaded. Falls back to the original upload until
+    the photo has been processed, and renders nothing without a photo.
+    """
+    if not student.passport_photo:
+        return ''
+    pixels = PHOTO_SIZES[size]
+    loading = 'lazy' if lazy else 'eager'
+    if not is_processed(student):
+        return format_html(
+            '<img src="{}" alt="{}" width="{}" height="{}" loading="{}" decoding="async" '
+            'style="object-fit: cover; {}">',
+            student.passport_photo.url, student.name, pixels, pixels, loading, style,
+        )
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}">'
+        '<img src="{}" srcset="{}" alt="{}" width="{}" height="{}" loading="{}" decoding="async" '
+        'style="{}"></picture>',
+        _srcset(student.photo_hash, size, 'webp'),
+        default_storage.url(derivative_name(student.photo_hash, size, 1, 'jpg')),
+        _srcset(student.photo_hash, size, 'jpg'),
+        student.name, pixels, pixels, loading, style,
+    )
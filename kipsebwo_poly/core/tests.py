@@ -1,3 +1,1153 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import pathlib
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import zipfile
+from decimal import Decimal
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, OperationalError, connection, connections, transaction
+from django.db.models import Sum
+from django.template import Context, Template
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import audit, audit_retention, benchmark, caching, photos, replicas, stores, urls
+from .audit_retention import apply_retention
+from .fees import RevisionPreview, apply_revision
+from .finance_stats import finance_stats
+from .instrumentation import QueryProfile, metrics
+from .intake import import_students, read_rows
+from .models import (
+    AuditRollup, AuditTrail, Consumable, Examination, FeeBalance, FeeStructure, FeeStructureRevision,
+    Payment, PermanentEquipment, Receipt, SemesterResult, StockMovement, Student, UserProfile,
+)
+from .pagination import keyset_paginate
+from .payments import SEMESTER_BALANCE_FIELDS, post_payment
+from .rbac import access_for
+from .results import refresh_semester_results
+from .roster import build_course_roster
+from .search import FTS_TABLE, FTS_TRIGGERS, install_fts_triggers, ranked_students
+from .seeding import COURSES, seed
+from .statements import import_statement
+from .transcripts import TranscriptJob
+
+
+def make_student(admission_number, course='ICT', **extra):
+    fields = dict(
+        name=f"Student {admission_number}", admission_number=admission_number,
+        phone_number='0700000000', sex='Male', course=course, last_school='-',
+        parent_contacts='-', religion='-',
+    )
+    fields.update(extra)
+    return Student.objects.create(**fields)
+
+
+@override_settings(REPLICA_DATABASE=None)
+class StudentSearchTests(TestCase):
+    def test_finds_new_and_renamed_students(self):
+        student = make_student('PLU/002', course='Plumbing')
+        make_student('PLU/020', course='Plumbing')
+        self.assertEqual(ranked_students(Student.objects.all(), 'PLU/002').first(), student)
+        student.name = 'Wanjiru Chebet'
+        student.save()
+        self.assertEqual(list(ranked_students(Student.objects.all(), 'chebet')), [student])
+
+    def test_exam_search_never_picks_a_student_for_an_unknown_number(self):
+        self.client.force_login(User.objects.create_superuser('examiner', password='x'))
+        wanted = make_student('PLU/002', course='Plumbing')
+        make_student('PLU/0021', course='Plumbing')
+
+        response = self.client.get(reverse('examinations'), {'q': 'plu/002'})
+        self.assertEqual(response.context['student'], wanted)
+        # Two prefix matches and no exact one: offer both, show neither's marks
+        response = self.client.get(reverse('examinations'), {'q': 'PLU/00'})
+        self.assertIsNone(response.context['student'])
+        self.assertEqual(len(response.context['candidates']), 2)
+
+    @override_settings(AUTOCOMPLETE_LIMIT=3)
+    def test_autocomplete_returns_a_few_best_matches(self):
+        for n in range(5):
+            make_student(f"ICT/{n:03d}")
+        exact = make_student('ICT/00')
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        url = reverse('student_autocomplete')
+
+        results = self.client.get(url, {'q': 'ict/00'}).json()['results']
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0], {'id': exact.pk, 'text': 'ICT/00 - Student ICT/00'})
+        self.assertEqual(self.client.get(url, {'q': 'i'}).json()['results'], [])
+        self.assertEqual(self.client.get(url, {'q': 'ict/000a'}).json()['results'], [])
+        with self.captureOnCommitCallbacks(execute=True):
+            make_student('ICT/000A')
+        response = self.client.get(url, {'q': 'ict/000a'})
+        self.assertEqual(response.json()['results'][0]['text'], 'ICT/000A - Student ICT/000A')
+        self.assertIn('no-cache', response.headers['Cache-Control'])
+        # The exam form no longer lists every student
+        html = self.client.get(reverse('examinations')).content.decode()
+        self.assertNotIn('ICT/004', html)
+
+    def test_search_triggers_come_back_after_a_table_rebuild(self):
+        if connection.vendor != 'sqlite' or FTS_TABLE not in connection.introspection.table_names():
+            self.skipTest("needs the SQLite FTS table")
+        with connection.cursor() as cursor:
+            for name in FTS_TRIGGERS:
+                cursor.execute(f"DROP TRIGGER {name}")
+        student = make_student('PLU/002', course='Plumbing')
+        self.assertEqual(install_fts_triggers(connection), list(FTS_TRIGGERS))
+        self.assertEqual(install_fts_triggers(connection), [])
+        self.assertEqual(list(ranked_students(Student.objects.all(), 'PLU/002')), [student])
+
+
+class PostPaymentTests(TestCase):
+    def setUp(self):
+        FeeStructure.objects.create(course='ICT', semester_1=30000, semester_2=25000, semester_3=20000)
+        self.user = User.objects.create_user('cashier', password='x')
+        self.student = make_student('KV/001')
+
+    def test_deducts_from_the_semester_balance(self):
+        payment, created = post_payment(self.student, '12000.50', '1', 'MPESA1', self.user)
+        self.assertTrue(created)
+        balance = FeeBalance.objects.get(student=self.student)
+        self.assertEqual(balance.sem1_bal, Decimal('17999.50'))
+        self.assertEqual(balance.sem2_bal, Decimal('25000'))
+
+    def test_same_transaction_id_is_posted_once(self):
+        first, _ = post_payment(self.student, 5000, '2', 'MPESA2', self.user)
+        again, created = post_payment(self.student, 5000, '2', 'MPESA2', self.user)
+        self.assertFalse(created)
+        self.assertEqual(first.pk, again.pk)
+        self.assertEqual(Payment.objects.count(), 1)
+        self.assertEqual(FeeBalance.objects.get(student=self.student).sem2_bal, Decimal('20000'))
+
+    def test_rejects_amounts_too_large_for_the_ledger(self):
+        for amount in ('1e20', '100000000', '99999999.999'):
+            with self.assertRaisesMessage(ValidationError, 'cannot be more than 99,999,999.99'):
+                post_payment(self.student, amount, '1', f"BIG-{amount}", self.user)
+        with self.assertRaisesMessage(ValidationError, 'greater than zero'):
+            post_payment(self.student, '0.001', '1', 'TINY', self.user)
+        self.assertEqual(Payment.objects.count(), 0)
+        self.assertEqual(post_payment(self.student, '99999999.99', '1', 'MAX', self.user)[0].amount,
+                         Decimal('99999999.99'))
+
+    def test_double_submitted_form_posts_once(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        data = {'amount': '1000', 'semester': '1', 'transaction_id': 'CASH-ABC'}
+        url = f'/finance/pay/{self.student.pk}/'
+        self.client.post(url, data)
+        self.client.post(url, data)
+        self.assertEqual(Payment.objects.filter(transaction_id='CASH-ABC').count(), 1)
+        self.assertEqual(FeeBalance.objects.get(student=self.student).sem1_bal, Decimal('29000'))
+
+
+class ConcurrentPaymentStressTest(TransactionTestCase):
+    """Several cashiers posting for the same students at the same time."""
+
+    THREADS = 8
+    PAYMENTS_PER_THREAD = 15
+
+    def setUp(self):
+        FeeStructure.objects.create(course='ICT', semester_1=100000, semester_2=100000, semester_3=100000)
+        self.user = User.objects.create_user('cashier', password='x')
+        self.students = [make_student(f"KV/{n:03d}") for n in range(3)]
+
+    def test_balances_equal_structure_minus_payments(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("needs a database that serves concurrent connections")
+        errors = []
+        barrier = threading.Barrier(self.THREADS)
+
+        def cashier(worker):
+            try:
+                barrier.wait()
+                for n in range(self.PAYMENTS_PER_THREAD):
+                    student = self.students[n % len(self.students)]
+                    # Every other payment is re-posted by a second cashier to
+                    # exercise the transaction_id idempotency under contention.
+                    ref = f"T{(worker // 2) * 2}-{n}" if n % 2 else f"T{worker}-{n}"
+                    post_payment(student, 100, str(n % 3 + 1), ref, self.user)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=cashier, args=(w,)) for w in range(self.THREADS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+
+        for student in self.students:
+            balance = FeeBalance.objects.get(student=student)
+            for semester, field in (('1', 'sem1_bal'), ('2', 'sem2_bal'), ('3', 'sem3_bal')):
+                paid = Payment.objects.filter(student=student, semester=semester).aggregate(
+                    total=Sum('amount'))['total'] or 0
+                self.assertEqual(getattr(balance, field), Decimal('100000') - paid)
+        self.assertEqual(
+            Payment.objects.values('transaction_id').distinct().count(),
+            Payment.objects.count(),
+        )
+        # One receipt per payment, numbered without gaps
+        self.assertEqual(
+            sorted(Receipt.objects.values_list('number', flat=True)),
+            list(range(1, Payment.objects.count() + 1)),
+        )
+
+
+class StatementImportTests(TestCase):
+    def setUp(self):
+        FeeStructure.objects.create(course='ICT', semester_1=30000, semester_2=25000, semester_3=20000)
+        self.user = User.objects.create_user('cashier', password='x')
+        self.student = make_student('KV/001')
+        post_payment(self.student, 1000, '1', 'OLD1', self.user)
+
+    def test_posts_batches_and_reports_duplicates_and_rejects(self):
+        statement = [
+            'Receipt No.,A/C No.,Paid In,Sem\n',
+            'R1,KV/001,"2,000",1\n',
+            'R2,KV/001,500,2\n',
+            'R1,KV/001,2000,1\n',
+            'OLD1,KV/001,1000,1\n',
+            'R3,KV/999,100,1\n',
+            'R4,KV/001,abc,1\n',
+            'R5,KV/001,300,3\n',
+        ]
+        report = import_statement(statement, self.user, source='mpesa.csv', batch_size=2)
+
+        self.assertEqual((report.posted, report.total_amount, report.duplicates), (3, Decimal('2800'), 2))
+        self.assertEqual([(line, ref) for line, ref, _ in report.rejected], [(6, 'R3'), (7, 'R4')])
+        balance = FeeBalance.objects.get(student=self.student)
+        self.assertEqual((balance.sem1_bal, balance.sem2_bal, balance.sem3_bal),
+                         (Decimal('27000'), Decimal('24500'), Decimal('19700')))
+        self.assertEqual(Receipt.objects.count(), 4)
+        self.assertTrue(AuditTrail.objects.filter(action=report.summary).exists())
+
+    def test_rejects_a_statement_without_the_required_columns(self):
+        with self.assertRaises(ValidationError):
+            import_statement(['Ref,Amount\n', 'R1,100\n'], self.user)
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_unreadable_rest_of_file_keeps_and_audits_the_posted_batches(self):
+        def statement():
+            yield 'Receipt No.,A/C No.,Paid In,Sem\n'
+            yield 'R1,KV/001,2000,1\n'
+            yield 'R2,KV/001,500,2\n'
+            raise UnicodeDecodeError('utf-8', b'\xff', 0, 1, 'invalid start byte')
+
+        with self.assertRaisesMessage(ValidationError, '2 payment(s) totalling Ksh 2500'):
+            import_statement(statement(), self.user, source='mpesa.csv', batch_size=2)
+        self.assertEqual(Payment.objects.count(), 3)
+        summary = AuditTrail.objects.get(action_type='import').action
+        self.assertIn('2 payment(s)', summary)
+        self.assertIn('stopped early, could not read past line 3', summary)
+
+    def test_import_refreshes_the_finance_figures(self):
+        cache.clear()
+        self.assertEqual(finance_stats()['total_collected'], Decimal('1000'))
+        with self.captureOnCommitCallbacks(execute=True):
+            import_statement(['Receipt No.,A/C No.,Paid In,Sem\n', 'R1,KV/001,2000,1\n'], self.user)
+        stats = finance_stats()
+        self.assertEqual(stats['total_collected'], Decimal('3000'))
+        self.assertEqual(stats['total_outstanding'], Decimal('72000'))
+
+
+@override_settings(REPLICA_DATABASE=None)
+class PaymentHistoryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', password='x')
+        student = make_student('KV/001')
+        # Local (Africa/Nairobi) times either side of the 1-2 March range
+        self.stamps = ['2026-02-28 23:59', '2026-03-01 00:00', '2026-03-01 12:00',
+                       '2026-03-02 23:59', '2026-03-03 00:00']
+        for n, stamp in enumerate(self.stamps):
+            payment, _ = post_payment(student, 100, '1', f"H{n}", self.user)
+            Payment.objects.filter(pk=payment.pk).update(
+                date=timezone.make_aware(datetime.datetime.fromisoformat(stamp)))
+
+    def test_date_range_covers_whole_local_days(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('payment_history'),
+                                   {'date_from': '2026-03-01', 'date_to': '2026-03-02'})
+        self.assertEqual([p.transaction_id for p in response.context['payments']], ['H3', 'H2', 'H1'])
+
+    def test_pages_forward_and_back_by_cursor(self):
+        payments = Payment.objects.all()
+        first = keyset_paginate(payments, page_size=2)
+        second = keyset_paginate(payments, after=first.next_cursor, page_size=2)
+        last = keyset_paginate(payments, after=second.next_cursor, page_size=2)
+        self.assertEqual([p.transaction_id for p in first], ['H4', 'H3'])
+        self.assertEqual([p.transaction_id for p in second], ['H2', 'H1'])
+        self.assertEqual([p.transaction_id for p in last], ['H0'])
+        self.assertFalse(last.has_next)
+        back = keyset_paginate(payments, before=last.prev_cursor, page_size=2)
+        self.assertEqual([p.transaction_id for p in back], ['H2', 'H1'])
+        self.assertTrue(back.has_previous)
+
+
+@override_settings(AUDIT_SYNC=True)
+class MarksSheetTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('examiner', password='x'))
+        self.students = [make_student(f"ICT/{n:03d}") for n in range(3)]
+        make_student('PLU/001', course='Plumbing')
+        Examination.objects.create(student=self.students[0], subject_name='Networking', marks=40,
+                                   year_of_study='1', semester='1')
+        self.url = f"{reverse('marks_sheet')}?course=ICT&year_of_study=1&semester=1&subject_name=Networking"
+
+    def marks(self):
+        return dict(Examination.objects.filter(subject_name='Networking')
+                    .values_list('student__admission_number', 'marks'))
+
+    def test_grid_records_new_and_changed_marks_and_skips_blanks(self):
+        first, second, third = self.students
+        self.client.post(self.url, {f'marks_{first.pk}': '65', f'marks_{second.pk}': '70',
+                                    f'marks_{third.pk}': ' '})
+        self.assertEqual(self.marks(), {'ICT/000': 65, 'ICT/001': 70})
+        self.assertEqual(AuditTrail.objects.filter(action_type='marks').count(), 1)
+
+        with QueryProfile() as profile:
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.context['rows']), 3)
+        self.assertEqual(len([sql for sql, _ in profile.queries if 'core_examination' in sql]), 1)
+
+    def test_csv_upload_reports_rows_it_cannot_use(self):
+        upload = SimpleUploadedFile('marks.csv', b'Admission_Number,Marks\nICT/001,55\nPLU/001,80\nICT/002,101\n')
+        response = self.client.post(self.url, {'upload_csv': '1', 'marks_file': upload}, follow=True)
+        self.assertEqual(self.marks(), {'ICT/000': 40, 'ICT/001': 55})
+        warnings = [str(m) for m in response.context['messages']]
+        self.assertIn("Line 3: PLU/001 is not enrolled in ICT", warnings)
+        self.assertIn("Line 4: marks must be between 0 and 100", warnings)
+
+    def test_rejects_a_mark_out_of_range(self):
+        self.client.post(self.url, {f'marks_{self.students[1].pk}': '150'})
+        self.assertEqual(self.marks(), {'ICT/000': 40})
+
+
+class SemesterResultTests(TestCase):
+    def setUp(self):
+        self.ict = [make_student(f"ICT/{n:03d}") for n in range(3)]
+        self.plumber = make_student('PLU/001', course='Plumbing')
+        for student, marks in zip([*self.ict, self.plumber], (80, 60, 30, 50)):
+            for subject in ('Maths', 'English'):
+                Examination.objects.create(student=student, subject_name=subject, marks=marks,
+                                           year_of_study='1', semester='1')
+
+    def ranks(self):
+        return dict(SemesterResult.objects.values_list('student__admission_number', 'rank'))
+
+    def test_summaries_and_ranks_follow_marks(self):
+        result = SemesterResult.objects.get(student=self.ict[2])
+        self.assertEqual((result.subject_count, result.total_marks, result.grade, result.failed_subjects),
+                         (2, 60, 'E', 2))
+        self.assertEqual(self.ranks(), {'ICT/000': 1, 'ICT/001': 2, 'ICT/002': 3, 'PLU/001': 1})
+
+        stamped = result.updated_at
+        Examination.objects.filter(student=self.ict[2]).update(marks=90)
+        refresh_semester_results({self.ict[2].pk})
+        result.refresh_from_db()
+        self.assertEqual((result.grade, result.rank), ('A', 1))
+        self.assertGreater(result.updated_at, stamped)
+
+    def test_changing_course_reranks_both_cohorts(self):
+        self.ict[0].course = 'Plumbing'
+        self.ict[0].save()
+        self.assertEqual(self.ranks(), {'ICT/000': 1, 'ICT/001': 1, 'ICT/002': 2, 'PLU/001': 2})
+
+    def test_deleting_a_student_refreshes_once_after_the_cascade(self):
+        for n in range(3):
+            Examination.objects.create(student=self.ict[0], subject_name=f"Extra {n}", marks=80,
+                                       year_of_study='1', semester='1')
+        with patch('core.results.refresh_semester_results') as refresh, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.ict[0].delete()
+        refresh.assert_called_once()
+        self.assertEqual(self.ranks(), {'ICT/001': 1, 'ICT/002': 2, 'PLU/001': 1})
+
+
+class TranscriptJobTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.client.force_login(User.objects.create_superuser('examiner', password='x'))
+        make_student('ICT/001')
+        self.job = TranscriptJob('ICT', '1', '1')
+
+    def start(self):
+        with patch('core.views.subprocess.Popen') as popen:
+            self.client.post(reverse('transcripts'), {'course': 'ICT', 'year_of_study': '1', 'semester': '1'})
+        return popen.call_args[0][0] if popen.called else None
+
+    def test_new_requests_start_fresh_and_failed_runs_resume(self):
+        self.assertIn('--fresh', self.start())
+        self.job.write_status('done', 1, 1)
+        self.assertIn('--fresh', self.start())
+        self.job.write_status('failed', 1, 0, error='worker died')
+        command = self.start()
+        self.assertNotIn('--fresh', command)
+        self.assertEqual(command[command.index('--job') + 1], self.job.job_id)
+
+    def test_queued_and_running_jobs_are_not_started_twice(self):
+        for state in ('queued', 'running'):
+            self.job.write_status(state)
+            self.assertIsNone(self.start())
+        # Gone quiet: the process died, so the next request resumes it
+        with override_settings(TRANSCRIPT_STALE_SECONDS=0):
+            self.assertNotIn('--fresh', self.start())
+
+    def test_courses_that_slug_alike_get_their_own_jobs(self):
+        ids = {TranscriptJob(course, '1', '1').job_id for course in ('ICT (Day)', 'ICT Day', 'ict day')}
+        self.assertEqual(len(ids), 3)
+        self.assertEqual(TranscriptJob('ICT', 1, 1).job_id, self.job.job_id)
+
+    def test_fresh_run_discards_earlier_slips(self):
+        self.job.write_status('done', 1, 1)
+        old_slip = self.job.directory / 'OLD_001.html'
+        old_slip.write_text('stale')
+        TranscriptJob('Plumbing', '1', '1', job_id=self.job.job_id).run(fresh=True)
+        self.assertFalse(old_slip.exists())
+        self.assertEqual(self.job.status()['state'], 'done')
+
+
+@override_settings(AUDIT_BUFFER_SIZE=3, AUDIT_FLUSH_INTERVAL=60)
+class AuditBufferTests(TestCase):
+    def setUp(self):
+        journal = tempfile.TemporaryDirectory()
+        self.addCleanup(journal.cleanup)
+        self.enterContext(override_settings(AUDIT_JOURNAL_DIR=journal.name))
+        self.journal = pathlib.Path(journal.name)
+        self.user = User.objects.create_user('clerk', password='x')
+        self.buffer = audit.AuditBuffer()
+        self.addCleanup(self.buffer.flush)
+
+    def entry(self, action):
+        return audit._entry(self.user, action, 'other', None)
+
+    def test_buffers_until_full_then_writes_one_batch(self):
+        self.buffer.add(self.entry('one'))
+        self.buffer.add(self.entry('two'))
+        self.assertEqual(AuditTrail.objects.count(), 0)
+        self.assertEqual(len(list(self.journal.glob('*.jsonl'))), 1)
+
+        with QueryProfile() as profile:
+            self.buffer.add(self.entry('three'))
+        self.assertEqual(sorted(AuditTrail.objects.values_list('action', flat=True)), ['one', 'three', 'two'])
+        self.assertEqual(len([sql for sql, _ in profile.queries if sql.startswith('INSERT')]), 1)
+        self.assertEqual(list(self.journal.glob('*.jsonl')), [])
+
+    def test_replays_the_journal_of_a_dead_process(self):
+        dead = subprocess.Popen([sys.executable, '-c', ''])
+        dead.wait()
+        entry = dict(self.entry('before the crash'), timestamp=timezone.now().isoformat())
+        (self.journal / f"{dead.pid}-1.jsonl").write_text(json.dumps(entry) + '\n')
+
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertTrue(AuditTrail.objects.filter(action='before the crash').exists())
+        self.assertEqual(list(self.journal.glob('*.jsonl')), [])
+
+    def test_a_failed_flush_is_retried_by_the_next_one(self):
+        self.buffer.replayed = True
+        self.buffer.add(self.entry('one'))
+        with patch('core.audit._write', side_effect=OperationalError('database is locked')), \
+                self.assertLogs('core.audit', 'ERROR'):
+            self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(len(list(self.journal.glob('*.jsonl'))), 1)
+
+        self.buffer.add(self.entry('two'))
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(sorted(AuditTrail.objects.values_list('action', flat=True)), ['one', 'two'])
+        self.assertEqual((self.buffer.failed, list(self.journal.glob('*.jsonl'))), ([], []))
+
+    def test_replay_leaves_this_process_segments_alone(self):
+        self.buffer.add(self.entry('still buffered'))
+        self.assertEqual(self.buffer.replay(), 0)
+        self.assertEqual(AuditTrail.objects.count(), 0)
+        self.assertEqual(self.buffer.flush(), 1)
+
+    def test_rolled_back_changes_leave_no_entry(self):
+        with patch.object(audit, '_buffer', self.buffer), self.captureOnCommitCallbacks(execute=True):
+            audit.record(self.user, 'kept')
+            try:
+                with transaction.atomic():
+                    audit.record(self.user, 'rolled back')
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertEqual([e['action'] for e in self.buffer.entries], ['kept'])
+
+
+class AuditRetentionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('clerk', password='x')
+        utc = datetime.timezone.utc
+        for stamp in ('2026-01-05', '2026-01-20', '2026-02-10', '2026-03-01'):
+            AuditTrail.objects.create(user=self.user, action='Logged in', action_type='login',
+                                      timestamp=datetime.datetime.fromisoformat(stamp).replace(tzinfo=utc))
+        self.now = datetime.datetime(2026, 4, 15, tzinfo=utc)
+
+    def rollups(self):
+        return dict(AuditRollup.objects.values_list('month', 'count'))
+
+    def test_rolls_up_and_removes_whole_expired_months(self):
+        cutoff, removed, dropped = apply_retention(1, now=self.now)
+        self.assertEqual((cutoff.date(), removed, dropped), (datetime.date(2026, 3, 1), 3, []))
+        self.assertEqual(self.rollups(), {datetime.date(2026, 1, 1): 2, datetime.date(2026, 2, 1): 1})
+        self.assertEqual(AuditTrail.objects.count(), 1)
+
+    def test_a_run_that_stops_part_way_is_never_counted_twice(self):
+        rollup = audit_retention.rollup
+
+        def rollup_then_fail_in_february(entries):
+            counted = rollup(entries)
+            if entries.filter(timestamp__month=2).exists():
+                raise DatabaseError('connection lost')
+            return counted
+
+        with patch('core.audit_retention.rollup', side_effect=rollup_then_fail_in_february), \
+                self.assertRaises(DatabaseError):
+            apply_retention(1, now=self.now)
+        self.assertEqual(self.rollups(), {datetime.date(2026, 1, 1): 2})
+        self.assertEqual(AuditTrail.objects.count(), 2)
+
+        apply_retention(1, now=self.now)
+        self.assertEqual(self.rollups(), {datetime.date(2026, 1, 1): 2, datetime.date(2026, 2, 1): 1})
+
+
+@override_settings(REPLICA_DATABASE=None)
+class DepartmentAccessTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('storekeeper', password='x')
+        # An older profile with the short department name
+        self.profile = UserProfile.objects.create(user=self.user, department='store', is_approved=True)
+
+    def test_decision_is_cached_per_user(self):
+        user = User.objects.select_related('userprofile').get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            access = access_for(user)
+        self.assertTrue(access.allows('stores'))
+        self.assertFalse(access.allows('finance'))
+        # A user loaded without the profile still needs no query
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(access_for(user), access)
+
+    def test_profile_changes_apply_on_the_next_request(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('stores')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('finance')).status_code, 403)
+        self.profile.is_approved = False
+        self.profile.save()
+        self.assertEqual(self.client.get(reverse('stores')).status_code, 403)
+
+
+def make_jpeg(size=(300, 400), orientation=None):
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    out = io.BytesIO()
+    Image.new('RGB', size, 'navy').save(out, 'JPEG', exif=exif)
+    return out.getvalue()
+
+
+class PhotoTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.media = pathlib.Path(media.name)
+
+    def processed_student(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            student = make_student('KV/001', passport_photo=SimpleUploadedFile('me.jpg', make_jpeg()))
+        student.refresh_from_db()
+        return student
+
+    def test_renders_a_stripped_original_and_webp_and_jpeg_derivatives(self):
+        source = self.media / 'upload.jpg'
+        source.write_bytes(make_jpeg(orientation=6))
+        photo_hash = photos.render_photo(source, self.media)
+
+        with Image.open(self.media / photos.original_name(photo_hash)) as original:
+            # Turned upright, then the EXIF dropped
+            self.assertEqual(original.size, (400, 300))
+            self.assertNotIn('exif', original.info)
+        for name in photos.derivative_names(photo_hash):
+            self.assertTrue((self.media / name).exists(), name)
+        with Image.open(self.media / photos.derivative_name(photo_hash, 'thumb', 2, 'webp')) as thumb:
+            self.assertEqual((thumb.format, thumb.size), ('WEBP', (96, 96)))
+
+    def test_upload_is_processed_only_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            student = make_student('KV/001', passport_photo=SimpleUploadedFile('me.jpg', make_jpeg()))
+            self.assertEqual(Student.objects.get(pk=student.pk).photo_hash, '')
+        student.refresh_from_db()
+        self.assertTrue(photos.is_processed(student))
+        self.assertEqual(student.passport_photo.name, photos.original_name(student.photo_hash))
+
+    def test_processed_photos_are_skipped(self):
+        student = self.processed_student()
+        with patch('core.photos.render_photo') as render, self.captureOnCommitCallbacks(execute=True):
+            student.save()
+            photos.process_student_photo(student.pk)
+        render.assert_not_called()
+
+    def test_tag_renders_a_lazy_picture(self):
+        student = self.processed_student()
+        html = Template("{% load student_photos %}{% student_photo student 'thumb' %}").render(
+            Context({'student': student}))
+        self.assertTrue(html.startswith('<picture><source type="image/webp"'))
+        self.assertIn(default_storage.url(photos.derivative_name(student.photo_hash, 'thumb', 2, 'webp')) + ' 2x', html)
+        self.assertIn('loading="lazy"', html)
+        self.assertIn('width="48"', html)
+
+
+class PhotoBackfillTests(TransactionTestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+
+    def test_command_processes_only_unprocessed_photos(self):
+        for n in range(2):
+            # Saved behind the signal's back, as photos uploaded before processing existed
+            student = make_student(f"KV/00{n}")
+            name = default_storage.save(f"student_photos/old{n}.jpg", io.BytesIO(make_jpeg()))
+            Student.objects.filter(pk=student.pk).update(passport_photo=name)
+        done = make_student('KV/009', passport_photo=SimpleUploadedFile('me.jpg', make_jpeg()))
+        done.refresh_from_db()
+        self.assertTrue(photos.is_processed(done))
+
+        out = io.StringIO()
+        call_command('process_photos', workers=1, stdout=out)
+        self.assertIn('2/2 photos', out.getvalue())
+        self.assertIn('0 photo(s) could not be processed', out.getvalue())
+        self.assertTrue(all(photos.is_processed(s) for s in Student.objects.all()))
+        self.assertFalse(default_storage.exists('student_photos/old0.jpg'))
+
+
+class FeeRevisionTests(TestCase):
+    def setUp(self):
+        FeeStructure.objects.create(course='ICT', semester_1=30000, semester_2=25000, semester_3=20000)
+        self.user = User.objects.create_superuser('bursar', password='x')
+        self.students = [make_student(f"KV/{n:03d}") for n in range(2)]
+        post_payment(self.students[0], 10000, '1', 'PAID1', self.user)
+        self.amounts = {'semester_1': Decimal('32000'), 'semester_2': Decimal('25000'), 'semester_3': Decimal('20000')}
+
+    def balances(self):
+        return list(FeeBalance.objects.order_by('student__admission_number').values_list('sem1_bal', flat=True))
+
+    def test_preview_then_apply_recomputes_from_payments(self):
+        preview = RevisionPreview('ICT', self.amounts)
+        self.assertEqual((len(preview.changes), preview.total_delta), (2, Decimal('4000')))
+        self.assertEqual(self.balances(), [Decimal('20000'), Decimal('30000')])
+
+        revision = apply_revision('ICT', self.amounts, self.user, base_revision='')
+        self.assertEqual(revision.students_affected, 2)
+        self.assertEqual(self.balances(), [Decimal('22000'), Decimal('32000')])
+
+    def test_a_stale_preview_changes_nothing(self):
+        preview = RevisionPreview('ICT', self.amounts)
+        apply_revision('ICT', {**self.amounts, 'semester_1': Decimal('31000')}, self.user)
+        with self.assertRaises(ValidationError):
+            apply_revision('ICT', self.amounts, self.user, base_revision=preview.base_revision or '')
+        self.assertEqual(self.balances(), [Decimal('21000'), Decimal('31000')])
+
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('revise_fees'), {
+            'course': 'ICT', **self.amounts, 'note': '', 'confirm': '1', 'base_revision': '',
+        })
+        self.assertContains(response, "changed since this preview")
+        self.assertEqual(FeeStructureRevision.objects.count(), 1)
+
+
+def make_xlsx(rows):
+    """A minimal workbook: {row number: [(cell type, value)]}; 'n' cells are numbers."""
+    cells = []
+    for number, values in rows.items():
+        row = ''.join(
+            f'<c r="{chr(65 + i)}{number}" t="inlineStr"><is><t>{value}</t></is></c>' if kind == 's'
+            else f'<c r="{chr(65 + i)}{number}"><v>{value}</v></c>'
+            for i, (kind, value) in enumerate(values)
+        )
+        cells.append(f'<row r="{number}">{row}</row>')
+    sheet = ('<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+             f'<sheetData>{"".join(cells)}</sheetData></worksheet>')
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('xl/worksheets/sheet1.xml', sheet)
+    buffer.seek(0)
+    return buffer
+
+
+@override_settings(AUDIT_SYNC=True)
+class IntakeImportTests(TestCase):
+    HEADER = ['Name', 'Adm No', 'Phone', 'Sex', 'Course', 'Last School', 'Parent Contacts', 'Religion', 'Year']
+
+    def setUp(self):
+        FeeStructure.objects.create(course='ICT', semester_1=30000, semester_2=25000, semester_3=20000)
+        self.user = User.objects.create_user('registrar', password='x')
+        make_student('ICT/001')
+
+    def row(self, adm, phone, phone_kind='s'):
+        return [('s', f"Student {adm}"), ('s', adm), (phone_kind, phone), ('s', 'f'), ('s', 'ICT'),
+                ('s', 'Kapsabet Boys'), ('s', '0722000000'), ('s', 'Christian'), ('n', '2026.0')]
+
+    def test_admits_an_intake_with_balances_and_keeps_leading_zeros(self):
+        sheet = make_xlsx({1: [('s', name) for name in self.HEADER],
+                           2: self.row('ICT/002', '0712345678'), 3: self.row('ICT/003', '0798765432')})
+        report = import_students(read_rows(sheet, 'intake.xlsx'), self.user, source='intake.xlsx')
+
+        self.assertEqual((report.created, report.balances, report.errors), (2, 2, []))
+        student = Student.objects.get(admission_number='ICT/002')
+        self.assertEqual((student.phone_number, student.sex, student.year_enrolled), ('0712345678', 'Female', 2026))
+        self.assertEqual(FeeBalance.objects.get(student=student).sem1_bal, Decimal('30000'))
+        self.assertTrue(AuditTrail.objects.filter(action=report.summary).exists())
+
+    def test_reports_errors_on_the_sheet_row_and_admits_nobody(self):
+        # Row 3 is empty and left out of the file; the rows after it keep their numbers
+        sheet = make_xlsx({1: [('s', name) for name in self.HEADER],
+                           2: self.row('ICT/002', '0712345678'),
+                           4: self.row('ICT/001', '0712000000'),
+                           5: self.row('ICT/005', '7.12345678E8', phone_kind='n')})
+        report = import_students(read_rows(sheet, 'intake.xlsx'), self.user)
+
+        self.assertEqual([(line, adm) for line, adm, _ in report.errors], [(4, 'ICT/001'), (5, 'ICT/005')])
+        self.assertIn("number 712345678, which drops any leading 0", report.errors[1][2])
+        self.assertEqual(report.created, 0)
+        self.assertFalse(Student.objects.filter(admission_number='ICT/002').exists())
+
+    def test_csv_line_numbers_count_quoted_line_breaks(self):
+        lines = io.StringIO(','.join(self.HEADER) + '\n'
+                            'Student A,ICT/010,0711111111,M,ICT,"Line one\nLine two",-,-,2026\n'
+                            'Student B,ICT/011,0711111112,X,ICT,-,-,-,2026\n')
+        report = import_students(read_rows(lines, 'intake.csv'), self.user, skip_invalid=True)
+        self.assertEqual(report.created, 1)
+        self.assertEqual([line for line, _, _ in report.errors], [4])
+
+
+class StockLedgerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('storekeeper', password='x')
+        today = timezone.localdate()
+        self.chalk = Consumable.objects.create(item_name='Chalk', date_supplied=today, balance_stock=10,
+                                               reorder_level=5, added_by=self.user)
+        stores.open_item(self.chalk, self.user)
+        self.paper = Consumable.objects.create(item_name='Paper', date_supplied=today, balance_stock=3,
+                                               reorder_level=5, added_by=self.user)
+        stores.open_item(self.paper, self.user)
+
+    def ledger(self, item):
+        return list(item.movements.order_by('id').values_list('kind', 'quantity', 'balance_after'))
+
+    def test_every_change_is_a_movement_with_the_balance_it_left(self):
+        stores.receive(self.chalk, 20, self.user)
+        stores.issue(self.chalk, 12, self.user, issued_to='ICT department')
+        stores.adjust(self.chalk, 15, self.user)
+        self.chalk.refresh_from_db()
+        self.assertEqual(self.chalk.balance_stock, 15)
+        self.assertEqual(self.chalk.last_date_issued, timezone.localdate())
+        self.assertEqual(self.ledger(self.chalk),
+                         [('receive', 10, 10), ('receive', 20, 30), ('issue', -12, 18), ('adjust', -3, 15)])
+
+    def test_a_bulk_issue_with_any_shortage_issues_nothing(self):
+        with self.assertRaisesMessage(ValidationError, "Only 3 Paper left (asked for 4)."):
+            stores.issue_many([(self.chalk, 2), (self.paper, 4)], self.user)
+        self.assertEqual(list(Consumable.objects.order_by('item_name').values_list('balance_stock', flat=True)),
+                         [10, 3])
+        self.assertEqual(StockMovement.objects.filter(kind='issue').count(), 0)
+
+    def test_low_stock_estimates_days_left_from_recent_issues(self):
+        stores.issue(self.chalk, 6, self.user)
+        low = {item.item_name: item for item in stores.low_stock()}
+        self.assertEqual(set(low), {'Chalk', 'Paper'})
+        self.assertEqual((low['Chalk'].issued, low['Chalk'].days_left), (6, 20))
+        self.assertIsNone(low['Paper'].days_left)
+
+
+@override_settings(REPLICA_DATABASE=None)
+class StoresInventoryTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('storekeeper', password='x'))
+        day = datetime.date(2026, 3, 1)
+        for n, stock in enumerate((0, 4, 50)):
+            Consumable.objects.create(item_name=f"Marker {n}", date_supplied=day + datetime.timedelta(days=n),
+                                      balance_stock=stock, reorder_level=5)
+        for n, condition in enumerate(('Good', 'Good', 'Damaged')):
+            PermanentEquipment.objects.create(item_name=f"Desk {n}", date_delivered=day, condition=condition)
+
+    @patch('core.stores.INVENTORY_PAGE_SIZE', 2)
+    def test_pages_each_list_separately(self):
+        response = self.client.get(reverse('stores'), {'cpage': 2})
+        self.assertEqual([c.item_name for c in response.context['consumables']], ['Marker 2'])
+        self.assertEqual([e.item_name for e in response.context['equipment']], ['Desk 0', 'Desk 1'])
+        summary = response.context['summary']
+        self.assertEqual((summary.consumables, summary.units, summary.low, summary.equipment), (3, 54, 2, 3))
+        self.assertEqual(dict(summary.conditions)['Damaged'], 1)
+
+    def test_filters_apply_to_both_lists(self):
+        response = self.client.get(reverse('stores'), {'low': '1', 'date_from': '2026-03-02', 'condition': 'Good'})
+        self.assertEqual([c.item_name for c in response.context['consumables']], ['Marker 1'])
+        self.assertEqual([e.item_name for e in response.context['equipment']], [])
+        self.assertIn('low=1', response.context['filter_query'])
+
+
+@override_settings(REPLICA_DATABASE=None)
+class ReceiptPrintTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('cashier', password='x')
+        self.client.force_login(self.user)
+        self.student = make_student('KV/001', name='Jane Chebet')
+        self.payments = []
+        for n, stamp in enumerate(['2026-02-28 23:59', '2026-03-01 00:00', '2026-03-02 23:59', '2026-03-03 00:00']):
+            payment, _ = post_payment(self.student, 100, '1', f"P{n}", self.user)
+            Payment.objects.filter(pk=payment.pk).update(
+                date=timezone.make_aware(datetime.datetime.fromisoformat(stamp)))
+            self.payments.append(payment)
+
+    def test_reprint_serves_the_receipt_as_issued(self):
+        Student.objects.filter(pk=self.student.pk).update(name='Jane Kiprop')
+        response = self.client.get(reverse('print_receipt', args=[self.payments[0].pk]))
+        self.assertContains(response, 'Jane Chebet')
+        self.assertNotContains(response, 'Jane Kiprop')
+
+    def test_receipt_without_a_snapshot_is_rendered_once_and_kept(self):
+        Receipt.objects.filter(payment=self.payments[0]).update(html='')
+        self.client.get(reverse('print_receipt', args=[self.payments[0].pk]))
+        Student.objects.filter(pk=self.student.pk).update(name='Jane Kiprop')
+        self.assertContains(self.client.get(reverse('print_receipt', args=[self.payments[0].pk])), 'Jane Chebet')
+
+    def test_batch_prints_whole_local_days_in_number_order(self):
+        response = self.client.get(reverse('print_receipts'), {'date_from': '2026-03-01', 'date_to': '2026-03-02'})
+        printed = response.context['receipts']
+        self.assertEqual([r.payment.transaction_id for r in printed], ['P1', 'P2'])
+        self.assertEqual([r.number for r in printed], sorted(r.number for r in printed))
+        self.assertFalse(response.context['truncated'])
+
+    @patch('core.receipts.BATCH_PRINT_LIMIT', 1)
+    def test_batch_is_truncated_at_the_limit(self):
+        response = self.client.get(reverse('print_receipts'), {'date_from': '2026-02-28', 'date_to': '2026-03-03'})
+        self.assertEqual(len(response.context['receipts']), 1)
+        self.assertTrue(response.context['truncated'])
+
+
+class CachingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        FeeStructure.objects.create(course='ICT', semester_1=30000, semester_2=25000, semester_3=20000)
+
+    def test_saves_invalidate_registered_models_after_commit(self):
+        self.assertEqual([s.semester_1 for s in caching.fee_structures()], [30000])
+        with self.assertNumQueries(0):
+            caching.fee_structures()
+        with self.captureOnCommitCallbacks(execute=True):
+            FeeStructure.objects.create(course='Welding', semester_1=10000, semester_2=10000, semester_3=10000)
+        self.assertEqual([s.course for s in caching.fee_structures()], ['ICT', 'Welding'])
+
+    def test_bulk_writes_need_an_explicit_bump(self):
+        caching.fee_structures()
+        FeeStructure.objects.update(semester_1=31000)
+        self.assertEqual(caching.fee_structures()[0].semester_1, 30000)
+        with self.captureOnCommitCallbacks(execute=True):
+            caching.bump(FeeStructure)
+        self.assertEqual(caching.fee_structures()[0].semester_1, 31000)
+
+    def test_bump_waits_for_the_commit(self):
+        caching.fee_structures()
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            FeeStructure.objects.update(semester_1=31000)
+            caching.bump(FeeStructure)
+        self.assertEqual(len(callbacks), 1)
+        with self.assertNumQueries(0):
+            caching.fee_structures()
+
+    def test_an_evicted_version_never_matches_old_keys(self):
+        key = caching.make_key('fee_structures', (FeeStructure,))
+        cache.delete(caching._version_key(FeeStructure))
+        self.assertNotEqual(caching.make_key('fee_structures', (FeeStructure,)), key)
+
+
+@override_settings(REPLICA_DATABASE=None)
+class QueryProfileTests(TestCase):
+    def test_counts_queries_and_repeated_statements(self):
+        students = [make_student(f"KV/{n:03d}") for n in range(4)]
+        with QueryProfile() as profile:
+            for student in students:
+                FeeBalance.objects.filter(student=student).first()
+            Student.objects.count()
+        self.assertEqual(profile.count, 5)
+        self.assertEqual(profile.worst_duplicate, 4)
+        self.assertGreater(profile.wall_time, 0)
+
+    @override_settings(QUERY_METRICS_HEADERS=True)
+    def test_middleware_sets_headers_and_metrics(self):
+        metrics.reset()
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        response = self.client.get(reverse('finance'))
+        self.assertIn('X-Query-Count', response)
+        self.assertIn('X-Response-Time-Ms', response)
+        row = next(r for r in metrics.table() if r['url_name'] == 'finance')
+        self.assertEqual(row['requests'], 1)
+        self.assertEqual(row['max_queries'], int(response['X-Query-Count']))
+
+
+# Tests that request views read from the primary only (see ReplicaRoutingTests)
+@override_settings(REPLICA_DATABASE=None)
+class QueryBudgetTests(TestCase):
+    """
+    Every view in core/urls.py, requested by a superuser against a seeded
+    database with cold caches, must stay within its query budget. The
+    seeded lists are long enough that a per-row query would break it.
+    Budgets are for a single database (no replica session pinning).
+    """
+
+    # url name -> most queries one GET may run
+    BUDGETS = {
+        'login': 0,
+        'logout': 0,
+        'redirect_after_login': 2,
+        'register': 0,
+        'dashboard': 2,
+        'admissions': 5,
+        'import_students': 2,
+        'student_profile': 3,
+        'student_autocomplete': 3,
+        'edit_student': 3,
+        'finance': 10,
+        'finance_async': 10,
+        'process_payment': 4,
+        'print_receipt': 3,
+        'print_receipts': 3,
+        'payment_history': 3,
+        'import_statement': 2,
+        'revise_fees': 3,
+        'examinations': 4,
+        'examinations_async': 4,
+        'marks_sheet': 4,
+        'transcripts': 2,
+        'transcript_status': 2,
+        'stores': 11,
+        'bulk_issue': 4,
+        'delete_store_item': 5,
+        'admin_management': 5,
+        'audit_log': 4,
+        'approve_user': 6,
+        'delete_user': 16,
+        'api_list': 3,
+        'api_detail': 3,
+    }
+    COURSES = ('ICT', 'Plumbing', 'Fashion')
+    PER_COURSE = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', password='x')
+        for course in cls.COURSES:
+            FeeStructure.objects.create(course=course, semester_1=30000, semester_2=25000, semester_3=20000)
+            for n in range(cls.PER_COURSE):
+                student = make_student(f"{course[:3].upper()}/{n:03d}", course=course)
+                post_payment(student, 1000, '1', f"{course}-{n}", cls.admin)
+                for subject in ('Maths', 'English'):
+                    Examination.objects.create(student=student, subject_name=subject, marks=50 + n,
+                                               year_of_study='1', semester='1')
+        for n in range(8):
+            Consumable.objects.create(item_name=f"Item {n}", date_supplied='2026-01-01', balance_stock=n,
+                                      reorder_level=3, added_by=cls.admin)
+            PermanentEquipment.objects.create(item_name=f"Desk {n}", date_delivered='2026-01-01',
+                                              added_by=cls.admin)
+        for n in range(3):
+            staff = User.objects.create_user(f"clerk{n}", password='x', is_active=n > 0)
+            UserProfile.objects.create(user=staff, department='finance', is_approved=n > 0)
+        AuditTrail.objects.bulk_create([AuditTrail(user=cls.admin, action=f"Seed {n}") for n in range(30)])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def test_every_view_has_a_budget(self):
+        names = {p.name for p in urls.urlpatterns if isinstance(p, URLPattern)}
+        self.assertEqual(names, set(self.BUDGETS))
+
+    def test_views_stay_within_budget(self):
+        targets = benchmark.sample_urls()
+        for pattern in urls.urlpatterns:
+            with self.subTest(view=pattern.name):
+                url = targets[pattern.name]
+                with QueryProfile() as profile:
+                    response = self.client.get(url)
+                    benchmark.consume(response)
+                self.assertLess(response.status_code, 500, url)
+                self.assertLessEqual(
+                    profile.count, self.BUDGETS[pattern.name],
+                    f"{url} ran {profile.count} queries:\n" + "\n".join(sql for sql, _ in profile.queries),
+                )
+
+    def test_async_views_render_the_sync_pages(self):
+        def page(url):
+            html = benchmark.consume(self.client.get(url)).decode()
+            # Masked CSRF tokens differ on every render
+            return re.sub(r'value="\w{64}"', '', ''.join(html.split()))
+
+        for sync, streamed in (('finance', 'finance_async'), ('examinations', 'examinations_async')):
+            for params in ('', '?search=ICT/001', '?q=PLU/002', '?q=no-such-student'):
+                with self.subTest(view=streamed, params=params):
+                    self.assertEqual(page(reverse(streamed) + params), page(reverse(sync) + params))
+
+
+
+@override_settings(REPLICA_DATABASE=None)
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        FeeStructure.objects.create(course='ICT', semester_1=30000, semester_2=25000, semester_3=20000)
+        cls.clerk = User.objects.create_user('cashier', password='x')
+        UserProfile.objects.create(user=cls.clerk, department='finance', is_approved=True)
+        for n in range(7):
+            post_payment(make_student(f"ICT/{n:03d}"), 100 + n, '1', f"API-{n}", cls.clerk)
+
+    def setUp(self):
+        self.client.force_login(self.clerk)
+
+    def test_pages_through_every_row_with_only_the_fields_asked_for(self):
+        url = reverse('api_list', kwargs={'resource': 'payments'}) + '?limit=3&fields=amount,transaction_id'
+        seen = []
+        while url:
+            with QueryProfile() as profile:
+                body = self.client.get(url).json()
+            self.assertFalse(any('core_student' in sql for sql, _ in profile.queries))
+            self.assertTrue(all(set(row) == {'amount', 'transaction_id'} for row in body['results']))
+            seen += [row['transaction_id'] for row in body['results']]
+            url = body['next']
+        self.assertEqual(seen, [f"API-{n}" for n in reversed(range(7))])
+
+    def test_etag_and_errors(self):
+        url = reverse('api_detail', kwargs={'resource': 'fee-balances', 'pk': FeeBalance.objects.first().pk})
+        response = self.client.get(url, {'fields': 'admission_number,total_due'})
+        body = response.json()
+        self.assertEqual((body['admission_number'], Decimal(body['total_due'])), ('ICT/000', Decimal('74900')))
+        again = self.client.get(url, {'fields': 'admission_number,total_due'},
+                                HTTP_IF_NONE_MATCH=response.headers['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+        self.assertEqual(self.client.get(url, {'fields': 'photo'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_list', kwargs={'resource': 'consumables'})).status_code, 403)
+        self.assertEqual(self.client.get(reverse('api_list', kwargs={'resource': 'nothing'})).status_code, 404)
+        self.client.logout()
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+
+@override_settings(REPLICA_DATABASE=None)
+class SeedAndBenchmarkTests(TestCase):
+    """seed_scale data at a tiny scale, benchmarked end to end."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.created = seed(scale=0.0005)
+
+    def test_seeded_rows_are_consistent(self):
+        self.assertEqual(Student.objects.count(), self.created['students'])
+        self.assertEqual(FeeBalance.objects.count(), self.created['students'])
+        self.assertEqual(Receipt.objects.count(), Payment.objects.count())
+        for year in Receipt.objects.values_list('year', flat=True).distinct():
+            numbers = list(Receipt.objects.filter(year=year).order_by('number').values_list('number', flat=True))
+            self.assertEqual(numbers, list(range(1, len(numbers) + 1)))
+
+        student = Student.objects.select_related('feebalance').first()
+        for sem, field in SEMESTER_BALANCE_FIELDS.items():
+            paid = Payment.objects.filter(student=student, semester=sem).aggregate(t=Sum('amount'))['t'] or 0
+            self.assertEqual(getattr(student.feebalance, field), COURSES[student.course][int(sem) - 1] - paid)
+
+    def test_benchmark_covers_every_view_and_changes_nothing(self):
+        before = benchmark.row_counts()
+        report = benchmark.run(repeat=1)
+        names = {p.name for p in urls.urlpatterns if isinstance(p, URLPattern)}
+        self.assertEqual(set(report['views']), names)
+        for name, result in report['views'].items():
+            self.assertLess(result['status'], 500, name)
+            self.assertGreaterEqual(result['p95_ms'], result['p50_ms'])
+        self.assertEqual(benchmark.row_counts(), before)
+        self.assertFalse(User.objects.filter(username='bench_views_user').exists())
+
+
+def _separate_replica():
+    alias = replicas.replica_alias()
+    return alias and not settings.DATABASES[alias].get('TEST', {}).get('MIRROR')
+
+
+@skipUnless(_separate_replica(), "needs a replica database that is not a test mirror of default")
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    With two separate databases and nothing copying between them, the
+    replica stays empty: a page that shows a row written to the primary
+    must have read from the primary.
+    """
+    databases = '__all__'
+
+    def setUp(self):
+        replicas._down_until.clear()
+        cache.clear()
+        admin = User.objects.create_superuser('admin', password='x')
+        self.client.force_login(admin)
+        student = make_student('KV/LAG/1', name='Lagging Student')
+        post_payment(student, 500, '1', 'LAG-1', admin)
+
+    def history(self):
+        return self.client.get(reverse('payment_history')).content.decode()
+
+    def test_report_views_read_from_the_replica(self):
+        self.assertNotIn('Lagging Student', self.history())
+        # Views that are not marked read from the primary
+        self.assertContains(self.client.get(reverse('admissions')), 'Lagging Student')
+
+    def test_streamed_exports_read_from_the_replica(self):
+        response = self.client.get(reverse('payment_history'), {'export': 'csv'})
+        self.assertNotIn('Lagging Student', b''.join(response.streaming_content).decode())
+
+    def test_writes_pin_the_session_to_the_primary(self):
+        self.client.post(reverse('examinations'), {})
+        self.assertIn('Lagging Student', self.history())
+
+    def test_falls_back_to_the_primary_when_the_replica_is_down(self):
+        replica = connections['replica']
+        with patch.object(replica, 'ensure_connection', side_effect=OperationalError('down')):
+            self.assertIn('Lagging Student', self.history())
+        # Marked down: not even tried until REPLICA_RETRY_SECONDS pass
+        self.assertIn('Lagging Student', self.history())
+
+    def test_reruns_the_view_when_a_replica_query_fails(self):
+        replica = connections['replica']
+        with patch.object(replica, 'create_cursor', side_effect=OperationalError('connection lost')):
+            self.assertIn('Lagging Student', self.history())
+
+
+class CourseRosterTests(TestCase):
+    def test_pages_courses_and_slices_students_in_two_queries(self):
+        for course in ('Fashion', 'ICT', 'Plumbing'):
+            for n in range(3):
+                make_student(f"{course[:3].upper()}/{n:03d}", course=course, name=f"{course} {2 - n}")
+
+        with QueryProfile() as profile:
+            page, grouped = build_course_roster(Student.objects.all(), page_number=1, course_page=2,
+                                                courses_per_page=2, per_course=2)
+            shown = {course: [s.name for s in group] for course, group in grouped.items()}
+        self.assertEqual(profile.count, 2)
+        self.assertEqual(page.paginator.num_pages, 2)
+        # Second slice of each course, by name
+        self.assertEqual(shown, {'Fashion': ['Fashion 2'], 'ICT': ['ICT 2']})
+        self.assertEqual((grouped['ICT'].count, grouped['ICT'].start_index, grouped['ICT'].has_more), (3, 3, False))
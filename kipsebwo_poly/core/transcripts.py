@@ -0,0 +1,204 @@
+import hashlib
+import json
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .models import Examination, SemesterResult, Student
+from .results import grade_for
+
+# Batch result slips: one print-ready HTML transcript per student, rendered in
+# a process pool and collected into a single zip under MEDIA_ROOT/transcripts/.
+#
+# Each job has its own directory holding status.json plus one file per
+# student. Re-running a job skips students whose file already exists, so an
+# interrupted run resumes where it stopped. The examinations page resumes
+# only failed or interrupted runs; any other request starts over (--fresh) so
+# slips rendered from older marks are never reused.
+
+TRANSCRIPTS_DIR = 'transcripts'
+
+
+def _safe_filename(value):
+    return re.sub(r'[^A-Za-z0-9_-]+', '_', value).strip('_') or 'student'
+
+
+def _init_worker():
+    # Under the 'spawn' start method workers start without Django configured.
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def _render_transcript(context, path):
+    from django.template.loader import render_to_string
+    html = render_to_string('transcript.html', context)
+    tmp = f"{path}.part"
+    with open(tmp, 'w', encoding='utf-8') as fh:
+        fh.write(html)
+    os.replace(tmp, path)  # a half-written file never counts as done
+    return context['student']['admission_number']
+
+
+class TranscriptJob:
+    def __init__(self, course, year_of_study, semester, job_id=None):
+        self.course = course
+        self.year_of_study = str(year_of_study)
+        self.semester = str(semester)
+        self.job_id = job_id or self.default_job_id(course, year_of_study, semester)
+        self.directory = Path(settings.MEDIA_ROOT) / TRANSCRIPTS_DIR / self.job_id
+
+    @staticmethod
+    def default_job_id(course, year_of_study, semester):
+        # The slug is for reading; the hash of the exact parameters keeps courses
+        # that slug alike ('ICT (Day)', 'ict day') out of each other's directory.
+        digest = hashlib.sha256(json.dumps([course, str(year_of_study), str(semester)]).encode()).hexdigest()[:8]
+        return f"{slugify(course) or 'course'}-y{year_of_study}-s{semester}-{digest}"
+
+    @classmethod
+    def load(cls, job_id):
+        """Re-opens a job from its status file, or None if there is no such job."""
+        job_id = slugify(job_id)
+        status_path = Path(settings.MEDIA_ROOT) / TRANSCRIPTS_DIR / job_id / 'status.json'
+        try:
+            status = json.loads(status_path.read_text())
+        except (OSError, ValueError):
+            return None
+        return cls(status['course'], status['year_of_study'], status['semester'], job_id)
+
+    @property
+    def zip_path(self):
+        return self.directory / f"{self.job_id}.zip"
+
+    @property
+    def status_path(self):
+        return self.directory / 'status.json'
+
+    def status(self):
+        try:
+            return json.loads(self.status_path.read_text())
+        except (OSError, ValueError):
+            return {'state': 'missing', 'total': 0, 'done': 0}
+
+    def is_busy(self, status=None):
+        """True while a run is queued or rendering and has not gone quiet."""
+        status = status or self.status()
+        if status['state'] not in ('queued', 'running'):
+            return False
+        try:
+            updated = datetime.fromisoformat(status['updated'])
+        except (KeyError, ValueError):
+            return False
+        # A run whose process died leaves 'running' behind; it goes stale
+        return (timezone.now() - updated).total_seconds() < getattr(settings, 'TRANSCRIPT_STALE_SECONDS', 900)
+
+    def can_resume(self, status=None):
+        """A failed or interrupted run keeps the slips it rendered; anything else starts over."""
+        status = status or self.status()
+        return status['state'] in ('failed', 'running') and not self.is_busy(status)
+
+    def write_status(self, state, total=0, done=0, error=''):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        payload = {
+            'state': state, 'total': total, 'done': done, 'error': error,
+            'course': self.course, 'year_of_study': self.year_of_study,
+            'semester': self.semester, 'updated': timezone.now().isoformat(),
+        }
+        tmp = self.status_path.with_suffix('.part')
+        tmp.write_text(json.dumps(payload))
+        os.replace(tmp, self.status_path)
+
+    def load_cohort(self):
+        """
+        Builds one picklable template context per student from three queries:
+        the students, all of their Examination rows and their summaries.
+        """
+        students = list(
+            Student.objects.filter(course=self.course).order_by('admission_number')
+            .values('id', 'name', 'admission_number', 'course', 'year_enrolled')
+        )
+        exams = {}
+        for row in (
+            Examination.objects.filter(student__course=self.course, year_of_study=self.year_of_study,
+                                       semester=self.semester)
+            .order_by('student_id', 'subject_name').values('student_id', 'subject_name', 'marks')
+        ):
+            row['grade'] = grade_for(row['marks'])
+            exams.setdefault(row['student_id'], []).append(row)
+        summaries = {
+            row['student_id']: row for row in
+            SemesterResult.objects.filter(student__course=self.course, year_of_study=self.year_of_study,
+                                          semester=self.semester)
+            .values('student_id', 'subject_count', 'total_marks', 'mean_marks', 'grade',
+                    'failed_subjects', 'rank')
+        }
+        generated = timezone.localtime().strftime('%d/%m/%Y %H:%M')
+        return [
+            {
+                'student': student, 'exams': exams.get(student['id'], []),
+                'summary': summaries.get(student['id']), 'cohort_size': len(summaries),
+                'year_of_study': self.year_of_study, 'semester': self.semester,
+                'generated': generated,
+            }
+            for student in students
+        ]
+
+    def path_for(self, student):
+        return self.directory / f"{_safe_filename(student['admission_number'])}.html"
+
+    def run(self, workers=None, progress=None, fresh=False):
+        """
+        Renders every missing transcript in a process pool, then zips them.
+        `progress(done, total)` is called as students complete.
+        """
+        if fresh and self.directory.exists():
+            for path in self.directory.iterdir():
+                if path != self.status_path:
+                    path.unlink()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        contexts = self.load_cohort()
+        total = len(contexts)
+        pending = [c for c in contexts if not self.path_for(c['student']).exists()]
+        done = total - len(pending)
+        self.write_status('running', total, done)
+
+        try:
+            if pending:
+                # Forked workers must not share this process's DB sockets
+                connections.close_all()
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                    futures = [
+                        pool.submit(_render_transcript, c, str(self.path_for(c['student'])))
+                        for c in pending
+                    ]
+                    for future in as_completed(futures):
+                        future.result()
+                        done += 1
+                        # Keep status writes cheap: every 25 students and at the end
+                        if done % 25 == 0 or done == total:
+                            self.write_status('running', total, done)
+                        if progress:
+                            progress(done, total)
+            self.build_zip(contexts)
+        except Exception as e:
+            self.write_status('failed', total, done, error=str(e))
+            raise
+        self.write_status('done', total, done)
+        return self.zip_path
+
+    def build_zip(self, contexts):
+        tmp = self.zip_path.with_suffix('.part')
+        with zipfile.ZipFile(tmp, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for context in contexts:
+                path = self.path_for(context['student'])
+                archive.write(path, arcname=path.name)
+        os.replace(tmp, self.zip_path)
@@ -19,23 +19,39 @@ urlpatterns = [
 
     # --- Admissions Department ---
     path('admissions/', views.admissions_view, name='admissions'),
+    path('admissions/import/', views.import_students_view, name='import_students'),
     path('student/<int:pk>/', views.student_profile_view, name='student_profile'),
+    path('student/autocomplete/', views.student_autocomplete_view, name='student_autocomplete'),
     path('student/<int:pk>/edit/', views.edit_student_view, name='edit_student'),
     # --- Finance Department ---
     path('finance/', views.finance_view, name='finance'),
+    path('finance/async/', views.finance_async_view, name='finance_async'),
     path('finance/pay/<int:student_id>/', views.process_payment, name='process_payment'),
     path('finance/receipt/<int:payment_id>/', views.print_receipt, name='print_receipt'),
+    path('finance/receipts/', views.print_receipts_view, name='print_receipts'),
     path('finance/history/', views.payment_history, name='payment_history'),
+    path('finance/import/', views.import_statement_view, name='import_statement'),
+    path('finance/fees/', views.revise_fees_view, name='revise_fees'),
 
     # --- Examinations Department ---
     path('examinations/', views.examinations_view, name='examinations'),
+    path('examinations/async/', views.examinations_async_view, name='examinations_async'),
+    path('examinations/marks-sheet/', views.marks_sheet_view, name='marks_sheet'),
+    path('examinations/transcripts/', views.transcripts_view, name='transcripts'),
+    path('examinations/transcripts/<slug:job_id>/', views.transcript_status_view, name='transcript_status'),
 
     # --- Stores Department ---
     path('stores/', views.stores_view, name='stores'),
+    path('stores/issue/', views.bulk_issue_view, name='bulk_issue'),
     path('stores/delete/<str:item_type>/<int:pk>/', views.delete_store_item, name='delete_store_item'),
 
     # --- CUSTOM ADMIN PANEL (User Management & Logs) ---
     path('admin-panel/', views.admin_management_view, name='admin_management'),
+    path('admin-panel/audit/', views.audit_log_view, name='audit_log'),
     path('admin-panel/approve/<int:user_id>/', views.approve_user, name='approve_user'),
     path('admin-panel/delete/<int:user_id>/', views.delete_user, name='delete_user'),
+
+    # --- READ-ONLY JSON API (core/api.py) ---
+    path('api/v1/<slug:resource>/', views.api_list_view, name='api_list'),
+    path('api/v1/<slug:resource>/<int:pk>/', views.api_detail_view, name='api_detail'),
 ]
\ No newline at end of file
@@ -1,37 +1,74 @@
+import csv
+import datetime
+import io
+import subprocess
+import sys
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth import login
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth.models import User
 from django.contrib.auth.views import LoginView
+from django.conf import settings
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.core.paginator import Paginator
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import require_safe
+from urllib.parse import urlencode
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.middleware.csrf import get_token
 from django.db import transaction, models
 from decimal import Decimal
 from .models import *
 from .forms import *
 from django.contrib import messages
-from django.core.exceptions import PermissionDenied
+from django.core.exceptions import PermissionDenied, ValidationError
 from .forms import RegistrationForm
 from .models import UserProfile
+from .roster import build_course_roster
+from .search import ranked_students, search_students
+from .payments import new_transaction_id, post_payment
+from .statements import import_statement
+from .pagination import keyset_paginate
+from .exports import EXPORT_CHUNK_SIZE, streaming_export
+from .marks import MarksSheet
+from .transcripts import TranscriptJob
+from .intake import import_students, read_rows
+from .finance_stats import finance_stats
+from .instrumentation import metrics
+from .fees import STRUCTURE_FIELDS, RevisionPreview, apply_revision
+from . import api, audit, caching, receipts, stores
+from .rbac import normalize_department, request_access
+from .replicas import read_replica
+from .streaming import gather, group_events, render_parts, stream_table
 
 # 1. Access Control Decorator
 def department_required(dept_name):
+    dept_name = normalize_department(dept_name)
+
+    def allowed(request):
+        # The cached decision from DepartmentMiddleware: no queries here.
+        # Superusers pass every check; everyone else needs an approved
+        # profile in this department.
+        return request_access(request).allows(dept_name)
+
     def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @login_required
+            async def _wrapped_view(request, *args, **kwargs):
+                if await sync_to_async(allowed)(request):
+                    return await view_func(request, *args, **kwargs)
+                raise PermissionDenied
+            return _wrapped_view
+
         @login_required
         def _wrapped_view(request, *args, **kwargs):
-            # 1. THE SUPERUSER OVERRIDE
-            # If the user is a superuser, they bypass all department checks.
-            if request.user.is_superuser:
+            if allowed(request):
                 return view_func(request, *args, **kwargs)
-
-            # 2. NORMAL USER CHECK
-            profile = getattr(request.user, 'userprofile', None)
-            
-            # Check if they have a profile, match the dept, and are approved
-            if profile and profile.department == dept_name and profile.is_approved:
-                return view_func(request, *args, **kwargs)
-            
-            # 3. ACCESS DENIED
-            raise PermissionDenied 
+            raise PermissionDenied
         return _wrapped_view
     return decorator
 
@@ -59,7 +96,7 @@ def register_view(request):
             )
             
             # Create Audit Log
-            AuditTrail.objects.create(user=user, action="Registered (Pending Approval)")
+            audit.record(user, "Registered (Pending Approval)", action_type='register', target=user)
             
             return render(request, 'registration_pending.html', {'dept': selected_dept})
     else:
@@ -89,36 +126,31 @@ def dashboard(request):
     """Fallback dashboard if needed"""
     return render(request, 'dashboard.html')
 
+DEPARTMENT_HOMES = {code for code, _ in UserProfile.DEPARTMENT_CHOICES}
+
 @login_required
 def redirect_after_login(request):
     """
     The RBAC Traffic Controller: 
     Checks the user's department and redirects them to their specific home page.
     """
-    try:
-        # Get the profile for the logged-in user
-        profile = request.user.userprofile
-        
+    access = request_access(request)
+
+    if access.department:
         # 1. Double check if they are approved (Safety Gate)
-        if not profile.is_approved:
+        if not access.is_approved:
             messages.warning(request, "Your account is not yet approved by an administrator.")
-            return render(request, 'registration_pending.html', {'dept': profile.department})
+            return render(request, 'registration_pending.html', {'dept': access.department})
 
         # 2. Redirect based on the department stored in their profile
-        if profile.department == 'finance':
-            return redirect('finance')  # Make sure this matches your URL name
-        elif profile.department == 'admissions':
-            return redirect('admissions')
-        elif profile.department == 'stores':
-            return redirect('stores')
-        elif profile.department == 'examinations':
-            return redirect('examinations')
-            
-    except UserProfile.DoesNotExist:
-        # If it's a superuser/admin who doesn't have a profile record
-        if request.user.is_staff:
-            return redirect('admin_management')
-        
+        # (the department codes double as the URL names of their home pages)
+        if access.department in DEPARTMENT_HOMES:
+            return redirect(access.department)
+
+    # If it's a superuser/admin who doesn't have a profile record
+    elif access.is_staff:
+        return redirect('admin_management')
+
     # If no profile and not staff, send to a general dashboard
     return redirect('dashboard')
 # --- ADMISSIONS DEPT ---
@@ -131,24 +163,29 @@ def admissions_view(request):
     students_list = Student.objects.all()
     search_query = request.GET.get('search', '')
     gender_filter = request.GET.get('gender', '')
+    course_filter = request.GET.get('course', '')
     
     if search_query:
-        students_list = students_list.filter(
-            models.Q(name__icontains=search_query) | 
-            models.Q(admission_number__icontains=search_query)
-        )
+        students_list = search_students(students_list, search_query)
     if gender_filter:
         students_list = students_list.filter(sex=gender_filter)
+    if course_filter:
+        students_list = students_list.filter(course=course_filter)
 
-    courses = Student.objects.values_list('course', flat=True).distinct()
-    grouped_students = {course: students_list.filter(course=course) for course in courses}
+    # One GROUP BY for the counts plus one windowed query for the rows on this page
+    page_obj, grouped_students = build_course_roster(
+        students_list,
+        page_number=request.GET.get('page'),
+        course_page=request.GET.get('cpage', 1),
+        order_by=('-search_rank', 'name') if search_query else ('name',),
+    )
 
     if request.method == 'POST':
         # request.FILES to handle the passport photo upload
         form = StudentForm(request.POST, request.FILES)
         if form.is_valid():
             student = form.save()
-            AuditTrail.objects.create(user=request.user, action=f"Admitted student: {student.name}")
+            audit.record(request.user, f"Admitted student: {student.name}", action_type='create', target=student)
             messages.success(request, f"Student {student.name} successfully admitted.")
             return redirect('admissions')
     else:
@@ -156,18 +193,56 @@ def admissions_view(request):
     
     context = {
         'grouped_students': grouped_students, 
+        'page_obj': page_obj,
+        'courses': caching.student_courses(),
         'form': form, 
         'search_query': search_query,
+        'gender_filter': gender_filter,
+        'course_filter': course_filter,
         'page_title': page_title
     }
     return render(request, 'admissions.html', context)
 
+@department_required('admissions')
+@login_required
+def import_students_view(request):
+    """Admit a whole intake from a CSV/XLSX sheet, validating every row first."""
+    report = None
+    if request.method == 'POST':
+        form = IntakeUploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['intake']
+            fileobj = upload.file
+            if not upload.name.lower().endswith('.xlsx'):
+                fileobj = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+            try:
+                report = import_students(read_rows(fileobj, upload.name), request.user,
+                                         source=upload.name, skip_invalid=form.cleaned_data['skip_invalid'])
+            except (ValidationError, UnicodeDecodeError, csv.Error) as e:
+                messages.error(request, f"Could not import intake: {' '.join(getattr(e, 'messages', [str(e)]))}")
+            else:
+                if report.created:
+                    messages.success(request, report.summary)
+                elif report.errors:
+                    messages.error(request, "Nothing was imported; fix the rows below and upload the sheet again.")
+    else:
+        form = IntakeUploadForm()
+    return render(request, 'student_import.html', {'form': form, 'report': report})
+
 @login_required
 def student_profile_view(request, pk):
     """View showing all details: Boarding status, photos, and current status."""
     student = get_object_or_404(Student, pk=pk)
     return render(request, 'student_profile.html', {'student': student})
 
+@login_required
+def student_autocomplete_view(request):
+    """Students matching ?q= by admission number or name, as JSON for the student pickers."""
+    response = JsonResponse({'results': caching.student_matches(request.GET.get('q', ''))})
+    # Always revalidate: the server-side entry is dropped as soon as a student changes, a browser's is not
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
 @department_required('admissions')
 @login_required
 def edit_student_view(request, pk):
@@ -177,46 +252,90 @@ def edit_student_view(request, pk):
         form = StudentForm(request.POST, request.FILES, instance=student)
         if form.is_valid():
             form.save()
-            AuditTrail.objects.create(user=request.user, action=f"Updated student: {student.name}")
+            audit.record(request.user, f"Updated student: {student.name}", action_type='update', target=student)
             messages.success(request, "Student profile updated.")
             return redirect('student_profile', pk=student.pk)
     else:
         form = StudentForm(instance=student)
     return render(request, 'edit_student.html', {'form': form, 'student': student})
 # --- FINANCE DEPT ---
+def _fee_balances(structures, search_query):
+    """Students of the courses with a fee structure, in the order finance_balances.html groups them."""
+    students = (Student.objects.filter(course__in=[s.course for s in structures])
+                .select_related('feebalance'))
+    if search_query:
+        students = search_students(students, search_query).order_by('course', '-search_rank', 'name')
+    else:
+        students = students.order_by('course', 'name')
+    # Pinned here: a streamed response is read after ReplicaMiddleware has returned
+    return students.using(students.db)
+
+def _finance_context(search_query, structures, stats):
+    return {
+        'structures': structures,
+        'form': FeeRevisionForm(),
+        'search_query': search_query,
+        # Only evaluated when the recent payments fragment is not cached
+        'recent_payments': Payment.objects.select_related('student').order_by('-date', '-id')[:10],
+        'stats': stats,
+    }
+
+@read_replica
 @department_required('finance')
 @login_required
 def finance_view(request):
-    if request.method == 'POST' and 'add_structure' in request.POST:
-        form = FeeForm(request.POST)
+    # Structures are saved through revise_fees, which previews the balance changes first
+    search_query = request.GET.get('search', '')
+    structures = caching.fee_structures()
+    context = _finance_context(search_query, structures, finance_stats())
+    students = _fee_balances(structures, search_query)
+    context['balance_events'] = group_events(students.iterator(), lambda s: s.course)
+    return render(request, 'finance.html', context)
+
+@read_replica
+@department_required('finance')
+@login_required
+async def finance_async_view(request):
+    """finance_view for ASGI: the stats and structures load concurrently, the balances stream."""
+    search_query = request.GET.get('search', '')
+    stats, structures = await gather(finance_stats, caching.fee_structures)
+    students = await sync_to_async(_fee_balances)(structures, search_query)
+    head, tail = await render_parts('finance.html', _finance_context(search_query, structures, stats), request)
+    return StreamingHttpResponse(stream_table(head, tail, students, 'finance_balances.html', {},
+                                              lambda s: s.course))
+
+@department_required('finance')
+@login_required
+def revise_fees_view(request):
+    """Preview, then apply, a fee structure change and the balances it recomputes."""
+    preview = None
+    if request.method == 'POST':
+        form = FeeRevisionForm(request.POST)
         if form.is_valid():
-            form.save()
-            return redirect('finance')
+            data = form.cleaned_data
+            amounts = {field: data[field] for field in STRUCTURE_FIELDS.values()}
+            if 'confirm' in request.POST:
+                try:
+                    revision = apply_revision(data['course'], amounts, request.user, data['note'],
+                                              base_revision=request.POST.get('base_revision', ''))
+                except ValidationError as e:
+                    messages.warning(request, f"{' '.join(e.messages)} Check the new figures below.")
+                else:
+                    messages.success(request, f"Fee structure for {revision.course} saved; {revision.students_affected} balance(s) recomputed.")
+                    return redirect('finance')
+            preview = RevisionPreview(data['course'], amounts)
     else:
-        form = FeeForm()
+        structure = FeeStructure.objects.filter(course=request.GET.get('course', '')).first()
+        initial = {f: getattr(structure, f) for f in ('course', *STRUCTURE_FIELDS.values())} if structure else {}
+        form = FeeRevisionForm(initial=initial)
 
-    search_query = request.GET.get('search', '')
-    students_list = Student.objects.all().select_related('feebalance')
-    
-    if search_query:
-        students_list = students_list.filter(
-            models.Q(name__icontains=search_query) | 
-            models.Q(admission_number__icontains=search_query)
-        )
-
-    courses = FeeStructure.objects.values_list('course', flat=True).distinct()
-    finance_grouped = {course: students_list.filter(course=course) for course in courses}
-    recent_payments = Payment.objects.all().order_by('-date')[:10]
-    structures = FeeStructure.objects.all()
-    
-    context = {
-        'finance_grouped': finance_grouped,
-        'structures': structures,
+    course = form['course'].value()
+    return render(request, 'fee_revision.html', {
         'form': form,
-        'search_query': search_query,
-        'recent_payments': recent_payments 
-    }
-    return render(request, 'finance.html', context)
+        'preview': preview,
+        'history': FeeStructureRevision.objects.filter(course=course).select_related('revised_by')
+                   .order_by('-created_at', '-id')[:10] if course else [],
+    })
 
 @login_required
 def process_payment(request, student_id):
@@ -224,33 +343,148 @@ def process_payment(request, student_id):
     balance, created = FeeBalance.objects.get_or_create(student=student)
     
     if request.method == 'POST':
-        amount = Decimal(request.POST.get('amount', 0))
-        semester = request.POST.get('semester')
-        transaction_id = request.POST.get('transaction_id', '') 
-        
-        with transaction.atomic():
-            new_payment = Payment.objects.create(
-                student=student, amount=amount, semester=semester, transaction_id=transaction_id
+        try:
+            # Row-level F() decrement, idempotent on transaction_id (see core/payments.py)
+            payment, created = post_payment(
+                student,
+                amount=request.POST.get('amount'),
+                semester=request.POST.get('semester'),
+                transaction_id=request.POST.get('transaction_id', ''),
+                user=request.user,
             )
-            if semester == '1': balance.sem1_bal -= amount
-            elif semester == '2': balance.sem2_bal -= amount
-            elif semester == '3': balance.sem3_bal -= amount
-            balance.save()
-            
-            AuditTrail.objects.create(user=request.user, action=f"Payment {amount} for {student.name}")
-            return redirect('print_receipt', payment_id=new_payment.id)
+        except ValidationError as e:
+            messages.error(request, " ".join(e.messages))
+        else:
+            if not created:
+                messages.info(request, f"Transaction {payment.transaction_id} was already recorded.")
+            return redirect('print_receipt', payment_id=payment.id)
         
-    return render(request, 'make_payment.html', {'student': student, 'balance': balance})
+    return render(request, 'make_payment.html', {
+        'student': student,
+        'balance': balance,
+        'transaction_id': request.POST.get('transaction_id') or new_transaction_id(),
+    })
+
+@department_required('finance')
+@login_required
+def import_statement_view(request):
+    """Upload a bank / M-Pesa CSV statement and post all of its payments in batches."""
+    report = None
+    if request.method == 'POST':
+        form = StatementUploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['statement']
+            # Stream the upload line by line instead of reading it into memory
+            lines = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+            try:
+                report = import_statement(lines, request.user, source=upload.name)
+            except ValidationError as e:
+                # Also raised part way, with what was posted before it in the message
+                messages.error(request, f"Could not read statement: {' '.join(e.messages)}")
+            except (UnicodeDecodeError, csv.Error) as e:
+                messages.error(request, f"Could not read statement: {e}")
+            else:
+                messages.success(request, report.summary)
+    else:
+        form = StatementUploadForm()
+    return render(request, 'statement_import.html', {'form': form, 'report': report})
 
 @login_required
 def print_receipt(request, payment_id):
-    payment = get_object_or_404(Payment, id=payment_id)
-    return render(request, 'receipt_print.html', {'payment': payment})
+    # The snapshot stored when the payment was posted; no re-render on reprint
+    receipt = get_object_or_404(Receipt, payment_id=payment_id)
+    receipts.snapshot(receipt)
+    return render(request, 'receipt_print.html', {'receipts': [receipt]})
+
+@department_required('finance')
+@login_required
+def print_receipts_view(request):
+    """Every receipt issued for payments in a date range, in receipt number order."""
+    date_from = _parse_date_param(request.GET.get('date_from', '')) or timezone.localdate()
+    date_to = _parse_date_param(request.GET.get('date_to', '')) or date_from
+    batch = list(
+        Receipt.objects.filter(payment__date__gte=_day_start(date_from),
+                               payment__date__lt=_day_start(date_to + datetime.timedelta(days=1)))
+        .select_related('payment__student', 'issued_by')
+        .order_by('year', 'number')[:receipts.BATCH_PRINT_LIMIT + 1]
+    )
+    truncated = len(batch) > receipts.BATCH_PRINT_LIMIT
+    batch = batch[:receipts.BATCH_PRINT_LIMIT]
+    for receipt in batch:
+        receipts.snapshot(receipt)
+    return render(request, 'receipt_print.html', {
+        'receipts': batch, 'truncated': truncated, 'date_from': date_from, 'date_to': date_to,
+    })
+
+PAYMENT_EXPORT_HEADER = ['Date', 'Receipt', 'Admission No', 'Student Name', 'Course', 'Semester', 'Transaction ID', 'Amount (Ksh)']
+
+
+def _payment_export_rows(payments):
+    """Flat rows for the export, fetched in chunks without building model instances."""
+    rows = payments.order_by('-date', '-id').values_list(
+        'date', 'receipt__year', 'receipt__number', 'student__admission_number', 'student__name',
+        'student__course', 'semester', 'transaction_id', 'amount',
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    for date, year, number, *rest in rows:
+        receipt_no = f"RCT/{year}/{number:05d}" if number else ''
+        yield [timezone.localtime(date).strftime('%Y-%m-%d %H:%M'), receipt_no, *rest]
 
+
+def _parse_date_param(value):
+    try:
+        return parse_date(value) if value else None
+    except ValueError:
+        return None
+
+
+def _day_start(day):
+    # Whole-day bounds as aware datetimes (not a __date lookup) so the date and
+    # timestamp indexes and, on PostgreSQL, partition pruning still apply.
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+@read_replica
 @login_required
 def payment_history(request):
-    payments = Payment.objects.all().order_by('-date')
-    return render(request, 'payment_history.html', {'payments': payments})
+    filters = {
+        'date_from': request.GET.get('date_from', ''),
+        'date_to': request.GET.get('date_to', ''),
+        'semester': request.GET.get('semester', ''),
+        'course': request.GET.get('course', ''),
+    }
+    payments = Payment.objects.select_related('student', 'receipt').defer('receipt__html')
+    date_from = _parse_date_param(filters['date_from'])
+    date_to = _parse_date_param(filters['date_to'])
+    if date_from:
+        payments = payments.filter(date__gte=_day_start(date_from))
+    if date_to:
+        payments = payments.filter(date__lt=_day_start(date_to + datetime.timedelta(days=1)))
+    if filters['semester']:
+        payments = payments.filter(semester=filters['semester'])
+    if filters['course']:
+        payments = payments.filter(student__course=filters['course'])
+
+    export = request.GET.get('export')
+    if export in ('csv', 'xlsx'):
+        filename = f"payments_{timezone.localdate():%Y%m%d}"
+        # Pinned here: the rows are read after ReplicaMiddleware has returned
+        return streaming_export(filename, PAYMENT_EXPORT_HEADER,
+                                _payment_export_rows(payments.using(payments.db)), export)
+
+    # Keyset pagination on (date, id): constant cost no matter how deep the page
+    page = keyset_paginate(
+        payments, ('date', 'id'),
+        after=request.GET.get('after'), before=request.GET.get('before'),
+    )
+    query_params = {k: v for k, v in filters.items() if v}
+    return render(request, 'payment_history.html', {
+        'payments': page,
+        'page': page,
+        'filters': filters,
+        'filter_query': urlencode(query_params),
+        'courses': caching.student_courses(),
+        'semester_choices': Payment.SEM_CHOICES,
+    })
 
 @login_required
 def student_detail(request, pk):
@@ -262,29 +496,61 @@ def student_detail(request, pk):
 def delete_student(request, pk):
     if request.user.is_superuser:
         student = get_object_or_404(Student, pk=pk)
-        AuditTrail.objects.create(user=request.user, action=f"Deleted student: {student.name}")
+        audit.record(request.user, f"Deleted student: {student.name}", action_type='delete', target=student)
         student.delete()
     return redirect('admissions')
 
 # --- EXAMINATIONS ---
+# exam_listing.html's course, year and semester levels
+EXAM_GROUPS = (lambda e: e.student.course, lambda e: e.year_of_study, lambda e: e.semester)
+
+# Students listed when a search matches more than one
+SEARCH_CANDIDATES = 10
+
+def _searched_student(query):
+    """
+    (student, candidates) for the search box: the student with exactly that
+    admission number, or the only match; otherwise no student and the best
+    matches to choose from, so a mistyped number never shows someone else's marks.
+    """
+    if not query:
+        return None, []
+    student = Student.objects.filter(admission_number__iexact=query.strip()).first()
+    if student:
+        return student, []
+    candidates = list(ranked_students(Student.objects.all(), query)[:SEARCH_CANDIDATES])
+    if len(candidates) == 1:
+        return candidates[0], []
+    return None, candidates
+
+def _edited_exam(edit_id):
+    return Examination.objects.select_related('student').filter(id=edit_id).first() if edit_id else None
+
+def _exam_listing(query, student):
+    """The examinations listing, in the order exam_listing.html groups it."""
+    if query:
+        exams = Examination.objects.filter(student=student).order_by('year_of_study', 'semester', 'subject_name') if student else Examination.objects.none()
+    else:
+        exams = Examination.objects.order_by('student__course', 'year_of_study', 'semester', 'student__name')
+    exams = exams.select_related('student')
+    return exams.using(exams.db)
+
+@read_replica
 @department_required('examinations')
 @login_required
 def examinations_view(request):
     query = request.GET.get('q')
-    student = None
-    if query:
-        student = Student.objects.filter(admission_number=query).first()
-        exams = Examination.objects.filter(student=student).order_by('year_of_study', 'semester', 'subject_name') if student else Examination.objects.none()
-    else:
-        exams = Examination.objects.all().select_related('student').order_by('student__course', 'year_of_study', 'semester', 'student__name')
+    student, candidates = _searched_student(query)
+    exams = _exam_listing(query, student)
 
     if request.method == 'POST':
         if 'delete_id' in request.POST:
             exam_to_delete = get_object_or_404(Examination, id=request.POST.get('delete_id'))
             student_name = exam_to_delete.student.name
             subject = exam_to_delete.subject_name
+            audit.record(request.user, f"Deleted marks for {student_name} (Subject: {subject})",
+                         action_type='marks', target=exam_to_delete)
             exam_to_delete.delete()
-            AuditTrail.objects.create(user=request.user, action=f"Deleted marks for {student_name} (Subject: {subject})")
             messages.success(request, "Record deleted successfully.")
             return redirect('examinations')
 
@@ -295,49 +561,206 @@ def examinations_view(request):
         if form.is_valid():
             exam = form.save()
             action_type = "Updated" if instance_id else "Recorded"
-            AuditTrail.objects.create(user=request.user, action=f"{action_type} marks for {exam.student.name} (Subject: {exam.subject_name})")
+            audit.record(request.user, f"{action_type} marks for {exam.student.name} (Subject: {exam.subject_name})",
+                         action_type='marks', target=exam)
             messages.success(request, "Marks saved successfully.")
             return redirect('examinations')
     else:
-        edit_id = request.GET.get('edit')
-        instance = Examination.objects.filter(id=edit_id).first() if edit_id else None
-        form = ExaminationForm(instance=instance)
+        form = ExaminationForm(instance=_edited_exam(request.GET.get('edit')))
+
+    # Precomputed per-semester summaries (see core/results.py)
+    results = student.semester_results.all() if student else None
+    return render(request, 'examinations.html', {
+        'form': form, 'student': student, 'candidates': candidates, 'query': query, 'results': results,
+        'exam_events': group_events(exams.iterator(), *EXAM_GROUPS),
+    })
+
+@read_replica
+@department_required('examinations')
+@login_required
+async def examinations_async_view(request):
+    """The examinations_view listing for ASGI; its forms post to examinations_view."""
+    query = request.GET.get('q')
+    student, candidates = await sync_to_async(_searched_student)(query)
+    instance, results = await gather(
+        lambda: _edited_exam(request.GET.get('edit')),
+        lambda: list(student.semester_results.all()) if student else None,
+    )
+    form = ExaminationForm(instance=instance)
+    exams = await sync_to_async(_exam_listing)(query, student)
+
+    head, tail = await render_parts('examinations.html', {
+        'form': form, 'student': student, 'candidates': candidates, 'query': query, 'results': results,
+    }, request)
+    rows = {'query': query, 'csrf_token': get_token(request)}
+    return StreamingHttpResponse(stream_table(head, tail, exams, 'exam_listing.html', rows, *EXAM_GROUPS))
+
+@department_required('examinations')
+@login_required
+def marks_sheet_view(request):
+    """Spreadsheet-style entry of one subject's marks for a whole class."""
+    sheet_form = MarksSheetForm(request.GET or None)
+    upload_form = MarksUploadForm()
+    sheet = rows = None
+
+    if sheet_form.is_valid():
+        sheet = MarksSheet(**sheet_form.cleaned_data)
+        if request.method == 'POST':
+            try:
+                if 'upload_csv' in request.POST:
+                    upload_form = MarksUploadForm(request.POST, request.FILES)
+                    if not upload_form.is_valid():
+                        raise ValidationError("Choose a CSV file to upload.")
+                    lines = io.TextIOWrapper(upload_form.cleaned_data['marks_file'].file, encoding='utf-8-sig', newline='')
+                    marks, errors = sheet.parse_csv(lines)
+                    for error in errors:
+                        messages.warning(request, error)
+                else:
+                    marks = sheet.parse_grid(request.POST)
+                created, updated = sheet.save(marks, request.user)
+            except (ValidationError, UnicodeDecodeError, csv.Error) as e:
+                messages.error(request, " ".join(getattr(e, 'messages', [str(e)])))
+            else:
+                messages.success(request, f"Marks sheet saved: {created} recorded, {updated} updated.")
+                return redirect(f"{request.path}?{request.GET.urlencode()}")
+        rows = sheet.rows()
+
+    return render(request, 'marks_sheet.html', {
+        'sheet_form': sheet_form, 'upload_form': upload_form, 'sheet': sheet, 'rows': rows,
+    })
+
+@department_required('examinations')
+@login_required
+def transcripts_view(request):
+    """Starts a background result-slip run for a class; the work happens in a separate process."""
+    form = CohortForm(request.POST or None)
+    if request.method == 'POST' and form.is_valid():
+        job = TranscriptJob(**form.cleaned_data)
+        status = job.status()
+        if not job.is_busy(status):
+            # Marks may have changed since the last run: only a failed or interrupted one resumes
+            fresh = [] if job.can_resume(status) else ['--fresh']
+            job.write_status('queued')
+            subprocess.Popen(
+                [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'generate_transcripts',
+                 '--job', job.job_id, *fresh, '--verbosity', '0'],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,
+            )
+            audit.record(request.user, f"Started result slips: {job.job_id}", action_type='generate')
+        return redirect('transcript_status', job_id=job.job_id)
+    return render(request, 'transcripts.html', {'form': form})
 
-    return render(request, 'examinations.html', {'form': form, 'exams': exams, 'student': student, 'query': query})
+@department_required('examinations')
+@login_required
+def transcript_status_view(request, job_id):
+    job = TranscriptJob.load(job_id)
+    if job is None:
+        raise Http404("No such transcript job")
+    status = job.status()
+    if request.GET.get('download') and status['state'] == 'done' and job.zip_path.exists():
+        return FileResponse(open(job.zip_path, 'rb'), as_attachment=True, filename=job.zip_path.name)
+    return render(request, 'transcripts.html', {'job': job, 'status': status})
 
 # --- STORES ---
 @department_required('stores')
 @login_required
 def stores_view(request):
-    consumables = Consumable.objects.all()
-    equipment = PermanentEquipment.objects.all()
+    filters = {
+        'q': request.GET.get('q', '').strip(),
+        'condition': request.GET.get('condition', ''),
+        'date_from': request.GET.get('date_from', ''),
+        'date_to': request.GET.get('date_to', ''),
+        'low': request.GET.get('low', ''),
+    }
+    consumables, equipment = stores.filter_inventory(
+        Consumable.objects.select_related('added_by').order_by('item_name', 'id'),
+        PermanentEquipment.objects.select_related('added_by').order_by('item_name', 'id'),
+        q=filters['q'], condition=filters['condition'],
+        date_from=_parse_date_param(filters['date_from']),
+        date_to=_parse_date_param(filters['date_to']),
+        low=bool(filters['low']),
+    )
+    consumable_page = Paginator(consumables, stores.INVENTORY_PAGE_SIZE).get_page(request.GET.get('cpage'))
+    equipment_page = Paginator(equipment, stores.INVENTORY_PAGE_SIZE).get_page(request.GET.get('epage'))
     c_form = ConsumableForm()
     e_form = EquipmentForm()
+    m_form = StockMovementForm()
 
     if request.method == 'POST':
         if 'add_consumable' in request.POST:
             c_form = ConsumableForm(request.POST)
             if c_form.is_valid():
-                item = c_form.save(commit=False)
-                item.added_by = request.user
-                item.save()
-                AuditTrail.objects.create(user=request.user, action=f"Added Consumable: {item.item_name}")
+                with transaction.atomic():
+                    item = c_form.save(commit=False)
+                    item.added_by = request.user
+                    item.save()
+                    stores.open_item(item, request.user)
+                audit.record(request.user, f"Added Consumable: {item.item_name}", action_type='create', target=item)
                 messages.success(request, "Consumable added successfully")
                 return redirect('stores')
 
+        elif 'record_movement' in request.POST:
+            m_form = StockMovementForm(request.POST)
+            if m_form.is_valid():
+                data = m_form.cleaned_data
+                item = data['consumable']
+                try:
+                    if data['kind'] == 'receive':
+                        stores.receive(item, data['quantity'], request.user, note=data['note'])
+                    elif data['kind'] == 'issue':
+                        stores.issue(item, data['quantity'], request.user,
+                                     issued_to=data['issued_to'], note=data['note'])
+                    else:
+                        stores.adjust(item, data['quantity'], request.user, note=data['note'])
+                except ValidationError as e:
+                    messages.error(request, " ".join(e.messages))
+                else:
+                    messages.success(request, f"Stock movement recorded for {item.item_name}")
+                    return redirect('stores')
+
         elif 'add_equipment' in request.POST:
             e_form = EquipmentForm(request.POST)
             if e_form.is_valid():
                 item = e_form.save(commit=False)
                 item.added_by = request.user
                 item.save()
-                AuditTrail.objects.create(user=request.user, action=f"Added Equipment: {item.item_name}")
+                audit.record(request.user, f"Added Equipment: {item.item_name}", action_type='create', target=item)
                 messages.success(request, "Equipment added successfully")
                 return redirect('stores')
 
-    context = {'consumables': consumables, 'equipment': equipment, 'c_form': c_form, 'e_form': e_form}
+    movements = StockMovement.objects.select_related('consumable', 'created_by').order_by('-created_at', '-id')[:20]
+    context = {
+        'consumables': consumable_page, 'equipment': equipment_page, 'c_form': c_form, 'e_form': e_form,
+        'm_form': m_form, 'movements': movements, 'low_stock': stores.low_stock(),
+        'usage_days': stores.USAGE_DAYS, 'summary': stores.InventorySummary(),
+        'filters': filters, 'filter_query': urlencode({k: v for k, v in filters.items() if v}),
+        'condition_choices': PermanentEquipment.CONDITION_CHOICES, 'tab': request.GET.get('tab', ''),
+    }
     return render(request, 'stores.html', context)
 
+@department_required('stores')
+@login_required
+def bulk_issue_view(request):
+    """Issue several consumables in one go; all lines are issued or none."""
+    if request.method == 'POST':
+        form = BulkIssueForm(request.POST)
+        lines = IssueLineFormSet(request.POST, prefix='lines')
+        if form.is_valid() and lines.is_valid():
+            try:
+                movements = stores.issue_many(lines.lines(), request.user,
+                                              issued_to=form.cleaned_data['issued_to'],
+                                              date=form.cleaned_data['date'], note=form.cleaned_data['note'])
+            except ValidationError as e:
+                for message in e.messages:
+                    messages.error(request, message)
+            else:
+                messages.success(request, f"Issued {len(movements)} item(s) to {form.cleaned_data['issued_to']}")
+                return redirect('stores')
+    else:
+        form = BulkIssueForm()
+        lines = IssueLineFormSet(prefix='lines')
+    return render(request, 'stock_issue.html', {'form': form, 'lines': lines})
+
 @login_required
 def delete_store_item(request, item_type, pk):
     if item_type == 'consumable':
@@ -346,22 +769,65 @@ def delete_store_item(request, item_type, pk):
         item = get_object_or_404(PermanentEquipment, pk=pk)
     
     item_name = item.item_name
+    audit.record(request.user, f"Deleted {item_type}: {item_name}", action_type='delete', target=item)
     item.delete()
-    AuditTrail.objects.create(user=request.user, action=f"Deleted {item_type}: {item_name}")
     messages.warning(request, f"{item_name} removed from inventory.")
     return redirect('stores')
 
 # --- USER MANAGEMENT ---
 
+@read_replica
 @user_passes_test(lambda u: u.is_staff)
 def admin_management_view(request):
     pending_users = User.objects.filter(is_active=False)
     active_users = User.objects.filter(is_active=True).exclude(id=request.user.id)
-    logs = AuditTrail.objects.all().order_by('-timestamp')[:20]
+    audit.flush()  # show entries still sitting in the buffer
+    logs = AuditTrail.objects.select_related('user').order_by('-timestamp', '-id')[:20]
     return render(request, 'admin_management.html', {
         'pending_users': pending_users,
         'active_users': active_users,
-        'recent_logs': logs
+        'recent_logs': logs,
+        'cache_stats': caching.stats(),
+        'query_metrics': metrics.table(),
+    })
+
+@user_passes_test(lambda u: u.is_staff)
+def audit_log_view(request):
+    filters = {
+        'user': request.GET.get('user', ''),
+        'department': request.GET.get('department', ''),
+        'action_type': request.GET.get('action_type', ''),
+        'date_from': request.GET.get('date_from', ''),
+        'date_to': request.GET.get('date_to', ''),
+    }
+    audit.flush()
+    logs = AuditTrail.objects.select_related('user', 'user__userprofile')
+    if filters['user'].isdigit():
+        logs = logs.filter(user_id=filters['user'])
+    if filters['department']:
+        logs = logs.filter(user__userprofile__department=filters['department'])
+    if filters['action_type']:
+        logs = logs.filter(action_type=filters['action_type'])
+    date_from = _parse_date_param(filters['date_from'])
+    date_to = _parse_date_param(filters['date_to'])
+    if date_from:
+        logs = logs.filter(timestamp__gte=_day_start(date_from))
+    if date_to:
+        logs = logs.filter(timestamp__lt=_day_start(date_to + datetime.timedelta(days=1)))
+
+    page = keyset_paginate(
+        logs, ('timestamp', 'id'),
+        after=request.GET.get('after'), before=request.GET.get('before'),
+    )
+    query_params = {k: v for k, v in filters.items() if v}
+    return render(request, 'audit_log.html', {
+        'logs': page,
+        'page': page,
+        'filters': filters,
+        'filter_query': urlencode(query_params),
+        'users': User.objects.order_by('username').only('id', 'username'),
+        'department_choices': UserProfile.DEPARTMENT_CHOICES,
+        'action_types': AuditTrail.ACTION_TYPES,
     })
 
 @user_passes_test(lambda u: u.is_staff)
@@ -376,7 +842,7 @@ def approve_user(request, user_id):
         profile.is_approved = True
         profile.save()
 
-    AuditTrail.objects.create(user=request.user, action=f"Approved user: {user.username}")
+    audit.record(request.user, f"Approved user: {user.username}", action_type='approve', target=user)
     messages.success(request, f"{user.username} is now active.")
     return redirect('admin_management')
 
@@ -384,7 +850,29 @@ def approve_user(request, user_id):
 def delete_user(request, user_id):
     user = get_object_or_404(User, id=user_id)
     name = user.username
+    audit.record(request.user, f"Deleted user: {name}", action_type='delete', target=user)
     user.delete()
-    AuditTrail.objects.create(user=request.user, action=f"Deleted user: {name}")
     messages.warning(request, f"User {name} deleted.")
-    return redirect('admin_management')
\ No newline at end of file
+    return redirect('admin_management')
+
+# --- JSON API (core/api.py) ---
+def _api_response(request, build):
+    # JSON errors rather than login redirects and error pages, for scripts
+    if not request.user.is_authenticated:
+        return api.respond(request, {'error': "Log in first."}, status=401)
+    try:
+        return api.respond(request, build(request_access(request)))
+    except api.ApiError as e:
+        return api.respond(request, {'error': str(e)}, status=e.status)
+
+@read_replica
+@require_safe
+def api_list_view(request, resource):
+    return _api_response(request, lambda access: api.list_rows(
+        api.resource_for(resource, access), request.GET, request.path))
+
+@read_replica
+@require_safe
+def api_detail_view(request, resource, pk):
+    return _api_response(request, lambda access: api.detail_row(
+        api.resource_for(resource, access), request.GET, pk))
@@ -24,11 +24,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.instrumentation.QueryMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.rbac.DepartmentMiddleware',
+    'core.replicas.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -65,6 +68,21 @@ DATABASES = {
     }
 }
 
+# --- Read Replica (core/replicas.py) ---
+# Reporting views read from a streaming replica when DB_REPLICA_HOST is set;
+# see core/replicas.py for a local pair of SQLite files.
+if os.environ.get('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ['DB_REPLICA_HOST'],
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+REPLICA_DATABASE = 'replica'
+REPLICA_PIN_SECONDS = 10      # read from the primary for this long after a user writes
+REPLICA_RETRY_SECONDS = 30    # skip an unreachable replica for this long
+REPLICA_MAX_LAG = 5           # seconds; a PostgreSQL replica further behind is skipped
+
 # --- Password Validation ---
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -84,6 +102,44 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# --- Authentication & Department Access (core/rbac.py) ---
+# Loads the user's UserProfile together with the user on every request
+AUTHENTICATION_BACKENDS = ['core.rbac.ProfileBackend']
+RBAC_CACHE_TIMEOUT = 300  # seconds a cached department decision may live
+
+# --- Caching ---
+# Per-process memory cache. Swap in a shared backend (Redis, Memcached, a
+# file cache) to share cached data and invalidation between workers.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'kipsebwo',
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+}
+# Reference data and template fragments (core/caching.py)
+CORE_CACHE_ALIAS = 'default'
+CORE_CACHE_TIMEOUT = 3600  # seconds; entries are also dropped as soon as their models change
+# Student picker (core.caching.student_matches)
+AUTOCOMPLETE_MIN_LENGTH = 2
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_CACHE_SECONDS = 60
+
+# --- Query Metrics (core/instrumentation.py) ---
+QUERY_METRICS_HEADERS = DEBUG    # X-Query-* timing headers on every response
+QUERY_DUPLICATE_THRESHOLD = 5    # a statement repeated this often in one request is logged as a likely N+1
+
+# --- Finance Analytics (core/finance_stats.py) ---
+# Cached until a payment, balance or fee structure changes, or this many seconds
+FINANCE_STATS_TIMEOUT = 600
+
+# --- Result Slips (core/transcripts.py) ---
+# A queued or running job whose status has not changed for this long is taken as interrupted
+TRANSCRIPT_STALE_SECONDS = 900
+
+# --- JSON API (core/api.py) ---
+API_MAX_PAGE_SIZE = 200  # largest ?limit= a client may ask for
+
 # --- Authentication Redirects ---
 # UPDATED: Pointing to the new redirector view in views.py
 LOGIN_REDIRECT_URL = 'redirect_after_login'
@@ -101,4 +157,9 @@ MESSAGE_TAGS = {
     messages.SUCCESS: 'success',
     messages.WARNING: 'warning',
     messages.ERROR: 'danger',
-}
\ No newline at end of file
+}
+# --- Audit Trail Buffer (core/audit.py) ---
+AUDIT_BUFFER_SIZE = 50          # flush once this many entries are queued
+AUDIT_FLUSH_INTERVAL = 5.0      # ...or once the oldest entry is this many seconds old
+AUDIT_JOURNAL_DIR = BASE_DIR / 'var' / 'audit_journal'
+AUDIT_SYNC = False              # True writes every entry immediately (no buffering)